@@ -0,0 +1,129 @@
+"""Compare compiled and interpreted execution on nested list queries.
+
+    python benchmarks/compiled.py [--items 1000] [--reviews 5] [--rounds 20]
+"""
+import argparse
+import asyncio
+import time
+
+from gql import gql, query
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+
+type_defs = gql(
+    """
+type Query {
+    products(first: Int!): [Product!]!
+}
+
+type Product {
+    upc: String!
+    name: String!
+    price: Float!
+    inStock: Boolean!
+    reviews(first: Int = 10): [Review!]!
+}
+
+type Review {
+    id: ID!
+    body: String!
+    rating: Int!
+    author: User!
+}
+
+type User {
+    id: ID!
+    name: String!
+}
+"""
+)
+
+QUERY = '''
+query Products($first: Int!) {
+    products(first: $first) {
+        upc
+        name
+        price
+        inStock
+        ...Reviews
+    }
+}
+
+fragment Reviews on Product {
+    reviews(first: %d) {
+        id
+        body
+        rating
+        author { id name }
+    }
+}
+'''
+
+
+def make_products(count, reviews):
+    return [
+        {
+            'upc': str(i),
+            'name': f'Product {i}',
+            'price': i * 1.5,
+            'in_stock': i % 2 == 0,
+            'reviews': [
+                {'id': f'{i}-{j}', 'body': 'Great', 'rating': j % 5, 'author': {'id': str(j), 'name': f'User {j}'}}
+                for j in range(reviews)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+@query
+def products(_, info, first):
+    return PRODUCTS[:first]
+
+
+PRODUCTS = []
+
+
+def bench(func, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--reviews', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    PRODUCTS[:] = make_products(args.items, args.reviews)
+    query_ = QUERY % args.reviews
+    variables = {'first': args.items}
+    loop = asyncio.get_event_loop()
+
+    results = {}
+    print(f'{"executor":<14}{"execute ms":>12}{"http ms":>12}')
+    for name, compiled in (('interpreted', False), ('compiled', True)):
+        app = GraphQL(type_defs=type_defs, compiled_execution=compiled)
+        asgi_app = app.routes[0].app
+        client = TestClient(app)
+
+        def execute():
+            return loop.run_until_complete(asgi_app.execute(query_, variables, None, {}))
+
+        results[name] = execute()
+        timing = bench(execute, args.rounds)
+        http = bench(lambda: client.post('/', json={'query': query_, 'variables': variables}), args.rounds // 4 or 1)
+        print(f'{name:<14}{timing * 1000:>12.2f}{http * 1000:>12.2f}')
+
+    assert results['compiled'] == results['interpreted'], 'compiled execution returned a different result'
+
+
+if __name__ == '__main__':
+    main()
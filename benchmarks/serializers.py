@@ -0,0 +1,75 @@
+"""Compare JSON backends on a large list result.
+
+    python benchmarks/serializers.py [--items 20000] [--rounds 20]
+"""
+import argparse
+import time
+
+from gql import gql, query
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.serializers import JSONSerializer, ORJSONSerializer, orjson
+
+type_defs = gql(
+    """
+type Query {
+    products(first: Int!): [Product!]!
+}
+
+type Product {
+    upc: String!
+    name: String!
+    price: Float!
+    tags: [String!]!
+}
+"""
+)
+
+
+def make_products(count):
+    return [
+        {'upc': str(i), 'name': f'Product {i}', 'price': i * 1.5, 'tags': ['a', 'b', 'c']} for i in range(count)
+    ]
+
+
+@query
+def products(_, info, first):
+    return make_products(first)
+
+
+def bench(func, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    serializers = {'json': JSONSerializer()}
+    if orjson is not None:
+        serializers['orjson'] = ORJSONSerializer()
+
+    payload = {'data': {'products': make_products(args.items)}, 'errors': None}
+    body = {'query': f'{{ products(first: {args.items}) {{ upc name price tags }} }}'}
+
+    print(f'{"backend":<10}{"dumps ms":>12}{"loads ms":>12}{"http ms":>12}')
+    for name, serializer in serializers.items():
+        encoded = serializer.dumps(payload)
+        client = TestClient(GraphQL(type_defs=type_defs, serializer=serializer))
+        dumps = bench(lambda: serializer.dumps(payload), args.rounds)
+        loads = bench(lambda: serializer.loads(encoded), args.rounds)
+        http = bench(lambda: client.post('/', json=body), max(args.rounds // 4, 1))
+        print(f'{name:<10}{dumps * 1000:>12.2f}{loads * 1000:>12.2f}{http * 1000:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
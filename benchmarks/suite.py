@@ -0,0 +1,408 @@
+"""Benchmark the HTTP, upload and subscription paths, in-process over ASGI.
+
+    python benchmarks/suite.py [--requests 500] [--concurrency 10] [--output results.json] [--compare baseline.json]
+
+Each scenario reports req/s (messages/s for subscriptions), p50/p99 latency and the peak memory allocated while
+running it (measured in a separate, shorter pass with tracemalloc). The JSON output has sorted keys and rounded
+values, so runs can be diffed or compared with `--compare`.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import uuid
+
+import gql
+import graphql
+import starlette
+from gql import gql as parse_type_defs, mutate, query, subscribe
+
+from stargql import GraphQL
+
+type_defs = parse_type_defs(
+    """
+scalar Upload
+
+type Query {
+    hello(name: String!): String!
+    products(first: Int!): [Product!]!
+    count(products: [ProductInput!]!): Int!
+}
+
+type Mutation {
+    upload(file: Upload!): Int!
+}
+
+type Subscription {
+    ticks: Int!
+}
+
+type Product {
+    upc: String!
+    name: String!
+    price: Float!
+    tags: [String!]!
+}
+
+input ProductInput {
+    upc: String!
+    name: String!
+    price: Float!
+    tags: [String!]!
+}
+"""
+)
+
+PRODUCTS = []
+
+
+class Broadcast:
+    def __init__(self):
+        self.queues = set()
+
+    def publish(self, value):
+        for queue in self.queues:
+            queue.put_nowait(value)
+
+    async def listen(self):
+        queue = asyncio.Queue()
+        self.queues.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.queues.discard(queue)
+
+
+broadcast = Broadcast()
+
+
+@query
+def hello(_, info, name):
+    return f'Hello {name}'
+
+
+@query
+def products(_, info, first):
+    return PRODUCTS[:first]
+
+
+@query
+def count(_, info, products):
+    return len(products)
+
+
+@mutate
+async def upload(_, info, file):
+    size = 0
+    while True:
+        chunk = await file.read(65536)
+        if not chunk:
+            return size
+        size += len(chunk)
+
+
+@subscribe
+async def ticks(_, info):
+    async for value in broadcast.listen():
+        yield {'ticks': value}
+
+
+def make_products(count):
+    return [
+        {'upc': str(i), 'name': f'Product {i}', 'price': i * 1.5, 'tags': ['a', 'b', 'c']} for i in range(count)
+    ]
+
+
+def http_scope(method, headers, query_string=b''):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': '/',
+        'raw_path': b'/',
+        'root_path': '',
+        'query_string': query_string,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers.items()],
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8000),
+    }
+
+
+async def http_request(app, method, headers, body=b'', chunk_size=65536):
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1} for i, chunk in enumerate(chunks)
+    ]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(http_scope(method, headers), receive, send)
+    return status
+
+
+def json_request(payload, headers=None):
+    return 'POST', dict({'Content-Type': 'application/json'}, **(headers or {})), json.dumps(payload).encode('utf-8')
+
+
+def multipart_request(size):
+    boundary = uuid.uuid4().hex
+    operations = json.dumps({'query': 'mutation ($file: Upload!) { upload(file: $file) }', 'variables': {'file': None}})
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="operations"\r\n\r\n{operations}\r\n',
+        f'--{boundary}\r\nContent-Disposition: form-data; name="map"\r\n\r\n{{"0": ["variables.file"]}}\r\n',
+        f'--{boundary}\r\nContent-Disposition: form-data; name="0"; filename="data.bin"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n',
+    ]
+    body = ''.join(parts).encode('utf-8') + b'x' * size + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return 'POST', {'Content-Type': f'multipart/form-data; boundary={boundary}'}, body
+
+
+def http_scenarios(args):
+    small = {'query': '{ hello(name: "world") }'}
+    large = {'query': f'{{ products(first: {args.items}) {{ upc name price tags }} }}'}
+    # A large request instead of a large response: JSON decoding and variable coercion.
+    large_variables = {
+        'query': 'query ($products: [ProductInput!]!) { count(products: $products) }',
+        'variables': {'products': make_products(args.items)},
+    }
+    return {
+        'small_query': (GraphQL(type_defs=type_defs), json_request(small)),
+        'large_list': (GraphQL(type_defs=type_defs), json_request(large)),
+        'large_list_streamed': (GraphQL(type_defs=type_defs, response_streaming_threshold=0), json_request(large)),
+        'large_list_gzip': (
+            GraphQL(type_defs=type_defs, response_streaming_threshold=0, response_gzip=True),
+            json_request(large, {'Accept-Encoding': 'gzip'}),
+        ),
+        'large_variables': (GraphQL(type_defs=type_defs), json_request(large_variables)),
+        'graphql_body': (
+            GraphQL(type_defs=type_defs),
+            ('POST', {'Content-Type': 'application/graphql'}, small['query'].encode('utf-8')),
+        ),
+        'upload_buffered': (GraphQL(type_defs=type_defs), multipart_request(args.upload_size)),
+        'upload_streaming': (
+            GraphQL(type_defs=type_defs, streaming_uploads=True),
+            multipart_request(args.upload_size),
+        ),
+    }
+
+
+async def run_http(app, request, count, concurrency):
+    method, headers, body = request
+    latencies = []
+    remaining = count
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await http_request(app, method, headers, body)
+            latencies.append(time.perf_counter() - start)
+            assert status == 200, f'unexpected status {status}'
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+class SimulatedSocket:
+    """A graphql-transport-ws client driving the subscription endpoint through ASGI messages."""
+
+    def __init__(self, app, on_tick):
+        self.app = app
+        self.on_tick = on_tick
+        self.inbox = asyncio.Queue()
+        self.acked = asyncio.Event()
+        self.task = None
+
+    async def connect(self):
+        scope = dict(http_scope('GET', {}), type='websocket', scheme='ws', subprotocols=['graphql-transport-ws'])
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.ensure_future(self.app(scope, self.inbox.get, self.send))
+        self.send_json({'type': 'connection_init'})
+        await self.acked.wait()
+        self.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { ticks }'}})
+
+    def send_json(self, data):
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def send(self, message):
+        if message['type'] != 'websocket.send':
+            return
+        data = json.loads(message.get('text') or message.get('bytes'))
+        if data['type'] == 'connection_ack':
+            self.acked.set()
+        elif data['type'] == 'next':
+            self.on_tick(data['payload']['data']['ticks'])
+
+    async def close(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+async def run_fanout(app, sockets, events, shared):
+    subscription = app.routes[1].app
+    # Source iterators of closed sockets may only be finalized later, forget them.
+    broadcast.queues.clear()
+    received = {}
+    delivered = {}
+
+    def on_tick(value):
+        received[value] = received.get(value, 0) + 1
+        if received[value] == sockets:
+            delivered[value].set()
+
+    clients = [SimulatedSocket(app, on_tick) for _ in range(sockets)]
+    await asyncio.gather(*(client.connect() for client in clients))
+
+    def subscribed():
+        if shared and broadcast.queues:
+            return sum(len(operation.subscribers) for operation in subscription.shared_operations.values())
+        return len(broadcast.queues)
+
+    while subscribed() < sockets:
+        await asyncio.sleep(0.001)
+
+    latencies = []
+    start = time.perf_counter()
+    for value in range(events):
+        delivered[value] = asyncio.Event()
+        event_start = time.perf_counter()
+        broadcast.publish(value)
+        await delivered[value].wait()
+        latencies.append(time.perf_counter() - event_start)
+    elapsed = time.perf_counter() - start
+
+    await asyncio.gather(*(client.close() for client in clients))
+    await asyncio.sleep(0.01)  # let cancelled source iterators finish
+    return elapsed, latencies
+
+
+def subscription_scenarios(args):
+    return {
+        'subscription_fanout': lambda: run_fanout(GraphQL(type_defs=type_defs), args.sockets, args.events, False),
+        'subscription_fanout_shared': lambda: run_fanout(
+            GraphQL(type_defs=type_defs, share_subscriptions=True), args.sockets, args.events, True
+        ),
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def summarize(elapsed, latencies, operations, peak_memory):
+    return {
+        'operations': operations,
+        'rps': round(operations / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_memory_kb': round(peak_memory / 1024),
+    }
+
+
+def measure_memory(loop, run):
+    tracemalloc.start()
+    try:
+        loop.run_until_complete(run())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(args):
+    loop = asyncio.get_event_loop()
+    PRODUCTS[:] = make_products(args.items)
+    results = {}
+    memory_requests = max(args.requests // 10, 1)
+
+    for name, (app, request) in http_scenarios(args).items():
+        if args.scenarios and name not in args.scenarios:
+            continue
+        loop.run_until_complete(run_http(app, request, args.concurrency, args.concurrency))  # warm up
+        elapsed, latencies = loop.run_until_complete(run_http(app, request, args.requests, args.concurrency))
+        peak_memory = measure_memory(loop, lambda: run_http(app, request, memory_requests, args.concurrency))
+        results[name] = summarize(elapsed, latencies, args.requests, peak_memory)
+        print(f'{name:<28}{results[name]["rps"]:>10} req/s', file=sys.stderr)
+
+    for name, run in subscription_scenarios(args).items():
+        if args.scenarios and name not in args.scenarios:
+            continue
+        elapsed, latencies = loop.run_until_complete(run())
+        peak_memory = measure_memory(loop, run)
+        results[name] = summarize(elapsed, latencies, args.sockets * args.events, peak_memory)
+        print(f'{name:<28}{results[name]["rps"]:>10} msg/s', file=sys.stderr)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'starlette': starlette.__version__,
+            'graphql-core': graphql.__version__,
+            'gql': getattr(gql, '__version__', None),
+        },
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'items': args.items,
+            'upload_size': args.upload_size,
+            'sockets': args.sockets,
+            'events': args.events,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    print(f'{"scenario":<28}{"baseline":>12}{"current":>12}{"change":>10}')
+    for name, result in sorted(report['results'].items()):
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        change = (result['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0.0
+        print(f'{name:<28}{before["rps"]:>12}{result["rps"]:>12}{change:>+9.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--items', type=int, default=1000, help='items of the large list response and variables')
+    parser.add_argument('--upload-size', type=int, default=1024 * 1024, help='bytes per uploaded file')
+    parser.add_argument('--sockets', type=int, default=200, help='simulated subscription sockets')
+    parser.add_argument('--events', type=int, default=50, help='events published to every socket')
+    parser.add_argument('--scenarios', nargs='*', help='only run these scenarios')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='a previous JSON report to compare req/s against')
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 import uvicorn
 
-from gql import gql, reference_resolver, query
+from gql import gql, query
 from stargql import GraphQL
+from stargql.federation import batch_reference_resolver
 
-from helper import get_user_by_id, users
+from helper import get_users_by_ids, users
 
 type_defs = gql("""
   type Query {
@@ -23,9 +24,9 @@ def get_me(_, info):
     return users[0]
 
 
-@reference_resolver('User')
-def user_reference(_, info, representation):
-    return get_user_by_id(representation['id'])
+@batch_reference_resolver('User')
+def user_references(info, representations):
+    return get_users_by_ids([representation['id'] for representation in representations])
 
 
 app = GraphQL(type_defs=type_defs, federation=True)
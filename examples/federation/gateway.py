@@ -0,0 +1,21 @@
+import asyncio
+
+import uvicorn
+
+from stargql import GraphQL
+from stargql.gateway import Gateway, Subgraph
+
+gateway = Gateway(
+    [
+        Subgraph('product', 'http://localhost:8081/'),
+        Subgraph('account', 'http://localhost:8082/'),
+        Subgraph('review', 'http://localhost:8083/'),
+    ],
+    forward_headers=['Authorization'],
+)
+asyncio.get_event_loop().run_until_complete(gateway.load())
+
+app = GraphQL(gateway=gateway)
+
+if __name__ == '__main__':
+    uvicorn.run(app, port=8080)
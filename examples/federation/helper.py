@@ -23,6 +23,11 @@ def find_one(dict_list, key, value):
     return None
 
 
+def find_by(dict_list, key, values):
+    index = {item[key]: item for item in dict_list}
+    return [index.get(value) for value in values]
+
+
 def find_many(dict_list, key, value):
     return filter(lambda x: x[key] == value, dict_list)
 
@@ -31,10 +36,18 @@ def get_review_by_id(review_id):
     return find_one(reviews, 'id', review_id)
 
 
+def get_reviews_by_ids(review_ids):
+    return find_by(reviews, 'id', review_ids)
+
+
 def get_production_by_upc(upc):
     return find_one(products, 'upc', upc)
 
 
+def get_products_by_upcs(upcs):
+    return find_by(products, 'upc', upcs)
+
+
 def get_user_reviews(user_id):
     return find_many(reviews, 'authorID', user_id)
 
@@ -46,3 +59,7 @@ def get_product_reviews(upc):
 def get_user_by_id(user_id):
     return find_one(users, 'id', user_id)
 
+
+def get_users_by_ids(user_ids):
+    return find_by(users, 'id', user_ids)
+
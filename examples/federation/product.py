@@ -1,9 +1,10 @@
 import uvicorn
-from gql import gql, query, reference_resolver
+from gql import gql, query
 
 from stargql import GraphQL
+from stargql.federation import batch_reference_resolver
 
-from helper import get_production_by_upc, products
+from helper import get_products_by_upcs, products
 
 type_defs = gql(
     """
@@ -20,9 +21,9 @@ type_defs = gql(
 )
 
 
-@reference_resolver('Product')
-def user_reference(_, info, representation):
-    return get_production_by_upc(representation['upc'])
+@batch_reference_resolver('Product')
+def product_references(info, representations):
+    return get_products_by_upcs([representation['upc'] for representation in representations])
 
 
 @query('topProducts')
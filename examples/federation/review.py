@@ -1,9 +1,10 @@
 import uvicorn
 
-from gql import gql, reference_resolver, field_resolver, query
+from gql import gql, field_resolver, query
 from stargql import GraphQL
+from stargql.federation import batch_reference_resolver
 
-from helper import get_review_by_id, get_user_reviews, get_product_reviews, reviews
+from helper import get_reviews_by_ids, get_user_reviews, get_product_reviews, reviews
 
 type_defs = gql(
     '''
@@ -37,9 +38,9 @@ def list_reviews(_, info, first: int = 5):
     return reviews[:first]
 
 
-@reference_resolver('Review')
-def resolve_reviews_reference(_, info, representation):
-    return get_review_by_id(representation['id'])
+@batch_reference_resolver('Review')
+def resolve_reviews_references(info, representations):
+    return get_reviews_by_ids([representation['id'] for representation in representations])
 
 
 @field_resolver('Review', 'author')
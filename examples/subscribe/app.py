@@ -3,10 +3,10 @@ from typing import Callable, Awaitable, AsyncIterator, Any, Dict
 
 import uvicorn
 from gql import gql, subscribe, mutate
-from gql_subscriptions.pubsubs.redis import RedisPubSub
 from stargql import GraphQL
+from stargql.pubsub import UnixSocketPubSub
 
-# from gql.pubsub import PubSub
+# from gql_subscriptions.pubsubs.redis import RedisPubSub
 
 type_defs = gql(
     """
@@ -29,7 +29,9 @@ type_defs = gql(
 """
 )
 
-pubsub = RedisPubSub('redis://localhost:6379')
+# Shared by the uvicorn workers of this machine, use `PubSub()` for a single process
+# or `RedisPubSub('redis://localhost:6379')` across machines.
+pubsub = UnixSocketPubSub('/tmp/stargql-example.sock')
 
 ResolverFn = Callable[[Any, Any, Dict[str, Any]], Awaitable[AsyncIterator]]
 FilterFn = Callable[[Any, Any, Dict[str, Any]], bool]
@@ -67,11 +69,7 @@ async def add_post(parent, info, **kwargs):
     return kwargs
 
 
-async def shutdown():
-    await pubsub.disconnect()
-
-
-app = GraphQL(type_defs=type_defs, on_shutdown=[shutdown])
+app = GraphQL(type_defs=type_defs, on_startup=[pubsub.connect], on_shutdown=[pubsub.close])
 
 
 if __name__ == '__main__':
@@ -1,3 +1,5 @@
 from .applications import GraphQL  # noqa
+from .cache import DocumentCache  # noqa
+from .dataloader import DataLoader  # noqa
 
 __version__ = '0.2.1'
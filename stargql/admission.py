@@ -0,0 +1,250 @@
+import asyncio
+import collections
+import math
+import time
+import typing
+from collections import OrderedDict
+
+from graphql import DocumentNode, GraphQLSchema, get_operation_ast
+from starlette import status
+from starlette.authentication import BaseUser
+from starlette.requests import HTTPConnection
+
+from .coalescing import user_identity
+from .validation import QueryCost
+
+ERROR_CODES = {
+    status.HTTP_429_TOO_MANY_REQUESTS: 'TOO_MANY_REQUESTS',
+    status.HTTP_503_SERVICE_UNAVAILABLE: 'SERVICE_UNAVAILABLE',
+}
+
+ClientKey = typing.Callable[[HTTPConnection, typing.Optional[BaseUser]], typing.Optional[typing.Hashable]]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+    @property
+    def code(self) -> str:
+        return ERROR_CODES[self.status_code]
+
+    @property
+    def headers(self) -> typing.Dict[str, str]:
+        return {'Retry-After': str(self.retry_after)}
+
+
+def default_client_key(connection: HTTPConnection, user: BaseUser = None) -> typing.Optional[typing.Hashable]:
+    """The authenticated user's identity, else the client address."""
+    identity = user_identity(user or connection.scope.get('user'))
+    if identity is not None:
+        return ('user', identity)
+    return ('address', connection.client.host) if connection.client else None
+
+
+def header_client_key(name: str) -> ClientKey:
+    """Key clients by the value of header `name`, like an API key."""
+
+    def client_key(connection: HTTPConnection, user: BaseUser = None) -> typing.Optional[typing.Hashable]:
+        return connection.headers.get(name)
+
+    return client_key
+
+
+class ClientBudget:
+    """Operations in flight and cost token bucket of one client."""
+
+    def __init__(self, capacity: float) -> None:
+        self.active = 0
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, rate: float, capacity: float) -> None:
+        now = time.monotonic()
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class AdmissionControl:
+    """Bound the operations executing at once, and what each client may run.
+
+    At most `max_concurrency` operations execute, up to `max_queue` more wait for a slot for `queue_timeout` seconds.
+    Beyond that requests are rejected with 503. Clients, keyed by `client_key(connection, user)`, run at most
+    `client_concurrency` operations at once and spend the cost of their operations (measured by `query_cost`) from a
+    budget of `client_cost_burst` replenished at `client_cost_rate` per second; either limit rejects with 429.
+    Rejections carry a `Retry-After` header. Requests without a client key only go through the global limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        max_queue: int = 256,
+        queue_timeout: float = 1.0,
+        client_key: ClientKey = default_client_key,
+        client_concurrency: int = None,
+        client_cost_rate: float = None,
+        client_cost_burst: float = None,
+        query_cost: QueryCost = None,
+        retry_after: int = 1,
+        max_clients: int = 10000,
+    ) -> None:
+        assert max_concurrency > 0, 'max_concurrency must be positive'
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_key = client_key
+        self.client_concurrency = client_concurrency
+        self.client_cost_rate = client_cost_rate
+        self.client_cost_burst = client_cost_rate if client_cost_burst is None else client_cost_burst
+        self.query_cost = query_cost or QueryCost()
+        self.retry_after = retry_after
+        self.max_clients = max_clients
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self._waiters = collections.deque()  # type: typing.Deque[asyncio.Future]
+        self._clients = OrderedDict()  # type: typing.Dict[typing.Hashable, ClientBudget]
+
+    @property
+    def measures_cost(self) -> bool:
+        return self.client_cost_rate is not None
+
+    def cost(
+        self,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        operation_name: typing.Optional[str],
+        variables: typing.Optional[typing.Dict[str, typing.Any]] = None,
+    ) -> int:
+        """Cost of the operation with the request's variables, which list sizes may depend on."""
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return 0
+        return self.query_cost.measure_document(
+            schema, document, operation, variables if isinstance(variables, dict) else None
+        )[1]
+
+    async def admit(
+        self, connection: HTTPConnection, cost: int = 0, user: BaseUser = None, hold: bool = True
+    ) -> typing.Optional[ClientBudget]:
+        """Admit an operation or raise `AdmissionRejected`, `release` what it returns once the operation is done.
+
+        Without `hold` (long-lived subscriptions) the operation is checked against the client limits and charged, but
+        takes no slot.
+        """
+        client = self.client(connection, user)
+        if client is not None:
+            self.check_client(client, cost)
+        if not hold:
+            return None
+        if client is not None:
+            client.active += 1
+        try:
+            await self.acquire()
+        except BaseException:
+            if client is not None:
+                client.active -= 1
+                if self.client_cost_rate is not None:
+                    # Never ran, give the cost back.
+                    client.tokens += cost
+            raise
+        return client
+
+    def release(self, client: typing.Optional[ClientBudget]) -> None:
+        if client is not None:
+            client.active -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot goes to the waiter as is.
+                self.queued -= 1
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def client(self, connection: HTTPConnection, user: BaseUser = None) -> typing.Optional[ClientBudget]:
+        if self.client_concurrency is None and self.client_cost_rate is None:
+            return None
+        key = self.client_key(connection, user)
+        if key is None:
+            return None
+        client = self._clients.get(key)
+        if client is None:
+            if len(self._clients) >= self.max_clients:
+                self.evict_idle_clients()
+            client = self._clients[key] = ClientBudget(self.client_cost_burst or 0)
+        else:
+            self._clients.move_to_end(key)
+        return client
+
+    def evict_idle_clients(self) -> None:
+        # Least recently seen first, clients with operations in flight are kept.
+        for key in list(self._clients):
+            if len(self._clients) < self.max_clients:
+                return
+            if not self._clients[key].active:
+                del self._clients[key]
+
+    def check_client(self, client: ClientBudget, cost: int) -> None:
+        if self.client_concurrency is not None and client.active >= self.client_concurrency:
+            raise self.reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                f'Too many concurrent operations, the limit is {self.client_concurrency}',
+            )
+        if self.client_cost_rate is None:
+            return
+        if cost > self.client_cost_burst:
+            raise self.reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                f'Operation cost {cost} exceeds the budget of {self.client_cost_burst}',
+                math.ceil(self.client_cost_burst / self.client_cost_rate),
+            )
+        client.refill(self.client_cost_rate, self.client_cost_burst)
+        if cost > client.tokens:
+            raise self.reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                f'Operation cost {cost} exceeds the remaining budget of {int(client.tokens)}',
+                math.ceil((cost - client.tokens) / self.client_cost_rate),
+            )
+        client.tokens -= cost
+
+    async def acquire(self) -> None:
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self.reject(status.HTTP_503_SERVICE_UNAVAILABLE, 'Server is overloaded, too many requests queued')
+
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        handle = loop.call_later(self.queue_timeout, self.expire, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self.queued -= 1
+            elif waiter.exception() is None:
+                # Given a slot just before being cancelled, pass it on.
+                self.release(None)
+            raise
+        finally:
+            handle.cancel()
+
+    def expire(self, waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            self.queued -= 1
+            waiter.set_exception(
+                self.reject(
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                    f'Server is overloaded, no slot freed up within {self.queue_timeout}s',
+                )
+            )
+
+    def reject(self, status_code: int, message: str, retry_after: int = None) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(status_code, message, max(retry_after or self.retry_after, 1))
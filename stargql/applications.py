@@ -1,23 +1,55 @@
-import json
+import asyncio
+import itertools
+import time
 import traceback
 import typing
+import zlib
+from inspect import isawaitable
 
 from gql import make_schema, make_schema_from_file, MiddlewareManager, ExecutionContext
 from gql.playground import PLAYGROUND_HTML
 from gql.resolver import default_field_resolver
 from gql.utils import place_files_in_operations
-from graphql import GraphQLError, GraphQLSchema, graphql
+from graphql import DocumentNode, ExecutionResult, GraphQLError, GraphQLSchema, execute, get_operation_ast
+from graphql.validation import ValidationRule
 from starlette import status
 from starlette.applications import Starlette
 from starlette.background import BackgroundTasks
+from starlette.datastructures import QueryParams
+from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
+from starlette.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from starlette.routing import BaseRoute, Route, WebSocketRoute
 from starlette.types import Receive, Scope, Send
 
+from .admission import AdmissionControl, AdmissionRejected
+from .cache import CachedDocument, DocumentCache
+from .cache_control import CacheControl, CachePolicy, etag_matches
+from .coalescing import RequestCoalescing
+from .compiler import CompiledExecutionContext, ExecutionPlan, current_plan
+from .dataloader import DataLoaderFactory, DataLoaderRegistry
+from .deadline import Deadline, apply_deadlines, current_deadline
+from .federation import register_batch_reference_resolvers
+from .field_cache import FieldCache
+from .gateway import Gateway
+from .incremental import (
+    IncrementalExecutionContext,
+    Publisher,
+    TracingIncrementalExecutionContext,
+    current_publisher,
+    with_incremental_directives,
+)
+from .offload import ResolverPool
+from .persisted import LRUPersistedQueryStore, PersistedQueryError, PersistedQueryStore, load_persisted_query
+from .serializers import Serializer, default_serializer
+from .tracing import Tracer, Tracing, TracingExecutionContext, current_tracer
+from .uploads import MultipartUploads, UploadTooLarge
+from .validation import ComplexityLimit, QueryCost, max_aliases_rule, query_limits_rule
 from .subscription import Subscription
 
 ERROR_FORMATER = typing.Callable[[GraphQLError], typing.Dict[str, typing.Any]]
+# Seconds a request runs before it starts watching for the client to disconnect.
+DISCONNECT_WATCH_DELAY = 0.05
 
 
 class GraphQL(Starlette):
@@ -35,43 +67,145 @@ class GraphQL(Starlette):
         path: str = '/',
         subscription_path: str = '/',
         subscription_authenticate: typing.Awaitable = None,
+        subscription_keep_alive: bool = False,
+        subscription_keep_alive_interval: float = 15.0,
+        subscription_idle_timeout: float = None,
+        subscription_init_timeout: float = None,
+        subscription_max_operations: int = 100,
+        subscription_send_queue_size: int = 100,
+        share_subscriptions: bool = False,
+        subscription_binary_frames: bool = False,
         error_formater: ERROR_FORMATER = None,
         graphql_middleware: typing.Union[tuple, list, typing.Dict[str, list]] = None,
         graphql_middleware_exclude: typing.List[str] = None,
         context_builder: typing.Callable = None,
+        document_cache_size: int = 1024,
+        persisted_queries: bool = True,
+        persisted_query_store: PersistedQueryStore = None,
+        batch_max_size: int = 20,
+        batch_concurrency: int = 10,
+        dataloaders: typing.Dict[str, DataLoaderFactory] = None,
+        serializer: Serializer = None,
+        max_depth: int = None,
+        max_aliases: int = None,
+        max_complexity: int = None,
+        query_cost: QueryCost = None,
+        validation_rules: typing.List[typing.Type[ValidationRule]] = None,
+        tracing: Tracing = None,
+        streaming_uploads: bool = False,
+        upload_max_file_size: int = None,
+        upload_max_size: int = None,
+        incremental_delivery: bool = False,
+        cache_control: CacheControl = None,
+        field_cache: FieldCache = None,
+        resolver_pool: ResolverPool = None,
+        offload_sync_resolvers: bool = False,
+        compiled_execution: bool = False,
+        gateway: Gateway = None,
+        coalescing: RequestCoalescing = None,
+        timeout: float = None,
+        operation_timeouts: typing.Dict[str, float] = None,
+        cancel_on_disconnect: bool = True,
+        admission: AdmissionControl = None,
+        response_streaming_threshold: int = None,
+        response_streaming_operations: typing.Sequence[str] = None,
+        response_chunk_size: int = 64 * 1024,
+        response_gzip: bool = False,
         **kwargs,
     ):
         routes = routes or []
         if schema:
             self.schema = schema
+        elif gateway is not None:
+            self.schema = gateway.schema
         elif type_defs:
             self.schema = make_schema(type_defs, federation=federation)
         elif schema_file:
             self.schema = make_schema_from_file(schema_file, federation=federation)
         else:
             raise Exception('Must provide type def string or file.')
+        if incremental_delivery:
+            self.schema = with_incremental_directives(self.schema)
+        register_batch_reference_resolvers(self.schema)
+        self.resolver_pool = ResolverPool() if resolver_pool is None else resolver_pool
+        self.resolver_pool.offload_resolvers(self.schema, offload_sync_resolvers)
+        validation_rules = list(validation_rules or [])
+        if max_depth is not None or max_complexity is not None:
+            validation_rules.append(query_limits_rule(max_depth, max_complexity, query_cost))
+        if max_aliases is not None:
+            validation_rules.append(max_aliases_rule(max_aliases))
+        complexity_limit = None
+        if max_complexity is not None:
+            complexity_limit = ComplexityLimit(max_complexity, query_cost)
+        self.document_cache = DocumentCache(document_cache_size, validation_rules)
+        self.serializer = serializer or default_serializer()
 
+        app = ASGIApp(
+            self.schema,
+            debug=debug,
+            playground=playground,
+            error_formater=error_formater,
+            graphql_middleware=graphql_middleware,
+            graphql_middleware_exclude=graphql_middleware_exclude,
+            context_builder=context_builder,
+            document_cache=self.document_cache,
+            persisted_queries=persisted_queries,
+            persisted_query_store=persisted_query_store,
+            batch_max_size=batch_max_size,
+            batch_concurrency=batch_concurrency,
+            dataloaders=dataloaders,
+            serializer=self.serializer,
+            tracing=tracing,
+            streaming_uploads=streaming_uploads,
+            upload_max_file_size=upload_max_file_size,
+            upload_max_size=upload_max_size,
+            incremental_delivery=incremental_delivery,
+            cache_control=cache_control,
+            field_cache=field_cache,
+            compiled_execution=compiled_execution,
+            gateway=gateway,
+            coalescing=coalescing,
+            timeout=timeout,
+            operation_timeouts=operation_timeouts,
+            cancel_on_disconnect=cancel_on_disconnect,
+            admission=admission,
+            response_streaming_threshold=response_streaming_threshold,
+            response_streaming_operations=response_streaming_operations,
+            response_chunk_size=response_chunk_size,
+            response_gzip=response_gzip,
+            complexity_limit=complexity_limit,
+        )
         routes.extend(
             [
-                Route(
-                    path,
-                    ASGIApp(
+                Route(path, app),
+                WebSocketRoute(
+                    subscription_path,
+                    Subscription(
                         self.schema,
-                        debug=debug,
-                        playground=playground,
-                        error_formater=error_formater,
-                        graphql_middleware=graphql_middleware,
-                        graphql_middleware_exclude=graphql_middleware_exclude,
+                        keep_alive=subscription_keep_alive,
+                        keep_alive_interval=subscription_keep_alive_interval,
+                        idle_timeout=subscription_idle_timeout,
+                        connection_init_timeout=subscription_init_timeout,
+                        max_operations=subscription_max_operations,
+                        send_queue_size=subscription_send_queue_size,
+                        share_subscriptions=share_subscriptions,
+                        binary_frames=subscription_binary_frames,
+                        authenticate=subscription_authenticate,
+                        document_cache=self.document_cache,
+                        dataloaders=dataloaders,
+                        serializer=self.serializer,
+                        admission=admission,
+                        complexity_limit=complexity_limit,
+                        middleware=app.middleware_manager,
                         context_builder=context_builder,
                     ),
                 ),
-                WebSocketRoute(
-                    subscription_path,
-                    Subscription(self.schema, authenticate=subscription_authenticate),
-                ),
             ]
         )
         super().__init__(debug=debug, routes=routes, **kwargs)
+        self.add_event_handler('shutdown', self.resolver_pool.shutdown)
+        if gateway is not None:
+            self.add_event_handler('shutdown', gateway.close)
 
 
 class ASGIApp:
@@ -84,11 +218,40 @@ class ASGIApp:
         graphql_middleware: typing.Union[tuple, list, typing.Dict[str, list]] = None,
         graphql_middleware_exclude: typing.List[str] = None,
         context_builder: typing.Callable = None,
+        document_cache: DocumentCache = None,
+        persisted_queries: bool = True,
+        persisted_query_store: PersistedQueryStore = None,
+        batch_max_size: int = 20,
+        batch_concurrency: int = 10,
+        dataloaders: typing.Dict[str, DataLoaderFactory] = None,
+        serializer: Serializer = None,
+        tracing: Tracing = None,
+        streaming_uploads: bool = False,
+        upload_max_file_size: int = None,
+        upload_max_size: int = None,
+        incremental_delivery: bool = False,
+        cache_control: CacheControl = None,
+        field_cache: FieldCache = None,
+        compiled_execution: bool = False,
+        gateway: Gateway = None,
+        coalescing: RequestCoalescing = None,
+        timeout: float = None,
+        operation_timeouts: typing.Dict[str, float] = None,
+        cancel_on_disconnect: bool = True,
+        admission: AdmissionControl = None,
+        response_streaming_threshold: int = None,
+        response_streaming_operations: typing.Sequence[str] = None,
+        response_chunk_size: int = 64 * 1024,
+        response_gzip: bool = False,
+        complexity_limit: ComplexityLimit = None,
     ) -> None:
         self.schema = schema
         self.playground = playground
         self.error_formater = error_formater or self.format_error
         self.debug = debug
+        self.field_cache = field_cache
+        if field_cache is not None:
+            graphql_middleware = field_cache.middleware(graphql_middleware)
         if not graphql_middleware:
             self.middleware_manager = None
         elif isinstance(graphql_middleware, (tuple, list)):
@@ -108,6 +271,38 @@ class ASGIApp:
             )
 
         self.context_builder = context_builder
+        self.document_cache = DocumentCache() if document_cache is None else document_cache
+        if not persisted_queries:
+            self.persisted_query_store = None
+        elif persisted_query_store is None:
+            self.persisted_query_store = LRUPersistedQueryStore()
+        else:
+            self.persisted_query_store = persisted_query_store
+        assert batch_concurrency >= 1, 'batch_concurrency must be at least 1'
+        self.batch_max_size = batch_max_size
+        self.batch_concurrency = batch_concurrency
+        self.dataloaders = dataloaders
+        self.serializer = serializer or default_serializer()
+        self.tracing = tracing
+        self.streaming_uploads = streaming_uploads
+        self.upload_max_file_size = upload_max_file_size
+        self.upload_max_size = upload_max_size
+        self.incremental_delivery = incremental_delivery
+        self.cache_control = cache_control
+        self.compiled_execution = compiled_execution
+        self.gateway = gateway
+        self.coalescing = coalescing
+        self.timeout = timeout
+        self.operation_timeouts = operation_timeouts or {}
+        if timeout is not None or self.operation_timeouts:
+            apply_deadlines(schema)
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.admission = admission
+        self.response_streaming_threshold = response_streaming_threshold
+        self.response_streaming_operations = set(response_streaming_operations or ())
+        self.response_chunk_size = response_chunk_size
+        self.response_gzip = response_gzip
+        self.complexity_limit = complexity_limit
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         request = Request(scope, receive=receive, send=send)
@@ -133,7 +328,118 @@ class ASGIApp:
             formatted.update(extensions=error.extensions)
         return formatted
 
+    async def execute(
+        self,
+        query: str,
+        variables: typing.Optional[typing.Dict[str, typing.Any]],
+        operation_name: typing.Optional[str],
+        context: typing.Any,
+        tracer: Tracer = None,
+        publisher: Publisher = None,
+        policy: CachePolicy = None,
+    ) -> ExecutionResult:
+        cached = self.document_cache.get(self.schema, query, tracer)
+        if cached.errors:
+            return ExecutionResult(data=None, errors=cached.errors)
+        if self.complexity_limit is not None:
+            error = self.complexity_limit.check(self.schema, cached.document, operation_name, variables)
+            if error is not None:
+                return ExecutionResult(data=None, errors=[error])
+        if policy is not None:
+            policy.restrict(self.cache_control.document_policy(self.schema, cached, operation_name))
+        if self.gateway is not None:
+            return await self.gateway.execute(cached.document, variables, operation_name, context)
+
+        timeout = self.timeout
+        if self.operation_timeouts:
+            operation = get_operation_ast(cached.document, operation_name)
+            if operation is not None and operation.name is not None:
+                timeout = self.operation_timeouts.get(operation.name.value, timeout)
+        if timeout is None:
+            return await self.execute_cached(cached, variables, operation_name, context, tracer, publisher)
+        deadline = Deadline(timeout)
+        deadline_token = current_deadline.set(deadline)
+        try:
+            return await self.execute_cached(cached, variables, operation_name, context, tracer, publisher)
+        finally:
+            current_deadline.reset(deadline_token)
+            deadline.cancel()
+
+    async def execute_cached(
+        self,
+        cached: CachedDocument,
+        variables: typing.Optional[typing.Dict[str, typing.Any]],
+        operation_name: typing.Optional[str],
+        context: typing.Any,
+        tracer: Tracer = None,
+        publisher: Publisher = None,
+    ) -> ExecutionResult:
+        if tracer is None and publisher is None:
+            if self.compiled_execution:
+                if cached.plan is None:
+                    cached.plan = ExecutionPlan(self.schema, cached.document)
+                if cached.plan.supported:
+                    plan_token = current_plan.set(cached.plan)
+                    try:
+                        return await self.execute_document(
+                            cached.document, variables, operation_name, context, CompiledExecutionContext
+                        )
+                    finally:
+                        current_plan.reset(plan_token)
+            return await self.execute_document(cached.document, variables, operation_name, context)
+
+        if publisher is None:
+            execution_context_class = TracingExecutionContext
+        elif tracer is None:
+            execution_context_class = IncrementalExecutionContext
+        else:
+            execution_context_class = TracingIncrementalExecutionContext
+        tracer_token = current_tracer.set(tracer)
+        publisher_token = current_publisher.set(publisher)
+        try:
+            if tracer is None:
+                return await self.execute_document(
+                    cached.document, variables, operation_name, context, execution_context_class
+                )
+            with tracer.phase('execution'):
+                return await self.execute_document(
+                    cached.document, variables, operation_name, context, execution_context_class
+                )
+        finally:
+            current_publisher.reset(publisher_token)
+            current_tracer.reset(tracer_token)
+
+    async def execute_document(
+        self,
+        document: DocumentNode,
+        variables: typing.Optional[typing.Dict[str, typing.Any]],
+        operation_name: typing.Optional[str],
+        context: typing.Any,
+        execution_context_class: typing.Type[ExecutionContext] = ExecutionContext,
+    ) -> ExecutionResult:
+        result = execute(
+            self.schema,
+            document,
+            variable_values=variables,
+            operation_name=operation_name,
+            context_value=context,
+            field_resolver=default_field_resolver,
+            middleware=self.middleware_manager,
+            execution_context_class=execution_context_class,
+        )
+        if isawaitable(result):
+            result = await result
+        return result
+
+    def decode_query_params(self, params: typing.Mapping[str, str]) -> typing.Dict[str, typing.Any]:
+        data = dict(params)  # type: typing.Dict[str, typing.Any]
+        for key in ('variables', 'extensions'):
+            if data.get(key):
+                data[key] = self.serializer.loads(data[key])
+        return data
+
     async def handle_graphql(self, request: Request) -> Response:
+        uploads = None  # type: typing.Optional[MultipartUploads]
         if request.method in ('GET', 'HEAD'):
             if 'text/html' in request.headers.get('Accept', ''):
                 if not self.playground:
@@ -146,17 +452,43 @@ class ASGIApp:
             content_type = request.headers.get('Content-Type', '')
 
             if 'application/json' in content_type:
-                data = await request.json()
+                try:
+                    data = self.serializer.loads(await request.body())
+                except ValueError:
+                    return PlainTextResponse(
+                        'Request body sent invalid JSON',
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                    )
             elif 'application/graphql' in content_type:
                 body = await request.body()
                 data = {'query': body.decode()}
             elif 'query' in request.query_params:
                 data = request.query_params
+            elif 'multipart/form-data' in content_type and self.streaming_uploads:
+                uploads = MultipartUploads(
+                    request.headers, request.stream(), self.upload_max_file_size, self.upload_max_size
+                )
+                try:
+                    operations, files_map = await uploads.read_operations()
+                except UploadTooLarge as exc:
+                    return PlainTextResponse(str(exc), status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                except ValueError as exc:
+                    return PlainTextResponse(str(exc), status_code=status.HTTP_400_BAD_REQUEST)
+                try:
+                    operations = self.serializer.loads(operations)
+                    files_map = self.serializer.loads(files_map)
+                    data = place_files_in_operations(operations, files_map, uploads.start(files_map))
+                except (AttributeError, TypeError, ValueError, KeyError, IndexError):
+                    await uploads.close()
+                    return PlainTextResponse(
+                        'operations or map sent invalid JSON',
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                    )
             elif 'multipart/form-data' in content_type:
                 form = await request.form()
                 try:
-                    operations = json.loads(form.get('operations', '{}'))
-                    files_map = json.loads(form.get('map', '{}'))
+                    operations = self.serializer.loads(form.get('operations', '{}'))
+                    files_map = self.serializer.loads(form.get('map', '{}'))
                 except (TypeError, ValueError):
                     return PlainTextResponse(
                         'operations or map sent invalid JSON',
@@ -172,31 +504,326 @@ class ASGIApp:
             return PlainTextResponse('Method Not Allowed', status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         try:
-            query = data['query']
-            variables = data.get('variables')
-            operation_name = data.get('operationName')
-        except KeyError:
-            return PlainTextResponse(
-                'No GraphQL query found in the request',
-                status_code=status.HTTP_400_BAD_REQUEST,
-            )
+            # Streaming uploads are still reading the body, the disconnect shows up there instead.
+            if self.cancel_on_disconnect and uploads is None:
+                return await self.cancel_on_client_disconnect(request, self.handle_data(request, data))
+            return await self.handle_data(request, data)
+        finally:
+            if uploads is not None:
+                await uploads.close()
+
+    async def cancel_on_client_disconnect(self, request: Request, handler: typing.Awaitable[Response]) -> Response:
+        """Run `handler`, cancelling it when the client disconnects first. The request body must have been read."""
+        task = asyncio.current_task()
+        disconnected = False
+
+        async def watch() -> None:
+            nonlocal disconnected
+            await self.wait_for_disconnect(request)
+            disconnected = True
+            task.cancel()
+
+        watcher = None  # type: typing.Optional[asyncio.Future]
+
+        def start_watching() -> None:
+            nonlocal watcher
+            watcher = asyncio.ensure_future(watch())
+
+        # Most requests finish before a disconnect could matter, they never pay for the watcher task.
+        handle = asyncio.get_event_loop().call_later(DISCONNECT_WATCH_DELAY, start_watching)
+        try:
+            return await handler
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+            uncancel = getattr(task, 'uncancel', None)
+            if uncancel is not None:
+                uncancel()
+            return PlainTextResponse('Client Closed Request', status_code=499)
+        finally:
+            handle.cancel()
+            if watcher is not None:
+                watcher.cancel()
+
+    async def wait_for_disconnect(self, request: Request) -> None:
+        while True:
+            message = await request.receive()
+            if message['type'] == 'http.disconnect':
+                return
 
+    async def handle_data(self, request: Request, data: typing.Any) -> Response:
+        if isinstance(data, QueryParams):
+            try:
+                data = self.decode_query_params(data)
+            except ValueError:
+                return PlainTextResponse(
+                    'variables or extensions sent invalid JSON',
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+
+        if isinstance(data, list):
+            if not self.batch_max_size:
+                return PlainTextResponse('Batching is not enabled', status_code=status.HTTP_400_BAD_REQUEST)
+            if len(data) > self.batch_max_size:
+                return PlainTextResponse(
+                    f'Batch size exceeds the limit of {self.batch_max_size} operations',
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+
+        policy = None
+        if self.cache_control is not None and isinstance(data, typing.Mapping):
+            response_cache = self.cache_control.response_cache
+            cached = response_cache.get(request, data) if response_cache is not None else None
+            if cached is not None:
+                max_age = max(int(cached.expires - time.monotonic()), 0)
+                return self.cache_response(request, cached.body, cached.etag, cached.policy, max_age)
+            policy = CachePolicy()
+
+        if self.admission is None:
+            return await self.respond(request, data, policy)
+        cost = await self.operation_cost(data) if self.admission.measures_cost else 0
+        try:
+            client = await self.admission.admit(request, cost)
+        except AdmissionRejected as exc:
+            return PlainTextResponse(exc.message, status_code=exc.status_code, headers=exc.headers)
+        try:
+            return await self.respond(request, data, policy)
+        finally:
+            self.admission.release(client)
+
+    async def respond(self, request: Request, data: typing.Any, policy: typing.Optional[CachePolicy]) -> Response:
         background = BackgroundTasks()
+        publisher = None
+        if self.incremental_delivery and 'multipart/mixed' in request.headers.get('Accept', ''):
+            publisher = Publisher()
+
+        body = None
+        if isinstance(data, list):
+            response_data = await self.run_batch(data, lambda: self.build_context(request, background))
+        else:
+            context = self.build_context(request, background)
+            coalescing_key = None
+            if self.coalescing is not None and publisher is None and self.tracing is None:
+                coalescing_key = await self.coalescing_key(request, data)
+            try:
+                if coalescing_key is None:
+                    response_data = await self.run_operation(data, context, publisher, policy)
+                else:
+                    response_data, body, policy = await self.coalescing.run(
+                        coalescing_key, lambda: self.run_shared_operation(data, context, policy)
+                    )
+            except HTTPException as exc:
+                return PlainTextResponse(exc.detail, status_code=exc.status_code)
+            if publisher is not None and publisher.pending:
+                return self.incremental_response(response_data, publisher, background)
+            if policy is not None and not response_data.get('errors'):
+                body = self.serializer.dumps(response_data) if body is None else body
+                etag = None
+                if self.cache_control.etags and (policy.cacheable or request.method in ('GET', 'HEAD')):
+                    etag = self.cache_control.etag(body)
+                if policy.cacheable and self.cache_control.response_cache is not None:
+                    self.cache_control.response_cache.set(request, data, body, etag, policy)
+                return self.cache_response(request, body, etag, policy, background=background)
+        # status_code = status.HTTP_400_BAD_REQUEST if result.errors else status.HTTP_200_OK
+
+        if body is not None:
+            return Response(body, media_type=self.serializer.media_type, background=background)
+        if self.response_streaming_threshold is not None or self.response_streaming_operations:
+            return await self.streaming_json_response(request, data, response_data, background)
+        return self.json_response(response_data, status_code=status.HTTP_200_OK, background=background)
+
+    def build_context(self, request: Request, background: BackgroundTasks) -> typing.Any:
         context = self.context_builder() if self.context_builder else {}
         context.update(request=request, background=background)
+        if self.dataloaders:
+            context.update(loaders=DataLoaderRegistry(self.dataloaders))
+        return context
 
-        result = await graphql(
-            self.schema,
-            query,
-            variable_values=variables,
-            operation_name=operation_name,
-            context_value=context,
-            field_resolver=default_field_resolver,
-            middleware=self.middleware_manager,
-            execution_context_class=ExecutionContext,
+    def cache_response(
+        self,
+        request: Request,
+        body: bytes,
+        etag: typing.Optional[str],
+        policy: CachePolicy,
+        max_age: int = None,
+        background: BackgroundTasks = None,
+    ) -> Response:
+        headers = {}
+        if policy.cacheable:
+            headers['Cache-Control'] = policy.header(max_age)
+        if etag is not None:
+            headers['ETag'] = etag
+            if etag_matches(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers, background=background)
+        return Response(body, media_type=self.serializer.media_type, headers=headers, background=background)
+
+    def json_response(
+        self, data: typing.Any, status_code: int = status.HTTP_200_OK, background: BackgroundTasks = None
+    ) -> Response:
+        return Response(
+            self.serializer.dumps(data),
+            status_code=status_code,
+            media_type=self.serializer.media_type,
+            background=background,
         )
+
+    async def streaming_json_response(
+        self, request: Request, data: typing.Any, response_data: typing.Any, background: BackgroundTasks = None
+    ) -> Response:
+        """Serialize the result chunk by chunk, streamed once past the threshold or when its operation asks for it."""
+        streamed = await self.streams_operation(data)
+        if not streamed and self.response_streaming_threshold is None:
+            return self.json_response(response_data, background=background)
+        chunks = self.serializer.iter_dumps(response_data, self.response_chunk_size)
+        head = []  # type: typing.List[bytes]
+        if not streamed:
+            size = 0
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size > self.response_streaming_threshold:
+                    break
+            else:
+                return Response(b''.join(head), media_type=self.serializer.media_type, background=background)
+
+        headers = {}
+        compress = self.response_gzip and 'gzip' in request.headers.get('Accept-Encoding', '')
+        if compress:
+            headers.update({'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+        return StreamingResponse(
+            self.encode_chunks(itertools.chain(head, chunks), compress),
+            media_type=self.serializer.media_type,
+            headers=headers,
+            background=background,
+        )
+
+    async def streams_operation(self, data: typing.Any) -> bool:
+        if not self.response_streaming_operations:
+            return False
+        cached = await self.cached_document(data)
+        if cached is None:
+            return False
+        operation = get_operation_ast(cached.document, data.get('operationName'))
+        return operation is not None and operation.name is not None and (
+            operation.name.value in self.response_streaming_operations
+        )
+
+    async def encode_chunks(self, chunks: typing.Iterable[bytes], compress: bool) -> typing.AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+        for chunk in chunks:
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if compressor is not None:
+            yield compressor.flush()
+
+    def incremental_response(
+        self, data: typing.Dict[str, typing.Any], publisher: Publisher, background: BackgroundTasks = None
+    ) -> Response:
+        """Send the initial result, then deferred and streamed patches as they resolve, as multipart/mixed."""
+
+        def part(payload: typing.Dict[str, typing.Any]) -> bytes:
+            headers = f'\r\n---\r\nContent-Type: {self.serializer.media_type}; charset=utf-8\r\n\r\n'
+            return headers.encode('utf-8') + self.serializer.dumps(payload)
+
+        async def stream() -> typing.AsyncIterator[bytes]:
+            try:
+                yield part(dict(data, hasNext=True))
+                async for patches, has_next in publisher.subsequent_payloads():
+                    payload = {'hasNext': has_next}  # type: typing.Dict[str, typing.Any]
+                    if patches:
+                        payload['incremental'] = [self.format_patch(patch) for patch in patches]
+                    yield part(payload)
+                yield b'\r\n-----\r\n'
+            finally:
+                publisher.cancel()
+
+        return StreamingResponse(stream(), media_type='multipart/mixed; boundary="-"', background=background)
+
+    def format_patch(self, patch: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        if 'errors' in patch:
+            patch = dict(patch, errors=[self.error_formater(error) for error in patch['errors']])
+        return patch
+
+    async def run_operation(
+        self, data: typing.Any, context: typing.Any, publisher: Publisher = None, policy: CachePolicy = None
+    ) -> typing.Dict[str, typing.Any]:
+        if not isinstance(data, typing.Mapping):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, 'No GraphQL query found in the request')
+
+        query = data.get('query')
+        variables = data.get('variables')
+        operation_name = data.get('operationName')
+        extensions = data.get('extensions')
+        if self.persisted_query_store is not None and isinstance(extensions, dict) and 'persistedQuery' in extensions:
+            try:
+                query = await load_persisted_query(self.persisted_query_store, query, extensions['persistedQuery'])
+            except PersistedQueryError as error:
+                return {'data': None, 'errors': [self.error_formater(error)]}
+        if query is None:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, 'No GraphQL query found in the request')
+
+        tracer = self.tracing.start() if self.tracing is not None else None
+        result = await self.execute(query, variables, operation_name, context, tracer, publisher, policy)
         error_data = [self.error_formater(err) for err in result.errors] if result.errors else None
         response_data = {'data': result.data, 'errors': error_data}
-        # status_code = status.HTTP_400_BAD_REQUEST if result.errors else status.HTTP_200_OK
+        if tracer is not None:
+            extensions = self.tracing.finish(tracer)
+            if extensions:
+                response_data['extensions'] = extensions
+        return response_data
+
+    async def cached_document(self, data: typing.Any) -> typing.Optional[CachedDocument]:
+        """The valid document of a request before running it, looking up persisted queries, else None."""
+        if not isinstance(data, typing.Mapping):
+            return None
+        query = data.get('query')
+        extensions = data.get('extensions')
+        if query is None and self.persisted_query_store is not None and isinstance(extensions, dict):
+            persisted_query = extensions.get('persistedQuery')
+            if isinstance(persisted_query, dict) and isinstance(persisted_query.get('sha256Hash'), str):
+                query = await self.persisted_query_store.get(persisted_query['sha256Hash'])
+        if not isinstance(query, str):
+            return None
+        cached = self.document_cache.get(self.schema, query)
+        return None if cached.errors else cached
+
+    async def coalescing_key(self, request: Request, data: typing.Any) -> typing.Optional[typing.Hashable]:
+        cached = await self.cached_document(data)
+        if cached is None:
+            return None
+        return self.coalescing.key(request, self.schema, cached.document, data, self.cache_control)
+
+    async def operation_cost(self, data: typing.Any) -> int:
+        """Cost of the operation, or of every operation of a batch, invalid ones are free as they do not run."""
+        cost = 0
+        for operation in data if isinstance(data, list) else [data]:
+            cached = await self.cached_document(operation)
+            if cached is not None:
+                cost += self.admission.cost(
+                    self.schema, cached.document, operation.get('operationName'), operation.get('variables')
+                )
+        return cost
+
+    async def run_shared_operation(
+        self, data: typing.Any, context: typing.Any, policy: CachePolicy = None
+    ) -> typing.Tuple[typing.Dict[str, typing.Any], bytes, typing.Optional[CachePolicy]]:
+        response_data = await self.run_operation(data, context, policy=policy)
+        return response_data, self.serializer.dumps(response_data), policy
+
+    async def run_batch(
+        self, operations: typing.List[typing.Any], build_context: typing.Callable[[], typing.Any]
+    ) -> typing.List[typing.Any]:
+        # Every operation gets its own context (and loaders), like separate requests would.
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def run(data: typing.Any) -> typing.Dict[str, typing.Any]:
+            async with semaphore:
+                try:
+                    return await self.run_operation(data, build_context())
+                except HTTPException as exc:
+                    return {'data': None, 'errors': [self.error_formater(GraphQLError(exc.detail))]}
 
-        return JSONResponse(response_data, status_code=status.HTTP_200_OK, background=background)
+        return await asyncio.gather(*(run(data) for data in operations))
@@ -0,0 +1,74 @@
+import typing
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+from graphql import DocumentNode, GraphQLError, GraphQLSchema, parse, specified_rules, validate, validate_schema
+from graphql.validation import ValidationRule
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .cache_control import CachePolicy
+    from .compiler import ExecutionPlan
+    from .tracing import Tracer
+
+
+@dataclass
+class CachedDocument:
+    document: typing.Optional[DocumentNode]
+    errors: typing.Optional[typing.List[GraphQLError]] = None
+    plan: typing.Optional['ExecutionPlan'] = None
+    policies: typing.Dict[typing.Tuple[typing.Any, typing.Optional[str]], 'CachePolicy'] = field(default_factory=dict)
+
+
+class DocumentCache:
+    """Bounded LRU cache of parsed and validated documents, keyed by schema and query text."""
+
+    def __init__(
+        self, maxsize: int = 1024, validation_rules: typing.Sequence[typing.Type[ValidationRule]] = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.validation_rules = list(specified_rules) + list(validation_rules or [])
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()  # type: typing.Dict[typing.Tuple[GraphQLSchema, str], CachedDocument]
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def clear(self) -> None:
+        self._documents.clear()
+        self.hits = self.misses = 0
+
+    def get(self, schema: GraphQLSchema, query: str, tracer: 'Tracer' = None) -> CachedDocument:
+        if not isinstance(query, str):
+            return CachedDocument(None, [GraphQLError('Must provide query string.')])
+
+        key = (schema, query)
+        cached = self._documents.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._documents.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        cached = self.build(schema, query, tracer)
+        if self.maxsize > 0:
+            self._documents[key] = cached
+            if len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return cached
+
+    def build(self, schema: GraphQLSchema, query: str, tracer: 'Tracer' = None) -> CachedDocument:
+        schema_errors = validate_schema(schema)
+        if schema_errors:
+            return CachedDocument(None, schema_errors)
+
+        try:
+            with tracer.phase('parsing') if tracer else nullcontext():
+                document = parse(query)
+        except GraphQLError as error:
+            return CachedDocument(None, [error])
+
+        with tracer.phase('validation') if tracer else nullcontext():
+            errors = validate(schema, document, self.validation_rules)
+        return CachedDocument(document, errors or None)
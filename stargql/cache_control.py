@@ -0,0 +1,329 @@
+import hashlib
+import json
+import time
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from graphql import (
+    DocumentNode,
+    EnumValueNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLInterfaceType,
+    GraphQLNamedType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationType,
+    SelectionSetNode,
+    get_named_type,
+    get_operation_ast,
+    is_composite_type,
+)
+from starlette.requests import Request
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .cache import CachedDocument
+
+PUBLIC = 'PUBLIC'
+PRIVATE = 'PRIVATE'
+
+# Add to type_defs to use the directive in SDL.
+CACHE_CONTROL_TYPE_DEFS = '''
+enum CacheControlScope {
+  PUBLIC
+  PRIVATE
+}
+
+directive @cacheControl(maxAge: Int, scope: CacheControlScope) on FIELD_DEFINITION | OBJECT | INTERFACE | UNION
+'''
+
+SessionId = typing.Callable[[Request], typing.Optional[str]]
+
+
+def operation_key(data: typing.Mapping[str, typing.Any]) -> typing.Optional[str]:
+    """Query hash, operation name and variables of a request, None without a query or persisted query hash."""
+    query = data.get('query')
+    if isinstance(query, str):
+        query_hash = hashlib.sha256(query.encode('utf-8')).hexdigest()
+    else:
+        extensions = data.get('extensions')
+        persisted_query = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        query_hash = persisted_query.get('sha256Hash') if isinstance(persisted_query, dict) else None
+        if not isinstance(query_hash, str):
+            return None
+    variables = json.dumps(data.get('variables'), sort_keys=True, default=str)
+    return f'{query_hash}:{data.get("operationName")}:{variables}'
+
+
+@dataclass
+class CacheHint:
+    max_age: typing.Optional[int] = None
+    scope: typing.Optional[str] = None
+
+
+@dataclass
+class CachePolicy:
+    max_age: typing.Optional[int] = None
+    scope: str = PUBLIC
+
+    def restrict(self, hint: typing.Union[CacheHint, 'CachePolicy']) -> None:
+        if hint.max_age is not None and (self.max_age is None or hint.max_age < self.max_age):
+            self.max_age = hint.max_age
+        if hint.scope == PRIVATE:
+            self.scope = PRIVATE
+
+    @property
+    def cacheable(self) -> bool:
+        return bool(self.max_age)
+
+    def header(self, max_age: int = None) -> str:
+        max_age = self.max_age if max_age is None else max_age
+        return f'max-age={max_age}, {self.scope.lower()}'
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    policy: CachePolicy
+    expires: float
+
+
+class ResponseCache:
+    """In-process TTL cache of whole responses.
+
+    Keys are the query hash, variables and operation name, `PRIVATE` responses are also keyed by `session_id(request)`
+    and are not cached when it returns None.
+    """
+
+    def __init__(self, maxsize: int = 1024, session_id: SessionId = None) -> None:
+        self.maxsize = maxsize
+        self.session_id = session_id
+        self.hits = 0
+        self.misses = 0
+        self._responses = OrderedDict()  # type: typing.Dict[typing.Tuple[str, typing.Optional[str]], CachedResponse]
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def clear(self) -> None:
+        self._responses.clear()
+        self.hits = self.misses = 0
+
+    def base_key(self, data: typing.Mapping[str, typing.Any]) -> typing.Optional[str]:
+        return operation_key(data)
+
+    def get(self, request: Request, data: typing.Mapping[str, typing.Any]) -> typing.Optional[CachedResponse]:
+        base_key = self.base_key(data)
+        if base_key is None:
+            return None
+        keys = [(base_key, None)]
+        session_id = self.session_id(request) if self.session_id else None
+        if session_id is not None:
+            keys.append((base_key, session_id))
+        now = time.monotonic()
+        for key in keys:
+            cached = self._responses.get(key)
+            if cached is None:
+                continue
+            if cached.expires <= now:
+                del self._responses[key]
+                continue
+            self.hits += 1
+            self._responses.move_to_end(key)
+            return cached
+        self.misses += 1
+        return None
+
+    def set(
+        self,
+        request: Request,
+        data: typing.Mapping[str, typing.Any],
+        body: bytes,
+        etag: str,
+        policy: CachePolicy,
+    ) -> None:
+        base_key = self.base_key(data)
+        if base_key is None or self.maxsize <= 0:
+            return
+        session_id = None
+        if policy.scope == PRIVATE:
+            session_id = self.session_id(request) if self.session_id else None
+            if session_id is None:
+                return
+        key = (base_key, session_id)
+        self._responses[key] = CachedResponse(body, etag, policy, time.monotonic() + policy.max_age)
+        self._responses.move_to_end(key)
+        if len(self._responses) > self.maxsize:
+            self._responses.popitem(last=False)
+
+
+class CacheControl:
+    """Compute a cache policy per operation from `@cacheControl` directives and `hints`.
+
+    `hints` are keyed by `'Type'` or `'Type.field'` and take precedence over directives. Like Apollo, root fields
+    and fields returning composite types without a hint get `default_max_age`, the operation gets the lowest
+    `maxAge` of its fields and is `PRIVATE` if any of them is. Mutations and subscriptions are never cached.
+    """
+
+    def __init__(
+        self,
+        hints: typing.Dict[str, CacheHint] = None,
+        default_max_age: int = 0,
+        etags: bool = True,
+        response_cache: ResponseCache = None,
+    ) -> None:
+        self.hints = hints or {}
+        self.default_max_age = default_max_age
+        self.etags = etags
+        self.response_cache = response_cache
+
+    def policy(
+        self, schema: GraphQLSchema, document: DocumentNode, operation_name: str = None, policy: CachePolicy = None
+    ) -> CachePolicy:
+        policy = CachePolicy() if policy is None else policy
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            policy.restrict(CacheHint(max_age=0))
+            return policy
+
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.restrict_selection_set(policy, schema, schema.query_type, operation.selection_set, fragments, (), {}, True)
+        return policy
+
+    def document_policy(
+        self, schema: GraphQLSchema, cached: 'CachedDocument', operation_name: str = None
+    ) -> CachePolicy:
+        """`policy` of a parsed document, computed once per operation and kept with it."""
+        key = (self, operation_name)
+        policy = cached.policies.get(key)
+        if policy is None:
+            policy = cached.policies[key] = self.policy(schema, cached.document, operation_name)
+        return policy
+
+    def restrict_selection_set(
+        self,
+        policy: CachePolicy,
+        schema: GraphQLSchema,
+        parent_type: typing.Optional[GraphQLNamedType],
+        selection_set: SelectionSetNode,
+        fragments: typing.Dict[str, FragmentDefinitionNode],
+        visited: typing.Tuple[str, ...],
+        restrictions: typing.Dict[typing.Tuple[str, str, bool], CachePolicy],
+        root: bool = False,
+    ) -> None:
+        # `visited` are the fragments spread on the path to this selection set, `restrictions` what each fragment
+        # spread so far restricts the policy to, so that a fragment is only walked once per type.
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                self.restrict_field(policy, schema, parent_type, selection, fragments, visited, restrictions, root)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = fragments.get(name)
+                if not fragment or name in visited:
+                    continue
+                fragment_type = self.fragment_type(schema, fragment, parent_type)
+                key = (name, fragment_type.name if fragment_type else '', root)
+                restriction = restrictions.get(key)
+                if restriction is None:
+                    restriction = restrictions[key] = CachePolicy()
+                    self.restrict_selection_set(
+                        restriction,
+                        schema,
+                        fragment_type,
+                        fragment.selection_set,
+                        fragments,
+                        visited + (name,),
+                        restrictions,
+                        root,
+                    )
+                policy.restrict(restriction)
+            elif isinstance(selection, InlineFragmentNode):
+                self.restrict_selection_set(
+                    policy,
+                    schema,
+                    self.fragment_type(schema, selection, parent_type),
+                    selection.selection_set,
+                    fragments,
+                    visited,
+                    restrictions,
+                    root,
+                )
+
+    def fragment_type(
+        self,
+        schema: GraphQLSchema,
+        fragment: typing.Union[FragmentDefinitionNode, InlineFragmentNode],
+        parent_type: typing.Optional[GraphQLNamedType],
+    ) -> typing.Optional[GraphQLNamedType]:
+        if fragment.type_condition:
+            return schema.get_type(fragment.type_condition.name.value)
+        return parent_type
+
+    def restrict_field(
+        self,
+        policy: CachePolicy,
+        schema: GraphQLSchema,
+        parent_type: typing.Optional[GraphQLNamedType],
+        node: FieldNode,
+        fragments: typing.Dict[str, FragmentDefinitionNode],
+        visited: typing.Tuple[str, ...],
+        restrictions: typing.Dict[typing.Tuple[str, str, bool], CachePolicy],
+        root: bool,
+    ) -> None:
+        name = node.name.value
+        if name.startswith('__') or not isinstance(parent_type, (GraphQLObjectType, GraphQLInterfaceType)):
+            return
+        field = parent_type.fields.get(name)
+        if field is None:
+            return
+
+        field_type = get_named_type(field.type)
+        hint = self.hint(f'{parent_type.name}.{name}', field.ast_node)
+        if hint is None and is_composite_type(field_type):
+            hint = self.hint(field_type.name, field_type.ast_node)
+        if hint is not None:
+            policy.restrict(hint)
+        if (hint is None or hint.max_age is None) and (root or is_composite_type(field_type)):
+            policy.restrict(CacheHint(max_age=self.default_max_age))
+        if node.selection_set:
+            self.restrict_selection_set(
+                policy, schema, field_type, node.selection_set, fragments, visited, restrictions
+            )
+
+    def hint(self, coordinate: str, ast_node: typing.Any) -> typing.Optional[CacheHint]:
+        if coordinate in self.hints:
+            return self.hints[coordinate]
+        for directive in getattr(ast_node, 'directives', None) or []:
+            if directive.name.value != 'cacheControl':
+                continue
+            hint = CacheHint()
+            for argument in directive.arguments:
+                if argument.name.value == 'maxAge' and isinstance(argument.value, IntValueNode):
+                    hint.max_age = int(argument.value.value)
+                elif argument.name.value == 'scope' and isinstance(argument.value, EnumValueNode):
+                    hint.scope = argument.value.value
+            return hint
+        return None
+
+    def etag(self, body: bytes) -> str:
+        return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.replace('W/', '', 1) == etag:
+            return True
+    return False
@@ -0,0 +1,121 @@
+import asyncio
+import typing
+from collections import OrderedDict
+
+from graphql import DocumentNode, GraphQLSchema, OperationType, get_operation_ast
+from starlette.authentication import BaseUser
+from starlette.requests import Request
+
+from .cache_control import PRIVATE, PUBLIC, CacheControl, SessionId, operation_key
+
+T = typing.TypeVar('T')
+
+
+def user_identity(user: typing.Optional[BaseUser]) -> typing.Optional[str]:
+    """`identity` of an authenticated user, None if its class does not implement it. Display names are not unique."""
+    if user is None or not user.is_authenticated:
+        return None
+    try:
+        return user.identity
+    except NotImplementedError:
+        return None
+
+
+def default_session_id(request: Request) -> typing.Optional[typing.Hashable]:
+    """The authenticated user's identity, else the credentials sent with the request, None for anonymous requests."""
+    identity = user_identity(request.scope.get('user'))
+    if identity is not None:
+        return ('user', identity)
+    credentials = (request.headers.get('Authorization'), request.headers.get('Cookie'))
+    return ('credentials',) + credentials if any(credentials) else None
+
+
+class RequestCoalescing:
+    """Share one in-flight execution, and its serialized response, among concurrent identical requests.
+
+    Only queries are coalesced. Requests are identical when they have the same query, operation name and variables.
+    Operations are shared by everyone only when every field has an explicit `PUBLIC` hint with a positive `maxAge`
+    (`@cacheControl` directives or the app's `CacheControl` hints, `default_max_age` does not count). Any other query
+    is only shared by requests of the same caller: same `session_id(request)`, by default the authenticated user's
+    `identity` or else the `Authorization` and `Cookie` headers, and not at all without one. The first request's
+    context is used for the shared execution.
+
+    `executions` counts coalescable requests which executed, `saved` those which reused an execution in flight.
+    """
+
+    def __init__(self, session_id: SessionId = None, scope_cache_size: int = 1024) -> None:
+        self.session_id = session_id or default_session_id
+        self.scope_cache_size = scope_cache_size
+        self.executions = 0
+        self.saved = 0
+        self._flights = {}  # type: typing.Dict[typing.Hashable, asyncio.Future]
+        self._scopes = OrderedDict()  # type: typing.Dict[typing.Tuple[int, typing.Optional[str]], typing.Any]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def scope(
+        self,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        operation_name: typing.Optional[str],
+        cache_control: CacheControl = None,
+    ) -> typing.Optional[str]:
+        """The cache scope of the operation, None if it is not a query."""
+        # Entries keep their document alive, so its id cannot be reused while cached.
+        key = (id(document), operation_name)
+        cached = self._scopes.get(key)
+        if cached is not None:
+            self._scopes.move_to_end(key)
+            return cached[1]
+
+        operation = get_operation_ast(document, operation_name)
+        scope = None
+        if operation is not None and operation.operation == OperationType.QUERY:
+            # Fields without a hint get no maxAge, so only fully hinted operations can be public.
+            hints_only = CacheControl(cache_control.hints if cache_control is not None else None)
+            policy = hints_only.policy(schema, document, operation_name)
+            scope = PUBLIC if policy.scope == PUBLIC and policy.cacheable else PRIVATE
+        if self.scope_cache_size > 0:
+            self._scopes[key] = (document, scope)
+            if len(self._scopes) > self.scope_cache_size:
+                self._scopes.popitem(last=False)
+        return scope
+
+    def key(
+        self,
+        request: Request,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        data: typing.Mapping[str, typing.Any],
+        cache_control: CacheControl = None,
+    ) -> typing.Optional[typing.Hashable]:
+        scope = self.scope(schema, document, data.get('operationName'), cache_control)
+        if scope is None:
+            return None
+        session_id = None
+        if scope != PUBLIC:
+            session_id = self.session_id(request)
+            if session_id is None:
+                return None
+        base_key = operation_key(data)
+        return None if base_key is None else (base_key, session_id)
+
+    async def run(self, key: typing.Hashable, execute: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        future = self._flights.get(key)
+        if future is not None:
+            self.saved += 1
+        else:
+            self.executions += 1
+            # A task of its own, so a cancelled first request does not cancel the others.
+            future = self._flights[key] = asyncio.ensure_future(execute())
+            future.add_done_callback(lambda _: self.finish(key, future))
+        return await asyncio.shield(future)
+
+    def finish(self, key: typing.Hashable, future: asyncio.Future) -> None:
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if not future.cancelled():
+            # Retrieved here in case every waiter is gone.
+            future.exception()
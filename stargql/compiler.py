@@ -0,0 +1,231 @@
+import copy
+import typing
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+
+from gql import ExecutionContext, MiddlewareManager
+from gql.resolver import default_field_resolver, get_field_value
+from gql.utils import to_snake_case
+from graphql import (
+    BREAK,
+    DirectiveNode,
+    DocumentNode,
+    FieldNode,
+    GraphQLError,
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLResolveInfo,
+    GraphQLSchema,
+    ListValueNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    ValueNode,
+    VariableNode,
+    Visitor,
+    get_nullable_type,
+    is_leaf_type,
+    visit,
+)
+from graphql.execution.execute import get_field_def
+from graphql.execution.values import get_argument_values
+from graphql.pyutils import Path, Undefined
+
+current_plan = ContextVar('current_plan', default=None)  # type: ContextVar[typing.Optional[ExecutionPlan]]
+
+Fields = typing.Dict[str, typing.List[FieldNode]]
+
+IMMUTABLE_TYPES = (str, int, float, bool, Enum, type(None))
+
+
+@dataclass
+class FieldPlan:
+    field_def: GraphQLField
+    resolve_fn: typing.Callable
+    serialize: typing.Optional[typing.Callable[[typing.Any], typing.Any]] = None
+
+
+def property_resolver(field_name: str) -> typing.Callable:
+    """gql's `default_field_resolver` with the snake case name computed once."""
+    snake_name = to_snake_case(field_name)
+
+    def resolve(source: typing.Any, info: GraphQLResolveInfo, **args: typing.Any) -> typing.Any:
+        value = get_field_value(source, snake_name)
+        if value is None and snake_name != field_name:
+            value = get_field_value(source, field_name)
+        if callable(value):
+            return value(info, **args)
+        if isinstance(value, Enum):
+            return value.value
+        return value
+
+    return resolve
+
+
+class VariableConditions(Visitor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.found = False
+
+    def enter_directive(self, node: DirectiveNode, *_: typing.Any) -> typing.Any:
+        if node.name.value in ('skip', 'include') and any(has_variables(arg.value) for arg in node.arguments):
+            self.found = True
+            return BREAK
+        return None
+
+
+def has_variables(value: ValueNode) -> bool:
+    if isinstance(value, VariableNode):
+        return True
+    if isinstance(value, ListValueNode):
+        return any(has_variables(item) for item in value.values)
+    if isinstance(value, ObjectValueNode):
+        return any(has_variables(field.value) for field in value.fields)
+    return False
+
+
+class ExecutionPlan:
+    """Work of `execute` that only depends on the document and schema, cached with the parsed document.
+
+    Field collection, resolver lookups (with middleware applied), arguments without variables and leaf serializers
+    are computed once and reused by `CompiledExecutionContext`. Documents whose field collection depends on variables
+    (`@skip` / `@include` with a variable) are not `supported` and run on the normal executor.
+    """
+
+    def __init__(self, schema: GraphQLSchema, document: DocumentNode) -> None:
+        self.schema = schema
+        self.document = document
+        conditions = VariableConditions()
+        visit(document, conditions)
+        self.supported = not conditions.found
+        self.root_fields = {}  # type: typing.Dict[int, Fields]
+        self.subfields = {}  # type: typing.Dict[typing.Tuple[GraphQLObjectType, int], Fields]
+        self.fields = {}  # type: typing.Dict[typing.Tuple[GraphQLObjectType, str], typing.Optional[FieldPlan]]
+        self.arguments = {}  # type: typing.Dict[int, typing.Tuple[typing.Dict[str, typing.Any], bool]]
+
+    def field(
+        self,
+        parent_type: GraphQLObjectType,
+        field_name: str,
+        field_resolver: typing.Callable,
+        middleware_manager: typing.Optional[MiddlewareManager],
+    ) -> typing.Optional[FieldPlan]:
+        key = (parent_type, field_name)
+        try:
+            return self.fields[key]
+        except KeyError:
+            pass
+
+        plan = None
+        field_def = get_field_def(self.schema, parent_type, field_name)
+        if field_def:
+            resolve_fn = field_def.resolve or field_resolver
+            if resolve_fn is default_field_resolver:
+                resolve_fn = property_resolver(field_name)
+            if middleware_manager:
+                resolve_fn = middleware_manager.get_field_resolver_by_parent(resolve_fn, parent_type.name, field_name)
+            plan = FieldPlan(field_def, resolve_fn)
+            return_type = get_nullable_type(field_def.type)
+            if is_leaf_type(return_type):
+                plan.serialize = return_type.serialize
+        self.fields[key] = plan
+        return plan
+
+    def argument_values(
+        self, field_def: GraphQLField, node: FieldNode, variable_values: typing.Dict[str, typing.Any]
+    ) -> typing.Dict[str, typing.Any]:
+        # Nodes belong to the cached document, so their ids are stable for the life of the plan.
+        cached = self.arguments.get(id(node))
+        if cached is None:
+            args = get_argument_values(field_def, node, variable_values)
+            if any(has_variables(argument.value) for argument in node.arguments or ()):
+                return args
+            flat = all(isinstance(value, IMMUTABLE_TYPES) for value in args.values())
+            cached = self.arguments[id(node)] = (args, flat)
+        # Resolvers get their own copy, so one mutating its arguments can't leak into later requests.
+        args, flat = cached
+        return dict(args) if flat else copy.deepcopy(args)
+
+
+class CompiledExecutionContext(ExecutionContext):
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.plan = current_plan.get()
+
+    def collect_fields(
+        self,
+        runtime_type: GraphQLObjectType,
+        selection_set: SelectionSetNode,
+        fields: Fields,
+        visited_fragment_names: typing.Set[str],
+    ) -> Fields:
+        operation = self.operation  # type: OperationDefinitionNode
+        if selection_set is not operation.selection_set or fields:
+            return super().collect_fields(runtime_type, selection_set, fields, visited_fragment_names)
+        root_fields = self.plan.root_fields.get(id(operation))
+        if root_fields is None:
+            root_fields = super().collect_fields(runtime_type, selection_set, fields, visited_fragment_names)
+            self.plan.root_fields[id(operation)] = root_fields
+        return root_fields
+
+    def collect_subfields(self, return_type: GraphQLObjectType, field_nodes: typing.List[FieldNode]) -> Fields:
+        # Field node lists come from collected fields owned by the plan, their ids are stable too.
+        key = (return_type, id(field_nodes))
+        subfields = self.plan.subfields.get(key)
+        if subfields is None:
+            subfields = self.plan.subfields[key] = super().collect_subfields(return_type, field_nodes)
+        return subfields
+
+    def resolve_field(
+        self, parent_type: GraphQLObjectType, source: typing.Any, field_nodes: typing.List[FieldNode], path: Path
+    ) -> typing.Any:
+        plan = self.plan.field(parent_type, field_nodes[0].name.value, self.field_resolver, self.middleware_manager)
+        if plan is None:
+            return Undefined
+
+        info = self.build_resolve_info(plan.field_def, field_nodes, parent_type, path)
+        result = self.resolve_field_value_or_error(plan.field_def, field_nodes, plan.resolve_fn, source, info)
+        if (
+            plan.serialize is not None
+            and result is not None
+            and result is not Undefined
+            and not isinstance(result, Exception)
+            and not self.is_awaitable(result)
+        ):
+            try:
+                serialized = plan.serialize(result)
+            except Exception:
+                serialized = Undefined
+            if serialized is not Undefined:
+                return serialized
+        # Awaitables, errors, nulls and invalid values take the regular path for its error handling.
+        return self.complete_value_catching_error(plan.field_def.type, field_nodes, info, path, result)
+
+    def resolve_field_value_or_error(
+        self,
+        field_def: GraphQLField,
+        field_nodes: typing.List[FieldNode],
+        resolve_fn: typing.Callable,
+        source: typing.Any,
+        info: GraphQLResolveInfo,
+    ) -> typing.Any:
+        try:
+            args = self.plan.argument_values(field_def, field_nodes[0], self.variable_values)
+            result = resolve_fn(source, info, **args)
+            if self.is_awaitable(result):
+
+                async def await_result() -> typing.Any:
+                    try:
+                        return await result
+                    except GraphQLError as error:
+                        return error
+                    except Exception as error:
+                        return GraphQLError(str(error), original_error=error)
+
+                return await_result()
+            return result
+        except GraphQLError as error:
+            return error
+        except Exception as error:
+            return GraphQLError(str(error), original_error=error)
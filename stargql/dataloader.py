@@ -0,0 +1,127 @@
+import asyncio
+import typing
+
+BatchLoadFn = typing.Callable[[typing.List[typing.Any]], typing.Awaitable[typing.Sequence[typing.Any]]]
+DataLoaderFactory = typing.Callable[[], 'DataLoader']
+
+
+class DataLoader:
+    """Collects every `load` made in the same loop tick and resolves them with one `batch_load_fn` call.
+
+    `batch_load_fn` receives a list of keys and must return a sequence of values (or exceptions)
+    of the same length and order.
+    """
+
+    def __init__(
+        self,
+        batch_load_fn: BatchLoadFn,
+        max_batch_size: int = None,
+        cache: bool = True,
+        cache_key_fn: typing.Callable[[typing.Any], typing.Hashable] = None,
+    ) -> None:
+        self.batch_load_fn = batch_load_fn
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self.cache_key_fn = cache_key_fn
+        self._cache = {}  # type: typing.Dict[typing.Hashable, asyncio.Future]
+        self._queue = []  # type: typing.List[typing.Tuple[typing.Any, asyncio.Future]]
+
+    def load(self, key: typing.Any) -> 'asyncio.Future[typing.Any]':
+        cache_key = self.cache_key_fn(key) if self.cache_key_fn else key
+        if self.cache and cache_key in self._cache:
+            return self._cache[cache_key]
+
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            raise RuntimeError(
+                'DataLoader.load must be called on the event loop, mark sync resolvers returning loads with @no_offload'
+            ) from None
+        future = loop.create_future()
+        if self.cache:
+            self._cache[cache_key] = future
+        if not self._queue:
+            loop.call_soon(self.dispatch)
+        self._queue.append((key, future))
+        return future
+
+    async def load_many(self, keys: typing.Iterable[typing.Any]) -> typing.List[typing.Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: typing.Any, value: typing.Any) -> None:
+        cache_key = self.cache_key_fn(key) if self.cache_key_fn else key
+        if cache_key in self._cache:
+            return
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(value)
+        self._cache[cache_key] = future
+
+    def clear(self, key: typing.Any) -> None:
+        cache_key = self.cache_key_fn(key) if self.cache_key_fn else key
+        self._cache.pop(cache_key, None)
+
+    def clear_all(self) -> None:
+        self._cache.clear()
+
+    def dispatch(self) -> None:
+        queue, self._queue = self._queue, []
+        size = self.max_batch_size or len(queue)
+        for start in range(0, len(queue), size):
+            asyncio.ensure_future(self.dispatch_batch(queue[start : start + size]))
+
+    async def dispatch_batch(self, batch: typing.List[typing.Tuple[typing.Any, asyncio.Future]]) -> None:
+        keys = [key for key, _ in batch]
+        try:
+            values = await self.batch_load_fn(keys)
+            if len(values) != len(keys):
+                raise ValueError(
+                    f'DataLoader batch_load_fn must return a sequence of the same length as keys, '
+                    f'expected {len(keys)}, got {len(values)}.'
+                )
+        except Exception as exc:
+            for key, future in batch:
+                self.clear(key)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        except BaseException:
+            # Cancelled: cancel the loads too rather than leave their awaiters hanging.
+            for key, future in batch:
+                self.clear(key)
+                if not future.done():
+                    future.cancel()
+            raise
+
+        for (key, future), value in zip(batch, values):
+            if future.done():
+                continue
+            if isinstance(value, Exception):
+                self.clear(key)
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+
+class DataLoaderRegistry:
+    """Lazily builds one `DataLoader` per registered factory, create a registry per request."""
+
+    def __init__(self, factories: typing.Dict[str, DataLoaderFactory]) -> None:
+        self._factories = factories
+        self._loaders = {}  # type: typing.Dict[str, DataLoader]
+
+    def __getitem__(self, name: str) -> DataLoader:
+        loader = self._loaders.get(name)
+        if loader is None:
+            loader = self._loaders[name] = self._factories[name]()
+        return loader
+
+    def __getattr__(self, name: str) -> DataLoader:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
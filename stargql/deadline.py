@@ -0,0 +1,81 @@
+import asyncio
+import functools
+import typing
+from contextvars import ContextVar
+from inspect import isawaitable, iscoroutine
+
+from graphql import GraphQLError, GraphQLObjectType, GraphQLSchema
+
+DEADLINE_ATTRIBUTE = '__stargql_deadline__'
+OPERATION_TIMEOUT = 'OPERATION_TIMEOUT'
+
+current_deadline = ContextVar('current_deadline', default=None)  # type: ContextVar[typing.Optional[Deadline]]
+
+
+class OperationTimeout(GraphQLError):
+    def __init__(self, timeout: float) -> None:
+        super().__init__(f'Operation timed out after {timeout}s', extensions={'code': OPERATION_TIMEOUT})
+
+
+class Deadline:
+    """Cancels the pending resolvers of an operation when its timeout expires.
+
+    Resolvers still running then, or starting later, fail with `OperationTimeout`, so the operation completes with
+    the fields resolved so far.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.expired = False
+        self.tasks = set()  # type: typing.Set[asyncio.Future]
+        self.handle = asyncio.get_event_loop().call_later(timeout, self.expire)
+
+    def expire(self) -> None:
+        self.expired = True
+        for task in self.tasks:
+            task.cancel()
+
+    def cancel(self) -> None:
+        self.handle.cancel()
+
+    async def wait(self, awaitable: typing.Awaitable) -> typing.Any:
+        if self.expired:
+            if iscoroutine(awaitable):
+                awaitable.close()
+            raise OperationTimeout(self.timeout)
+        task = asyncio.ensure_future(awaitable)
+        self.tasks.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Only the deadline cancels the resolver alone, our own cancellation propagates.
+            if self.expired and task.cancelled():
+                raise OperationTimeout(self.timeout)
+            raise
+        finally:
+            self.tasks.discard(task)
+
+
+def with_deadline(resolver: typing.Callable) -> typing.Callable:
+    @functools.wraps(resolver)
+    def resolve(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        deadline = current_deadline.get()
+        if deadline is None:
+            return resolver(*args, **kwargs)
+        if deadline.expired:
+            raise OperationTimeout(deadline.timeout)
+        result = resolver(*args, **kwargs)
+        return deadline.wait(result) if isawaitable(result) else result
+
+    setattr(resolve, DEADLINE_ATTRIBUTE, True)
+    return resolve
+
+
+def apply_deadlines(schema: GraphQLSchema) -> None:
+    """Make the resolvers of `schema` follow the deadline of the operation being executed."""
+    for type_ in schema.type_map.values():
+        if not isinstance(type_, GraphQLObjectType) or type_.name.startswith('__'):
+            continue
+        for field in type_.fields.values():
+            if field.resolve is not None and not getattr(field.resolve, DEADLINE_ATTRIBUTE, False):
+                field.resolve = with_deadline(field.resolve)
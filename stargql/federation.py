@@ -0,0 +1,159 @@
+import asyncio
+import typing
+from inspect import isawaitable
+
+from gql.federation import add_typename_to_possible_return
+from gql.resolver import get_field_value
+from graphql import GraphQLObjectType, GraphQLResolveInfo, GraphQLSchema
+
+Representations = typing.List[typing.Dict[str, typing.Any]]
+BatchReferenceResolver = typing.Callable[[GraphQLResolveInfo, Representations], typing.Any]
+ReferenceKey = typing.Union[str, typing.Sequence[str], typing.Callable[[typing.Any], typing.Hashable]]
+
+ENTITIES_ATTRIBUTE = '__stargql_entities__'
+
+batch_reference_resolver_map = {}  # type: typing.Dict[str, BatchReferenceResolver]
+
+
+def hashable(value: typing.Any) -> typing.Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, hashable(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable(item) for item in value)
+    return value
+
+
+def key_function(key: ReferenceKey) -> typing.Callable[[typing.Any], typing.Hashable]:
+    if callable(key):
+        return key
+    if isinstance(key, str):
+        return lambda value: hashable(get_field_value(value, key))
+    fields = tuple(key)
+    return lambda value: tuple(hashable(get_field_value(value, field)) for field in fields)
+
+
+def reorder(
+    representations: Representations,
+    results: typing.Iterable[typing.Any],
+    key: typing.Optional[typing.Callable[[typing.Any], typing.Hashable]],
+) -> typing.List[typing.Any]:
+    if key is None:
+        results = list(results)
+        if len(results) != len(representations):
+            raise ValueError(
+                f'Batch reference resolvers must return a sequence of the same length as representations, '
+                f'expected {len(representations)}, got {len(results)}.'
+            )
+        return results
+    by_key = {key(result): result for result in results if result is not None}
+    return [by_key.get(key(representation)) for representation in representations]
+
+
+def batch_reference_resolver(type_name: str, key: ReferenceKey = None) -> typing.Callable:
+    """Resolve every representation of `type_name` in an `_entities` query with one call.
+
+    The resolver receives `info` and the list of representations and returns the entities, sync or async. Without
+    `key` they must be in the order of the representations (`None` for missing ones, an exception for failed ones).
+    With `key`, a field name, a sequence of field names or a function, they may come in any order and are matched to
+    the representations by key.
+    """
+    if type_name in batch_reference_resolver_map:
+        raise Exception(
+            f'{type_name} is already registered by {batch_reference_resolver_map[type_name].__code__}'
+        )
+    key_fn = key_function(key) if key is not None else None
+
+    def wrap(func: BatchReferenceResolver) -> BatchReferenceResolver:
+        def resolver(info: GraphQLResolveInfo, representations: Representations) -> typing.Any:
+            results = func(info, representations)
+            if isawaitable(results):
+
+                async def await_results() -> typing.List[typing.Any]:
+                    return reorder(representations, await results, key_fn)
+
+                return await_results()
+            return reorder(representations, results, key_fn)
+
+        batch_reference_resolver_map[type_name] = resolver
+        return func
+
+    return wrap
+
+
+def with_typename(value: typing.Any, typename: str, batched: bool) -> typing.Any:
+    # Entities a batch resolver did not find are null, gql turns a missing single reference into `{__typename}`.
+    if (batched and value is None) or isinstance(value, Exception):
+        return value
+    return add_typename_to_possible_return(value, typename)
+
+
+async def await_entity(value: typing.Awaitable, typename: str) -> typing.Any:
+    return with_typename(await value, typename, False)
+
+
+async def await_batch_entity(batch: asyncio.Future, position: int, typename: str) -> typing.Any:
+    return with_typename((await batch)[position], typename, True)
+
+
+def resolve_entities(_: typing.Any, info: GraphQLResolveInfo, **kwargs: typing.Any) -> typing.Any:
+    """gql's `_entities` resolver, calling batch reference resolvers once per type.
+
+    Each entity is a value, an exception or an awaitable of its own, so an error only nulls the entities it concerns.
+    """
+    representations = list(kwargs.get('representations', ()))
+    groups = {}  # type: typing.Dict[str, typing.List[int]]
+    for index, reference in enumerate(representations):
+        groups.setdefault(reference['__typename'], []).append(index)
+
+    result = [None] * len(representations)  # type: typing.List[typing.Any]
+    for typename, indexes in groups.items():
+        type_object = info.schema.get_type(typename)
+        if not type_object or not isinstance(type_object, GraphQLObjectType):
+            raise Exception(
+                f'The `_entities` resolver tried to load an entity for type "{typename}", '
+                f'but no object type of that name was found in the schema'
+            )
+        references = [representations[index] for index in indexes]
+        resolve_batch = getattr(type_object, '__resolve_batch_reference__', None)
+        if resolve_batch is None:
+            resolve_reference = getattr(type_object, '__resolve_reference__', lambda o, i, r: r)
+            for index, reference in zip(indexes, references):
+                try:
+                    value = resolve_reference(type_object, info, reference)
+                except Exception as exc:
+                    value = exc
+                if isawaitable(value):
+                    result[index] = await_entity(value, typename)
+                else:
+                    result[index] = with_typename(value, typename, False)
+            continue
+
+        try:
+            values = resolve_batch(info, references)
+        except Exception as exc:
+            values = [exc] * len(indexes)
+        if isawaitable(values):
+            batch = asyncio.ensure_future(values)
+            for position, index in enumerate(indexes):
+                result[index] = await_batch_entity(batch, position, typename)
+        else:
+            for index, value in zip(indexes, values):
+                result[index] = with_typename(value, typename, True)
+    return result
+
+
+setattr(resolve_entities, ENTITIES_ATTRIBUTE, True)
+
+
+def register_batch_reference_resolvers(schema: GraphQLSchema) -> None:
+    query_type = schema.query_type
+    if query_type is None or '_entities' not in query_type.fields:
+        return
+    for type_name, resolver in batch_reference_resolver_map.items():
+        type_ = schema.get_type(type_name)
+        if isinstance(type_, GraphQLObjectType):
+            type_.__resolve_batch_reference__ = resolver
+    entities = query_type.fields['_entities']
+    # Already set for another app sharing the schema, maybe wrapped with its deadlines since.
+    if not getattr(entities.resolve, ENTITIES_ATTRIBUTE, False):
+        entities.resolve = resolve_entities
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+from inspect import isawaitable
+
+from graphql import GraphQLResolveInfo
+
+from .cache_control import PRIVATE, PUBLIC
+
+ParentKey = typing.Callable[[typing.Any], typing.Hashable]
+UserKey = typing.Callable[[GraphQLResolveInfo], typing.Optional[typing.Hashable]]
+CacheKey = typing.Tuple[str, str, typing.Hashable, str, typing.Optional[typing.Hashable]]
+
+
+def default_parent_key(parent: typing.Any) -> typing.Hashable:
+    if parent is None:
+        return None
+    if isinstance(parent, typing.Mapping):
+        return parent.get('id')
+    return getattr(parent, 'id', None)
+
+
+@dataclass
+class FieldCacheRule:
+    ttl: float
+    scope: str = PUBLIC
+    parent_key: ParentKey = default_parent_key
+
+
+class FieldCache:
+    """Cache resolver results across requests, used as graphql middleware.
+
+    `fields` maps `'Type.field'` to a `FieldCacheRule` or a TTL in seconds. Entries are keyed by field, parent key
+    (its `id` by default) and arguments, `PRIVATE` fields also by `user_key(info)` and are not cached without one.
+    Fields of a parent without a key are not cached either, except on root types.
+    Concurrent misses on the same key share one resolver call, errors are not cached.
+    """
+
+    def __init__(
+        self,
+        fields: typing.Dict[str, typing.Union[FieldCacheRule, float]],
+        maxsize: int = 10000,
+        user_key: UserKey = None,
+    ) -> None:
+        self.rules = {
+            coordinate: rule if isinstance(rule, FieldCacheRule) else FieldCacheRule(rule)
+            for coordinate, rule in fields.items()
+        }
+        self.maxsize = maxsize
+        self.user_key = user_key
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # type: typing.Dict[CacheKey, typing.Tuple[float, typing.Any]]
+        self._pending = {}  # type: typing.Dict[CacheKey, asyncio.Future]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def middleware(
+        self, graphql_middleware: typing.Union[tuple, list, typing.Dict[str, list]] = None
+    ) -> typing.Dict[str, list]:
+        """Add the cache to `graphql_middleware` as the innermost middleware of every cached field."""
+        if not graphql_middleware:
+            middleware = {}  # type: typing.Dict[str, list]
+        elif isinstance(graphql_middleware, (tuple, list)):
+            middleware = {key: list(graphql_middleware) for key in ('Query', 'Mutation', 'Subscription')}
+        else:
+            middleware = {key: list(value or []) for key, value in graphql_middleware.items()}
+
+        for coordinate in self.rules:
+            # Middleware of the parent type takes precedence over field middleware.
+            key = coordinate.split('.', 1)[0]
+            if key not in middleware:
+                key = coordinate
+            if self not in middleware.setdefault(key, []):
+                middleware[key].insert(0, self)
+        return middleware
+
+    def resolve(
+        self, next_: typing.Callable, root: typing.Any, info: GraphQLResolveInfo, **args: typing.Any
+    ) -> typing.Any:
+        rule = self.rules.get(f'{info.parent_type.name}.{info.field_name}')
+        if rule is None:
+            return next_(root, info, **args)
+        key = self.key(rule, root, info, args)
+        if key is None:
+            return next_(root, info, **args)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            del self._entries[key]
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return self.wait(pending)
+
+        self.misses += 1
+        result = next_(root, info, **args)
+        if not isawaitable(result):
+            self.store(key, rule, result)
+            return result
+
+        future = asyncio.ensure_future(result)
+        self._pending[key] = future
+        future.add_done_callback(lambda done: self.done(key, rule, done))
+        return self.wait(future)
+
+    def key(
+        self, rule: FieldCacheRule, root: typing.Any, info: GraphQLResolveInfo, args: typing.Dict[str, typing.Any]
+    ) -> typing.Optional[CacheKey]:
+        user = None
+        if rule.scope == PRIVATE:
+            user = self.user_key(info) if self.user_key else None
+            if user is None:
+                return None
+        parent_key = rule.parent_key(root)
+        if parent_key is None and info.parent_type not in (
+            info.schema.query_type,
+            info.schema.mutation_type,
+            info.schema.subscription_type,
+        ):
+            return None
+        arguments = json.dumps(args, sort_keys=True, default=str)
+        return info.parent_type.name, info.field_name, parent_key, arguments, user
+
+    async def wait(self, future: asyncio.Future) -> typing.Any:
+        # Shield the shared call from cancellation of a single waiter.
+        return await asyncio.shield(future)
+
+    def done(self, key: CacheKey, rule: FieldCacheRule, future: asyncio.Future) -> None:
+        # Dropped by invalidate(), the result may predate the change.
+        if self._pending.get(key) is not future:
+            return
+        del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.store(key, rule, future.result())
+
+    def store(self, key: CacheKey, rule: FieldCacheRule, value: typing.Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + rule.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, type_name: str, field_name: str = None, parent_key: typing.Hashable = None) -> int:
+        """Drop cached values of a type, optionally only one field and/or one parent, e.g. from a mutation."""
+
+        def matches(key: CacheKey) -> bool:
+            return (
+                key[0] == type_name
+                and (field_name is None or key[1] == field_name)
+                and (parent_key is None or key[2] == parent_key)
+            )
+
+        keys = [key for key in self._entries if matches(key)]
+        for key in keys:
+            del self._entries[key]
+        for key in [key for key in self._pending if matches(key)]:
+            del self._pending[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+        self.hits = self.misses = 0
@@ -0,0 +1,914 @@
+import asyncio
+import copy
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from inspect import isawaitable
+
+from graphql import (
+    ArgumentNode,
+    DocumentNode,
+    EnumTypeDefinitionNode,
+    EnumTypeExtensionNode,
+    ExecutionResult,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLObjectType,
+    GraphQLResolveInfo,
+    GraphQLSchema,
+    InlineFragmentNode,
+    InputObjectTypeDefinitionNode,
+    InputObjectTypeExtensionNode,
+    InterfaceTypeDefinitionNode,
+    InterfaceTypeExtensionNode,
+    ListTypeNode,
+    NamedTypeNode,
+    NameNode,
+    NonNullTypeNode,
+    ObjectTypeDefinitionNode,
+    ObjectTypeExtensionNode,
+    OperationDefinitionNode,
+    OperationType,
+    ScalarTypeDefinitionNode,
+    ScalarTypeExtensionNode,
+    SelectionSetNode,
+    StringValueNode,
+    UnionTypeDefinitionNode,
+    UnionTypeExtensionNode,
+    VariableDefinitionNode,
+    VariableNode,
+    Visitor,
+    build_ast_schema,
+    execute,
+    get_named_type,
+    get_operation_ast,
+    is_abstract_type,
+    parse,
+    print_ast,
+    visit,
+)
+from graphql.utilities import get_operation_root_type
+
+from .serializers import Serializer, default_serializer
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+FEDERATION_TYPES = ('_Any', '_Entity', '_FieldSet', '_Service')
+FEDERATION_FIELDS = ('_entities', '_service')
+KEPT_DIRECTIVES = ('deprecated',)
+# Alias prefix of the key and @requires fields the gateway adds to subgraph queries to build representations.
+KEY_PREFIX = '_key_'
+REPRESENTATIONS = '_representations'
+
+DEFINITIONS = {
+    ObjectTypeDefinitionNode: ObjectTypeDefinitionNode,
+    ObjectTypeExtensionNode: ObjectTypeDefinitionNode,
+    InterfaceTypeDefinitionNode: InterfaceTypeDefinitionNode,
+    InterfaceTypeExtensionNode: InterfaceTypeDefinitionNode,
+    UnionTypeDefinitionNode: UnionTypeDefinitionNode,
+    UnionTypeExtensionNode: UnionTypeDefinitionNode,
+    EnumTypeDefinitionNode: EnumTypeDefinitionNode,
+    EnumTypeExtensionNode: EnumTypeDefinitionNode,
+    InputObjectTypeDefinitionNode: InputObjectTypeDefinitionNode,
+    InputObjectTypeExtensionNode: InputObjectTypeDefinitionNode,
+    ScalarTypeDefinitionNode: ScalarTypeDefinitionNode,
+    ScalarTypeExtensionNode: ScalarTypeDefinitionNode,
+}
+MEMBERS = ('fields', 'interfaces', 'types', 'values')
+
+Fields = typing.Dict[str, typing.List[FieldNode]]
+Provided = typing.Optional[typing.Dict[str, typing.Any]]
+
+
+class CompositionError(Exception):
+    pass
+
+
+class Subgraph:
+    """A federated service behind the gateway, reached over pooled HTTP connections.
+
+    Pass an ASGI `app` to call an in-process subgraph instead. Without `sdl` the schema is loaded from
+    `_service { sdl }` by `Gateway.load()`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str = 'http://subgraph/',
+        sdl: str = None,
+        app: typing.Callable = None,
+        headers: typing.Dict[str, str] = None,
+        timeout: float = 30.0,
+        max_connections: int = 100,
+    ) -> None:
+        assert httpx is not None, 'httpx must be installed to use the gateway'
+        self.name = name
+        self.url = url
+        self.sdl = sdl
+        self.app = app
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None  # type: typing.Optional[httpx.AsyncClient]
+
+    @property
+    def client(self) -> 'httpx.AsyncClient':
+        # Created on first use, so the pool belongs to the running event loop.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=self.app) if self.app is not None else None,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                ),
+            )
+        return self._client
+
+    async def request(self, body: bytes, headers: typing.Dict[str, str] = None) -> bytes:
+        response = await self.client.post(
+            self.url, content=body, headers={'Content-Type': 'application/json', **(headers or {})}
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def field_set(value: typing.Any) -> SelectionSetNode:
+    if not isinstance(value, StringValueNode):
+        raise CompositionError('Federation field sets must be strings')
+    operation = parse(f'{{ {value.value} }}', no_location=True).definitions[0]
+    return typing.cast(OperationDefinitionNode, operation).selection_set
+
+
+def directive_argument(node: typing.Any, name: str) -> typing.Any:
+    for argument in node.arguments or ():
+        if argument.name.value == name:
+            return argument.value
+    return None
+
+
+def provided_fields(selection_set: typing.Optional[SelectionSetNode]) -> Provided:
+    if selection_set is None:
+        return None
+    return {
+        selection.name.value: provided_fields(selection.selection_set)
+        for selection in selection_set.selections
+        if isinstance(selection, FieldNode)
+    }
+
+
+@dataclass
+class SubgraphType:
+    name: str
+    definition: typing.Type
+    extension: bool = True
+    keys: typing.List[SelectionSetNode] = field(default_factory=list)
+    fields: typing.Dict[str, typing.Any] = field(default_factory=OrderedDict)
+    interfaces: typing.List[str] = field(default_factory=list)
+    members: typing.List[str] = field(default_factory=list)
+    external: typing.Set[str] = field(default_factory=set)
+    provides: typing.Dict[str, SelectionSetNode] = field(default_factory=dict)
+    requires: typing.Dict[str, SelectionSetNode] = field(default_factory=dict)
+
+    @property
+    def key_fields(self) -> typing.Set[str]:
+        return {
+            selection.name.value
+            for key in self.keys
+            for selection in key.selections
+            if isinstance(selection, FieldNode)
+        }
+
+
+def parse_subgraph(sdl: str) -> typing.Tuple[typing.Dict[str, SubgraphType], typing.List[typing.Any]]:
+    types = OrderedDict()  # type: typing.Dict[str, SubgraphType]
+    nodes = []
+    for node in parse(sdl, no_location=True).definitions:
+        definition = DEFINITIONS.get(type(node))
+        if definition is None or node.name.value in FEDERATION_TYPES:
+            continue
+        nodes.append(node)
+        name = node.name.value
+        type_ = types.get(name)
+        if type_ is None:
+            type_ = types[name] = SubgraphType(name, definition)
+        directives = [directive.name.value for directive in node.directives or ()]
+        if node.__class__ is definition and 'extends' not in directives:
+            type_.extension = False
+        for directive in node.directives or ():
+            if directive.name.value == 'key':
+                type_.keys.append(field_set(directive_argument(directive, 'fields')))
+        type_.interfaces.extend(interface.name.value for interface in getattr(node, 'interfaces', None) or ())
+        type_.members.extend(member.name.value for member in getattr(node, 'types', None) or ())
+        for field_node in getattr(node, 'fields', None) or ():
+            field_name = field_node.name.value
+            if field_name in FEDERATION_FIELDS:
+                continue
+            type_.fields[field_name] = field_node
+            for directive in field_node.directives or ():
+                if directive.name.value == 'external':
+                    type_.external.add(field_name)
+                elif directive.name.value == 'provides':
+                    type_.provides[field_name] = field_set(directive_argument(directive, 'fields'))
+                elif directive.name.value == 'requires':
+                    type_.requires[field_name] = field_set(directive_argument(directive, 'fields'))
+    return types, nodes
+
+
+def strip_directives(node: typing.Any) -> typing.Any:
+    node = copy.copy(node)
+    node.directives = [directive for directive in node.directives or () if directive.name.value in KEPT_DIRECTIVES]
+    return node
+
+
+class Supergraph:
+    """The composed schema of all subgraphs, and which subgraphs can resolve each field."""
+
+    def __init__(self, sdls: typing.Dict[str, str]) -> None:
+        self.subgraphs = OrderedDict()  # type: typing.Dict[str, typing.Dict[str, SubgraphType]]
+        definitions = OrderedDict()  # type: typing.Dict[str, typing.Dict[str, typing.Any]]
+        for name, sdl in sdls.items():
+            types, nodes = parse_subgraph(sdl)
+            self.subgraphs[name] = types
+            for node in nodes:
+                self.merge(definitions, name, node)
+        self.schema = build_ast_schema(
+            DocumentNode(
+                definitions=[
+                    merged['definition'](
+                        name=NameNode(value=type_name),
+                        description=merged['description'],
+                        directives=[],
+                        **{
+                            member: list(merged[member].values())
+                            for member in MEMBERS
+                            if member in merged['definition'].keys
+                        },
+                    )
+                    for type_name, merged in definitions.items()
+                ]
+            )
+        )
+
+        self.resolvers = {}  # type: typing.Dict[typing.Tuple[str, str], typing.List[str]]
+        for subgraph, types in self.subgraphs.items():
+            for type_ in types.values():
+                key_fields = type_.key_fields
+                for field_name in type_.fields:
+                    if field_name not in type_.external or field_name in key_fields:
+                        self.resolvers.setdefault((type_.name, field_name), []).append(subgraph)
+
+    def merge(
+        self, definitions: typing.Dict[str, typing.Dict[str, typing.Any]], subgraph: str, node: typing.Any
+    ) -> None:
+        definition = DEFINITIONS[type(node)]
+        merged = definitions.setdefault(
+            node.name.value,
+            {'definition': definition, 'description': None, **{member: OrderedDict() for member in MEMBERS}},
+        )
+        if merged['definition'] is not definition:
+            raise CompositionError(f'{node.name.value} is defined as different kinds of types, see {subgraph}')
+        merged['description'] = merged['description'] or getattr(node, 'description', None)
+        for member in MEMBERS:
+            for child in getattr(node, member, None) or ():
+                name = child.name.value
+                if member == 'fields' and name in FEDERATION_FIELDS:
+                    continue
+                existing = merged[member].get(name)
+                if existing is None:
+                    merged[member][name] = strip_directives(child) if hasattr(child, 'directives') else child
+                elif member == 'fields' and print_ast(existing.type) != print_ast(child.type):
+                    raise CompositionError(
+                        f'{node.name.value}.{name} is {print_ast(existing.type)} in one subgraph '
+                        f'and {print_ast(child.type)} in {subgraph}'
+                    )
+
+    def can_resolve(self, subgraph: str, type_name: str, field_name: str, provided: Provided = None) -> bool:
+        if provided is not None and field_name in provided:
+            return True
+        return subgraph in self.resolvers.get((type_name, field_name), ())
+
+    def owner(self, type_name: str, field_name: str) -> str:
+        subgraphs = self.resolvers.get((type_name, field_name))
+        if not subgraphs:
+            raise GraphQLError(f'No subgraph resolves {type_name}.{field_name}')
+        return subgraphs[0]
+
+    def provided(
+        self, subgraph: str, type_name: str, field_name: str, provided: Provided = None
+    ) -> Provided:
+        if provided is not None and provided.get(field_name) is not None:
+            return provided[field_name]
+        type_ = self.subgraphs[subgraph].get(type_name)
+        return provided_fields(type_.provides.get(field_name)) if type_ is not None else None
+
+    def requires(self, subgraph: str, type_name: str, field_name: str) -> typing.Optional[SelectionSetNode]:
+        type_ = self.subgraphs[subgraph].get(type_name)
+        return type_.requires.get(field_name) if type_ is not None else None
+
+    def entity_key(
+        self, type_name: str, owner: str, subgraph: str, provided: Provided = None
+    ) -> typing.Optional[SelectionSetNode]:
+        """The first @key of `type_name` in `owner` which `subgraph` can resolve."""
+        type_ = self.subgraphs[owner].get(type_name)
+        for key in type_.keys if type_ is not None else ():
+            if all(
+                self.can_resolve(subgraph, type_name, selection.name.value, provided)
+                for selection in key.selections
+                if isinstance(selection, FieldNode)
+            ):
+                return key
+        return None
+
+    def possible_types(self, subgraph: str, abstract_name: str) -> typing.List[str]:
+        types = self.subgraphs[subgraph]
+        abstract = types.get(abstract_name)
+        if abstract is None:
+            return []
+        if abstract.members:
+            names = abstract.members
+        else:
+            names = [
+                type_.name
+                for type_ in types.values()
+                if type_.definition is ObjectTypeDefinitionNode and abstract_name in type_.interfaces
+            ]
+        return [name for name in names if isinstance(self.schema.get_type(name), GraphQLObjectType)]
+
+
+@dataclass(eq=False)
+class Fetch:
+    subgraph: str
+    type_name: typing.Optional[str] = None
+    path: typing.Tuple[str, ...] = ()
+    representation: typing.Optional[SelectionSetNode] = None
+    selection_set: typing.Optional[SelectionSetNode] = None
+    dependents: typing.List['Fetch'] = field(default_factory=list)
+    query: str = ''
+    variables: typing.List[str] = field(default_factory=list)
+
+
+@dataclass
+class EntityBatch:
+    """Entity fetches of one plan level to the same subgraph, sent as one request of aliased `_entities` fields."""
+
+    subgraph: str
+    fetches: typing.List[Fetch]
+    query: str
+    variables: typing.List[str]
+
+
+@dataclass
+class QueryPlan:
+    operation: typing.Optional[OperationType] = None
+    root: typing.List[Fetch] = field(default_factory=list)
+    levels: typing.List[typing.List[EntityBatch]] = field(default_factory=list)
+
+
+def name_node(value: str) -> NameNode:
+    return NameNode(value=value)
+
+
+def typename_node() -> FieldNode:
+    return FieldNode(name=name_node('__typename'), arguments=[], directives=[])
+
+
+def representations_type() -> NonNullTypeNode:
+    return NonNullTypeNode(type=ListTypeNode(type=NonNullTypeNode(type=NamedTypeNode(name=name_node('_Any')))))
+
+
+class VariableUsages(Visitor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.names = []  # type: typing.List[str]
+
+    def enter_variable(self, node: VariableNode, *_: typing.Any) -> None:
+        if node.name.value not in self.names:
+            self.names.append(node.name.value)
+
+
+class QueryPlanner:
+    """Split an operation into subgraph fetches.
+
+    Root fields are grouped per subgraph. Fields another subgraph resolves become an entity fetch at that path,
+    the parent fetch selects the `@key` (and `@requires`) fields needed to build its representations.
+    """
+
+    def __init__(self, supergraph: Supergraph, document: DocumentNode, operation_name: str = None) -> None:
+        self.supergraph = supergraph
+        self.schema = supergraph.schema
+        self.operation = get_operation_ast(document, operation_name)
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+
+    def plan(self) -> QueryPlan:
+        if self.operation is None:
+            return QueryPlan()
+        if self.operation.operation == OperationType.SUBSCRIPTION:
+            raise GraphQLError('Subscriptions are not supported by the gateway')
+
+        root_type = get_operation_root_type(self.schema, self.operation)
+        serial = self.operation.operation == OperationType.MUTATION
+        groups = []  # type: typing.List[typing.Tuple[str, Fields]]
+        for response_key, nodes in self.collect_fields(root_type, [self.operation.selection_set]).items():
+            if nodes[0].name.value.startswith('__'):
+                continue
+            owner = self.supergraph.owner(root_type.name, nodes[0].name.value)
+            group = groups[-1] if serial and groups else next((group for group in groups if group[0] == owner), None)
+            if group is None or group[0] != owner:
+                group = (owner, OrderedDict())
+                groups.append(group)
+            group[1][response_key] = nodes
+
+        plan = QueryPlan(self.operation.operation)
+        for subgraph, fields in groups:
+            fetch = Fetch(subgraph)
+            fetch.selection_set = SelectionSetNode(
+                selections=self.plan_fields(subgraph, root_type, fields, (), fetch, None)
+            )
+            fetch.query, fetch.variables = self.operation_text(self.operation.operation, fetch.selection_set)
+            plan.root.append(fetch)
+
+        level = [dependent for fetch in plan.root for dependent in fetch.dependents]
+        while level:
+            batches = OrderedDict()  # type: typing.Dict[str, typing.List[Fetch]]
+            for fetch in level:
+                batches.setdefault(fetch.subgraph, []).append(fetch)
+            plan.levels.append([self.entity_batch(subgraph, fetches) for subgraph, fetches in batches.items()])
+            level = [dependent for fetch in level for dependent in fetch.dependents]
+        return plan
+
+    def collect_fields(self, object_type: GraphQLObjectType, selection_sets: typing.List[SelectionSetNode]) -> Fields:
+        # @skip / @include stay on the fields sent to subgraphs, the gateway applies them again when projecting.
+        fields = OrderedDict()  # type: Fields
+
+        def collect(selection_set: SelectionSetNode, visited: typing.FrozenSet[str]) -> None:
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    response_key = selection.alias.value if selection.alias else selection.name.value
+                    fields.setdefault(response_key, []).append(selection)
+                elif isinstance(selection, InlineFragmentNode):
+                    if self.applies(selection.type_condition, object_type):
+                        collect(selection.selection_set, visited)
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.fragments.get(name)
+                    if fragment is None or name in visited:
+                        continue
+                    if self.applies(fragment.type_condition, object_type):
+                        collect(fragment.selection_set, visited | {name})
+
+        for selection_set in selection_sets:
+            collect(selection_set, frozenset())
+        return fields
+
+    def applies(self, type_condition: typing.Optional[NamedTypeNode], object_type: GraphQLObjectType) -> bool:
+        if type_condition is None:
+            return True
+        condition = self.schema.get_type(type_condition.name.value)
+        if condition is object_type:
+            return True
+        return is_abstract_type(condition) and self.schema.is_possible_type(condition, object_type)
+
+    def plan_fields(
+        self,
+        subgraph: str,
+        parent_type: GraphQLObjectType,
+        fields: Fields,
+        path: typing.Tuple[str, ...],
+        fetch: Fetch,
+        provided: Provided,
+    ) -> typing.List[typing.Any]:
+        selections = []  # type: typing.List[typing.Any]
+        deferred = OrderedDict()  # type: typing.Dict[str, Fields]
+        for response_key, nodes in fields.items():
+            name = nodes[0].name.value
+            if name == '__typename':
+                selections.append(nodes[0])
+            elif self.supergraph.can_resolve(subgraph, parent_type.name, name, provided):
+                selections.append(self.plan_field(subgraph, parent_type, response_key, nodes, path, fetch, provided))
+            else:
+                owner = self.supergraph.owner(parent_type.name, name)
+                deferred.setdefault(owner, OrderedDict())[response_key] = nodes
+        for owner, owner_fields in deferred.items():
+            self.plan_entity_fetch(subgraph, parent_type, owner, owner_fields, path, fetch, selections, provided)
+        return selections
+
+    def plan_field(
+        self,
+        subgraph: str,
+        parent_type: GraphQLObjectType,
+        response_key: str,
+        nodes: typing.List[FieldNode],
+        path: typing.Tuple[str, ...],
+        fetch: Fetch,
+        provided: Provided,
+    ) -> FieldNode:
+        node = nodes[0]
+        selection_set = None
+        selection_sets = [node.selection_set for node in nodes if node.selection_set]
+        if selection_sets:
+            field_def = parent_type.fields[node.name.value]
+            child_provided = self.supergraph.provided(subgraph, parent_type.name, node.name.value, provided)
+            selection_set = self.plan_selection_set(
+                subgraph, get_named_type(field_def.type), selection_sets, path + (response_key,), fetch, child_provided
+            )
+        return FieldNode(
+            alias=node.alias,
+            name=node.name,
+            arguments=node.arguments,
+            directives=node.directives if len(nodes) == 1 else [],
+            selection_set=selection_set,
+        )
+
+    def plan_selection_set(
+        self,
+        subgraph: str,
+        type_: typing.Any,
+        selection_sets: typing.List[SelectionSetNode],
+        path: typing.Tuple[str, ...],
+        fetch: Fetch,
+        provided: Provided,
+    ) -> SelectionSetNode:
+        if isinstance(type_, GraphQLObjectType):
+            fields = self.collect_fields(type_, selection_sets)
+            return SelectionSetNode(selections=self.plan_fields(subgraph, type_, fields, path, fetch, provided))
+
+        # Abstract types are planned per possible type, `__typename` resolves the type when projecting.
+        selections = [typename_node()]  # type: typing.List[typing.Any]
+        for name in self.supergraph.possible_types(subgraph, type_.name):
+            object_type = self.schema.get_type(name)
+            fields = self.collect_fields(object_type, selection_sets)
+            if fields:
+                selections.append(
+                    InlineFragmentNode(
+                        type_condition=NamedTypeNode(name=name_node(name)),
+                        directives=[],
+                        selection_set=SelectionSetNode(
+                            selections=self.plan_fields(subgraph, object_type, fields, path, fetch, provided)
+                        ),
+                    )
+                )
+        return SelectionSetNode(selections=selections)
+
+    def plan_entity_fetch(
+        self,
+        subgraph: str,
+        parent_type: GraphQLObjectType,
+        owner: str,
+        fields: Fields,
+        path: typing.Tuple[str, ...],
+        fetch: Fetch,
+        selections: typing.List[typing.Any],
+        provided: Provided,
+    ) -> Fetch:
+        type_name = parent_type.name
+        key = self.supergraph.entity_key(type_name, owner, subgraph, provided)
+        if key is None:
+            raise GraphQLError(f'Cannot plan {type_name} fields of {owner} from {subgraph}, no usable @key')
+
+        parent = fetch
+        representation = [self.key_field(selection) for selection in key.selections]
+        required = OrderedDict()  # type: Fields
+        for nodes in fields.values():
+            requires = self.supergraph.requires(owner, type_name, nodes[0].name.value)
+            for selection in requires.selections if requires is not None else ():
+                hidden = self.key_field(selection)
+                if hidden.alias.value not in required:
+                    required[hidden.alias.value] = [hidden]
+                    representation.append(hidden)
+
+        # Required fields the parent subgraph cannot resolve are fetched first, from their owner.
+        missing = OrderedDict()  # type: typing.Dict[str, Fields]
+        for alias, nodes in required.items():
+            name = nodes[0].name.value
+            if self.supergraph.can_resolve(subgraph, type_name, name, provided):
+                selections.append(nodes[0])
+            else:
+                missing.setdefault(self.supergraph.owner(type_name, name), OrderedDict())[alias] = nodes
+        if len(missing) > 1:
+            raise GraphQLError(f'Cannot plan {type_name} fields of {owner}, @requires spans several subgraphs')
+        for required_owner, required_fields in missing.items():
+            parent = self.plan_entity_fetch(
+                subgraph, parent_type, required_owner, required_fields, path, fetch, selections, provided
+            )
+
+        selections.append(typename_node())
+        selections.extend(self.key_field(selection) for selection in key.selections)
+        entity = Fetch(owner, type_name, path, SelectionSetNode(selections=representation))
+        entity.selection_set = SelectionSetNode(
+            selections=[
+                InlineFragmentNode(
+                    type_condition=NamedTypeNode(name=name_node(type_name)),
+                    directives=[],
+                    selection_set=SelectionSetNode(
+                        selections=self.plan_fields(owner, parent_type, fields, path, entity, None)
+                    ),
+                )
+            ]
+        )
+        parent.dependents.append(entity)
+        return entity
+
+    def key_field(self, selection: FieldNode) -> FieldNode:
+        return FieldNode(
+            alias=name_node(KEY_PREFIX + selection.name.value),
+            name=selection.name,
+            arguments=[],
+            directives=[],
+            selection_set=selection.selection_set,
+        )
+
+    def entity_batch(self, subgraph: str, fetches: typing.List[Fetch]) -> EntityBatch:
+        selections = [
+            FieldNode(
+                alias=name_node(f'_{index}'),
+                name=name_node('_entities'),
+                arguments=[
+                    ArgumentNode(
+                        name=name_node('representations'),
+                        value=VariableNode(name=name_node(f'{REPRESENTATIONS}{index}')),
+                    )
+                ],
+                directives=[],
+                selection_set=fetch.selection_set,
+            )
+            for index, fetch in enumerate(fetches)
+        ]
+        definitions = [
+            VariableDefinitionNode(
+                variable=VariableNode(name=name_node(f'{REPRESENTATIONS}{index}')),
+                type=representations_type(),
+                directives=[],
+            )
+            for index in range(len(fetches))
+        ]
+        selection_set = SelectionSetNode(selections=selections)
+        query, variables = self.operation_text(OperationType.QUERY, selection_set, definitions)
+        return EntityBatch(subgraph, fetches, query, variables)
+
+    def operation_text(
+        self,
+        operation: OperationType,
+        selection_set: SelectionSetNode,
+        definitions: typing.List[VariableDefinitionNode] = None,
+    ) -> typing.Tuple[str, typing.List[str]]:
+        usages = VariableUsages()
+        visit(selection_set, usages)
+        definitions = list(definitions or [])
+        names = {definition.variable.name.value for definition in definitions}
+        variables = []
+        for definition in self.operation.variable_definitions or ():
+            name = definition.variable.name.value
+            if name in usages.names and name not in names:
+                definitions.append(definition)
+                variables.append(name)
+        node = OperationDefinitionNode(
+            operation=operation, variable_definitions=definitions, directives=[], selection_set=selection_set
+        )
+        return print_ast(node), variables
+
+
+def collect_targets(value: typing.Any, path: typing.Tuple[str, ...]) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    if isinstance(value, list):
+        for item in value:
+            yield from collect_targets(item, path)
+    elif isinstance(value, dict):
+        if not path:
+            yield value
+        else:
+            yield from collect_targets(value.get(path[0]), path[1:])
+
+
+def deep_merge(target: typing.Dict[str, typing.Any], source: typing.Dict[str, typing.Any]) -> None:
+    for key, value in source.items():
+        current = target.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            deep_merge(current, value)
+        elif isinstance(current, list) and isinstance(value, list) and len(current) == len(value):
+            for index, (current_item, item) in enumerate(zip(current, value)):
+                if isinstance(current_item, dict) and isinstance(item, dict):
+                    deep_merge(current_item, item)
+                else:
+                    current[index] = item
+        else:
+            target[key] = value
+
+
+def representation(
+    selection_set: SelectionSetNode, target: typing.Dict[str, typing.Any]
+) -> typing.Dict[str, typing.Any]:
+    value = {'__typename': target['__typename']}
+    for selection in selection_set.selections:
+        value[selection.name.value] = target.get(selection.alias.value)
+    return value
+
+
+def project_field(source: typing.Any, info: GraphQLResolveInfo, **args: typing.Any) -> typing.Any:
+    return source.get(info.path.key) if isinstance(source, dict) else None
+
+
+def project_type(value: typing.Any, info: GraphQLResolveInfo, abstract_type: typing.Any) -> typing.Optional[str]:
+    return value.get('__typename') if isinstance(value, dict) else None
+
+
+class Gateway:
+    """Apollo Federation gateway: composes subgraph schemas, plans operations and executes them across subgraphs.
+
+    Plans are cached per document and operation. Root fetches run in parallel (in order for mutations), entity
+    fetches run level by level, each level sends one request per subgraph with all representations of every
+    fetch, deduplicated. The merged data is then projected onto the operation by graphql-core, which applies
+    aliases, `@skip` / `@include`, abstract types and null propagation. `forward_headers` are copied from the
+    incoming request to every subgraph request.
+    """
+
+    def __init__(
+        self,
+        subgraphs: typing.Sequence[Subgraph],
+        serializer: Serializer = None,
+        plan_cache_size: int = 1024,
+        forward_headers: typing.Sequence[str] = (),
+    ) -> None:
+        self.subgraphs = OrderedDict((subgraph.name, subgraph) for subgraph in subgraphs)
+        self.serializer = serializer or default_serializer()
+        self.plan_cache_size = plan_cache_size
+        self.forward_headers = [header.lower() for header in forward_headers]
+        self.supergraph = None  # type: typing.Optional[Supergraph]
+        self._plans = OrderedDict()  # type: typing.Dict[typing.Tuple[int, typing.Optional[str]], typing.Any]
+        if all(subgraph.sdl is not None for subgraph in subgraphs):
+            self.compose()
+
+    @property
+    def schema(self) -> GraphQLSchema:
+        assert self.supergraph is not None, 'Gateway is not composed, await gateway.load() first'
+        return self.supergraph.schema
+
+    def compose(self) -> None:
+        self.supergraph = Supergraph({name: subgraph.sdl for name, subgraph in self.subgraphs.items()})
+        self._plans.clear()
+
+    async def load(self) -> None:
+        """Fetch missing subgraph SDLs from `_service { sdl }` and compose."""
+
+        async def load_sdl(subgraph: Subgraph) -> None:
+            body = self.serializer.dumps({'query': '{ _service { sdl } }'})
+            response = self.serializer.loads(await subgraph.request(body))
+            if response.get('errors') or not response.get('data'):
+                raise CompositionError(f'Cannot load the schema of {subgraph.name}: {response.get("errors")}')
+            subgraph.sdl = response['data']['_service']['sdl']
+
+        try:
+            await asyncio.gather(*(load_sdl(subgraph) for subgraph in self.subgraphs.values() if subgraph.sdl is None))
+        finally:
+            # Pools are bound to the loop, let the serving loop create its own.
+            await self.close()
+        self.compose()
+
+    async def close(self) -> None:
+        await asyncio.gather(*(subgraph.close() for subgraph in self.subgraphs.values()))
+
+    def plan(self, document: DocumentNode, operation_name: str = None) -> QueryPlan:
+        # Entries keep their document alive, so its id cannot be reused while cached.
+        key = (id(document), operation_name)
+        cached = self._plans.get(key)
+        if cached is not None:
+            self._plans.move_to_end(key)
+            return cached[1]
+        plan = QueryPlanner(self.supergraph, document, operation_name).plan()
+        if self.plan_cache_size > 0:
+            self._plans[key] = (document, plan)
+            if len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    async def execute(
+        self,
+        document: DocumentNode,
+        variables: typing.Optional[typing.Dict[str, typing.Any]],
+        operation_name: typing.Optional[str],
+        context: typing.Any,
+    ) -> ExecutionResult:
+        try:
+            plan = self.plan(document, operation_name)
+        except GraphQLError as error:
+            return ExecutionResult(data=None, errors=[error])
+
+        variables = variables or {}
+        headers = self.request_headers(context)
+        data = {}  # type: typing.Dict[str, typing.Any]
+        errors = []  # type: typing.List[GraphQLError]
+        if plan.operation == OperationType.MUTATION:
+            for fetch in plan.root:
+                await self.run_root(fetch, variables, headers, data, errors)
+        else:
+            await asyncio.gather(*(self.run_root(fetch, variables, headers, data, errors) for fetch in plan.root))
+        for level in plan.levels:
+            await asyncio.gather(*(self.run_batch(batch, variables, headers, data, errors) for batch in level))
+
+        result = execute(
+            self.schema,
+            document,
+            root_value=data,
+            context_value=context,
+            variable_values=variables,
+            operation_name=operation_name,
+            field_resolver=project_field,
+            type_resolver=project_type,
+        )
+        if isawaitable(result):
+            result = await result
+        errors.extend(result.errors or ())
+        return ExecutionResult(data=result.data, errors=errors or None)
+
+    def request_headers(self, context: typing.Any) -> typing.Dict[str, str]:
+        request = context.get('request') if isinstance(context, dict) else None
+        if request is None or not self.forward_headers:
+            return {}
+        return {name: request.headers[name] for name in self.forward_headers if name in request.headers}
+
+    async def request(
+        self,
+        subgraph: str,
+        query: str,
+        variables: typing.Dict[str, typing.Any],
+        headers: typing.Dict[str, str],
+        errors: typing.List[GraphQLError],
+        keep_paths: bool = True,
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        try:
+            body = self.serializer.dumps({'query': query, 'variables': variables})
+            response = self.serializer.loads(await self.subgraphs[subgraph].request(body, headers))
+        except Exception as exc:
+            errors.append(
+                GraphQLError(f'Request to subgraph {subgraph} failed: {exc}', extensions={'serviceName': subgraph})
+            )
+            return None
+        for error in response.get('errors') or ():
+            errors.append(
+                GraphQLError(
+                    error.get('message', 'An unknown error occurred.'),
+                    path=error.get('path') if keep_paths else None,
+                    extensions=dict(error.get('extensions') or {}, serviceName=subgraph),
+                )
+            )
+        return response.get('data')
+
+    async def run_root(
+        self,
+        fetch: Fetch,
+        variables: typing.Dict[str, typing.Any],
+        headers: typing.Dict[str, str],
+        data: typing.Dict[str, typing.Any],
+        errors: typing.List[GraphQLError],
+    ) -> None:
+        fetch_variables = {name: variables[name] for name in fetch.variables if name in variables}
+        result = await self.request(fetch.subgraph, fetch.query, fetch_variables, headers, errors)
+        if result:
+            deep_merge(data, result)
+
+    async def run_batch(
+        self,
+        batch: EntityBatch,
+        variables: typing.Dict[str, typing.Any],
+        headers: typing.Dict[str, str],
+        data: typing.Dict[str, typing.Any],
+        errors: typing.List[GraphQLError],
+    ) -> None:
+        fetch_variables = {name: variables[name] for name in batch.variables if name in variables}
+        targets = []  # type: typing.List[typing.List[typing.Tuple[typing.Dict[str, typing.Any], int]]]
+        for index, fetch in enumerate(batch.fetches):
+            representations = []  # type: typing.List[typing.Dict[str, typing.Any]]
+            seen = {}  # type: typing.Dict[bytes, int]
+            fetch_targets = []
+            for target in collect_targets(data, fetch.path):
+                if target.get('__typename') != fetch.type_name:
+                    continue
+                value = representation(fetch.representation, target)
+                position = seen.setdefault(self.serializer.dumps(value), len(representations))
+                if position == len(representations):
+                    representations.append(value)
+                fetch_targets.append((target, position))
+            fetch_variables[f'{REPRESENTATIONS}{index}'] = representations
+            targets.append(fetch_targets)
+        if not any(targets):
+            return
+
+        result = await self.request(batch.subgraph, batch.query, fetch_variables, headers, errors, keep_paths=False)
+        for index, fetch_targets in enumerate(targets):
+            entities = (result or {}).get(f'_{index}') or []
+            for target, position in fetch_targets:
+                if position < len(entities) and isinstance(entities[position], dict):
+                    deep_merge(target, entities[position])
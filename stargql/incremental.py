@@ -0,0 +1,307 @@
+import asyncio
+import copy
+import typing
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import islice
+
+from gql import ExecutionContext
+from graphql import (
+    DirectiveLocation,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLList,
+    GraphQLNonNull,
+    GraphQLObjectType,
+    GraphQLOutputType,
+    GraphQLResolveInfo,
+    GraphQLSchema,
+    GraphQLString,
+    InlineFragmentNode,
+    SelectionSetNode,
+    located_error,
+)
+from graphql.execution.values import get_directive_values
+from graphql.pyutils import Path
+
+from .tracing import TracingExecutionContext
+
+GraphQLDeferDirective = GraphQLDirective(
+    name='defer',
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+    },
+    description='Deliver the fragment after the initial payload.',
+)
+
+GraphQLStreamDirective = GraphQLDirective(
+    name='stream',
+    locations=[DirectiveLocation.FIELD],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+        'initialCount': GraphQLArgument(GraphQLNonNull(GraphQLInt), default_value=0),
+    },
+    description='Deliver list items after the first `initialCount` ones one by one as they resolve.',
+)
+
+Patch = typing.Dict[str, typing.Any]
+
+current_publisher = ContextVar('current_publisher', default=None)  # type: ContextVar[typing.Optional[Publisher]]
+
+
+def with_incremental_directives(schema: GraphQLSchema) -> GraphQLSchema:
+    names = {directive.name for directive in schema.directives}
+    directives = (GraphQLDeferDirective, GraphQLStreamDirective)
+    missing = [directive for directive in directives if directive.name not in names]
+    if not missing:
+        return schema
+    kwargs = schema.to_kwargs()
+    kwargs['directives'] = [*schema.directives, *missing]
+    return GraphQLSchema(**kwargs)
+
+
+@dataclass(eq=False)
+class DeferredFragment:
+    label: typing.Optional[str]
+    selection_set: SelectionSetNode
+
+
+class Publisher:
+    """Collects the patches of deferred fragments and streamed items of one operation."""
+
+    def __init__(self) -> None:
+        self.pending = set()  # type: typing.Set[asyncio.Future]
+        self.patches = asyncio.Queue()  # type: asyncio.Queue[typing.Optional[Patch]]
+
+    def schedule(self, coro: typing.Awaitable[None]) -> None:
+        self.pending.add(asyncio.ensure_future(self.run(coro)))
+
+    async def run(self, coro: typing.Awaitable[None]) -> None:
+        try:
+            await coro
+        finally:
+            # Done in the same step as the last publish, so that patch already reports `hasNext: false`.
+            self.pending.discard(asyncio.current_task())
+            self.patches.put_nowait(None)
+
+    def publish(self, patch: Patch) -> None:
+        self.patches.put_nowait(patch)
+
+    async def subsequent_payloads(self) -> typing.AsyncIterator[typing.Tuple[typing.List[Patch], bool]]:
+        has_next = True
+        while has_next:
+            patches = [await self.patches.get()]
+            while not self.patches.empty():
+                patches.append(self.patches.get_nowait())
+            patches = [patch for patch in patches if patch is not None]
+            has_next = bool(self.pending) or not self.patches.empty()
+            if patches or not has_next:
+                yield patches, has_next
+
+    def cancel(self) -> None:
+        for task in self.pending:
+            task.cancel()
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.publisher = current_publisher.get()
+
+    def fork(self) -> 'IncrementalExecutionContext':
+        """A context sharing everything but errors, which belong to the patch."""
+        context = copy.copy(self)
+        context.errors = []
+        return context
+
+    def patch(self, path: typing.Optional[Path], label: typing.Optional[str], **values: typing.Any) -> Patch:
+        patch = dict(values, path=path.as_list() if path else [])
+        if label is not None:
+            patch['label'] = label
+        if self.errors:
+            patch['errors'] = self.errors
+        return patch
+
+    def collect_fields(
+        self,
+        runtime_type: GraphQLObjectType,
+        selection_set: SelectionSetNode,
+        fields: typing.Dict[str, typing.List[FieldNode]],
+        visited_fragment_names: typing.Set[str],
+    ) -> typing.Dict[str, typing.List[FieldNode]]:
+        deferred = []
+        selections = []
+        for selection in selection_set.selections:
+            defer = None
+            if isinstance(selection, (FragmentSpreadNode, InlineFragmentNode)) and self.should_include_node(selection):
+                defer = get_directive_values(GraphQLDeferDirective, selection, self.variable_values)
+            if defer and defer['if']:
+                deferred.append((selection, defer.get('label')))
+            else:
+                selections.append(selection)
+        if not deferred:
+            return super().collect_fields(runtime_type, selection_set, fields, visited_fragment_names)
+
+        super().collect_fields(
+            runtime_type, SelectionSetNode(selections=selections), fields, visited_fragment_names
+        )
+        for selection, label in deferred:
+            fragment = selection
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+            if fragment and self.does_fragment_condition_match(fragment, runtime_type):
+                fields[DeferredFragment(label, fragment.selection_set)] = []
+        return fields
+
+    def execute_fields(
+        self,
+        parent_type: GraphQLObjectType,
+        source_value: typing.Any,
+        path: typing.Optional[Path],
+        fields: typing.Dict[str, typing.List[FieldNode]],
+    ) -> typing.Any:
+        fields = self.defer_fragments(parent_type, source_value, path, fields)
+        return super().execute_fields(parent_type, source_value, path, fields)
+
+    def execute_fields_serially(
+        self,
+        parent_type: GraphQLObjectType,
+        source_value: typing.Any,
+        path: typing.Optional[Path],
+        fields: typing.Dict[str, typing.List[FieldNode]],
+    ) -> typing.Any:
+        fields = self.defer_fragments(parent_type, source_value, path, fields)
+        return super().execute_fields_serially(parent_type, source_value, path, fields)
+
+    def defer_fragments(
+        self,
+        parent_type: GraphQLObjectType,
+        source_value: typing.Any,
+        path: typing.Optional[Path],
+        fields: typing.Dict[str, typing.List[FieldNode]],
+    ) -> typing.Dict[str, typing.List[FieldNode]]:
+        deferred = [key for key in fields if isinstance(key, DeferredFragment)]
+        if not deferred:
+            return fields
+        for fragment in deferred:
+            self.publisher.schedule(self.execute_deferred(fragment, parent_type, source_value, path))
+        return {key: value for key, value in fields.items() if not isinstance(key, DeferredFragment)}
+
+    async def execute_deferred(
+        self,
+        fragment: DeferredFragment,
+        parent_type: GraphQLObjectType,
+        source_value: typing.Any,
+        path: typing.Optional[Path],
+    ) -> None:
+        context = self.fork()
+        fields = context.collect_fields(parent_type, fragment.selection_set, {}, set())
+        try:
+            data = context.execute_fields(parent_type, source_value, path, fields)
+            if context.is_awaitable(data):
+                data = await data
+        except GraphQLError as error:
+            context.errors.append(error)
+            data = None
+        self.publisher.publish(context.patch(path, fragment.label, data=data))
+
+    def complete_list_value(
+        self,
+        return_type: GraphQLList[GraphQLOutputType],
+        field_nodes: typing.List[FieldNode],
+        info: GraphQLResolveInfo,
+        path: Path,
+        result: typing.Any,
+    ) -> typing.Any:
+        stream = get_directive_values(GraphQLStreamDirective, field_nodes[0], self.variable_values)
+        if not stream or not stream['if']:
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+
+        initial_count = stream['initialCount']
+        label = stream.get('label')
+        if hasattr(result, '__aiter__'):
+            iterator = result.__aiter__()
+            return self.complete_async_stream(return_type, field_nodes, info, path, iterator, initial_count, label)
+        if not isinstance(result, typing.Iterable) or isinstance(result, str):
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+
+        iterator = iter(result)
+        initial = list(islice(iterator, initial_count))
+        self.publisher.schedule(
+            self.stream_items(return_type.of_type, field_nodes, info, path, iterate(iterator), len(initial), label)
+        )
+        return super().complete_list_value(return_type, field_nodes, info, path, initial)
+
+    async def complete_async_stream(
+        self,
+        return_type: GraphQLList[GraphQLOutputType],
+        field_nodes: typing.List[FieldNode],
+        info: GraphQLResolveInfo,
+        path: Path,
+        iterator: typing.AsyncIterator[typing.Any],
+        initial_count: int,
+        label: typing.Optional[str],
+    ) -> typing.List[typing.Any]:
+        initial = []
+        try:
+            while len(initial) < initial_count:
+                initial.append(await iterator.__anext__())
+        except StopAsyncIteration:
+            pass
+        else:
+            self.publisher.schedule(
+                self.stream_items(return_type.of_type, field_nodes, info, path, iterator, len(initial), label)
+            )
+        completed = super().complete_list_value(return_type, field_nodes, info, path, initial)
+        if self.is_awaitable(completed):
+            completed = await completed
+        return completed
+
+    async def stream_items(
+        self,
+        item_type: GraphQLOutputType,
+        field_nodes: typing.List[FieldNode],
+        info: GraphQLResolveInfo,
+        path: Path,
+        iterator: typing.AsyncIterator[typing.Any],
+        index: int,
+        label: typing.Optional[str],
+    ) -> None:
+        try:
+            while True:
+                context = self.fork()
+                item_path = path.add_key(index)
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as exc:
+                    context.errors.append(located_error(exc, field_nodes, item_path.as_list()))
+                    self.publisher.publish(context.patch(item_path, label, items=None))
+                    return
+
+                completed = context.complete_value_catching_error(item_type, field_nodes, info, item_path, item)
+                if context.is_awaitable(completed):
+                    completed = await completed
+                self.publisher.publish(context.patch(item_path, label, items=[completed]))
+                index += 1
+        finally:
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+
+
+class TracingIncrementalExecutionContext(TracingExecutionContext, IncrementalExecutionContext):
+    pass
+
+
+async def iterate(iterator: typing.Iterator[typing.Any]) -> typing.AsyncIterator[typing.Any]:
+    for item in iterator:
+        yield item
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from inspect import isawaitable, iscoroutinefunction, unwrap
+
+from graphql import GraphQLObjectType, GraphQLSchema
+
+OFFLOAD_ATTRIBUTE = '__stargql_offload__'
+NO_OFFLOAD_ATTRIBUTE = '__stargql_no_offload__'
+OFFLOADED_ATTRIBUTE = '__stargql_offloaded__'
+# Federation fields resolved by the library, they only schedule other resolvers.
+FEDERATION_FIELDS = ('_entities', '_service')
+
+
+def offload(func: typing.Callable) -> typing.Callable:
+    """Mark a sync resolver to run in the resolver thread pool."""
+    setattr(func, OFFLOAD_ATTRIBUTE, True)
+    return func
+
+
+def no_offload(func: typing.Callable) -> typing.Callable:
+    """Keep a sync resolver on the event loop, even with `offload_sync_resolvers=True`.
+
+    Sync resolvers returning awaitables, like a DataLoader `load`, need it: they schedule work on the event loop.
+    """
+    setattr(func, NO_OFFLOAD_ATTRIBUTE, True)
+    return func
+
+
+def timed_call(func: typing.Callable, *args: typing.Any, **kwargs: typing.Any) -> typing.Tuple[float, typing.Any]:
+    return time.time(), func(*args, **kwargs)
+
+
+@dataclass
+class PoolMetrics:
+    max_workers: int
+    submitted: int = 0
+    completed: int = 0
+    peak_queued: int = 0
+    queue_wait: float = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.completed
+
+    @property
+    def running(self) -> int:
+        return min(self.pending, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        return max(self.pending - self.max_workers, 0)
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'max_workers': self.max_workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'running': self.running,
+            'queued': self.queued,
+            'peak_queued': self.peak_queued,
+            'mean_queue_wait': self.queue_wait / self.completed if self.completed else 0.0,
+        }
+
+
+class ResolverPool:
+    """Bounded pools to keep blocking work off the event loop.
+
+    Sync resolvers run in threads, with context variables copied. `run_in_process` is for pure CPU bound
+    functions, their arguments and result must be picklable. The process pool is created on first use.
+    """
+
+    def __init__(self, max_workers: int = 8, max_processes: int = None) -> None:
+        self.threads = ThreadPoolExecutor(max_workers, thread_name_prefix='stargql-resolver')
+        self.thread_metrics = PoolMetrics(max_workers)
+        self.max_processes = max_processes
+        self.processes = None  # type: typing.Optional[ProcessPoolExecutor]
+        self.process_metrics = None  # type: typing.Optional[PoolMetrics]
+
+    async def run(self, func: typing.Callable, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, timed_call, func, *args, **kwargs)
+        return await self.submit(self.threads, self.thread_metrics, call)
+
+    async def run_in_process(self, func: typing.Callable, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        if self.processes is None:
+            self.processes = ProcessPoolExecutor(self.max_processes)
+            self.process_metrics = PoolMetrics(self.max_processes or os.cpu_count() or 1)
+        call = functools.partial(timed_call, func, *args, **kwargs)
+        return await self.submit(self.processes, self.process_metrics, call)
+
+    async def submit(self, executor: Executor, metrics: PoolMetrics, call: typing.Callable) -> typing.Any:
+        submitted = time.time()
+        metrics.submitted += 1
+        metrics.peak_queued = max(metrics.peak_queued, metrics.queued)
+        try:
+            started, result = await asyncio.get_event_loop().run_in_executor(executor, call)
+        finally:
+            metrics.completed += 1
+        metrics.queue_wait += max(started - submitted, 0.0)
+        return result
+
+    def wrap(self, resolver: typing.Callable) -> typing.Callable:
+        @functools.wraps(resolver)
+        async def offloaded(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+            result = await self.run(resolver, *args, **kwargs)
+            # An awaitable made in the worker, like a coroutine, runs on the event loop.
+            if isawaitable(result):
+                result = await result
+            return result
+
+        setattr(offloaded, OFFLOADED_ATTRIBUTE, True)
+        return offloaded
+
+    def offload_resolvers(self, schema: GraphQLSchema, all_sync: bool = False) -> None:
+        """Run the sync resolvers of `schema` marked with `@offload` (or all of them) in the thread pool.
+
+        Resolvers already offloaded, by this pool or another one sharing the schema, are left as they are.
+        """
+        for type_ in schema.type_map.values():
+            if not isinstance(type_, GraphQLObjectType) or type_.name.startswith('__'):
+                continue
+            for name, field in type_.fields.items():
+                resolver = field.resolve
+                # Wrappers copy the attributes of the resolver they wrap, and are unwrapped to find async ones.
+                if (
+                    resolver is None
+                    or getattr(resolver, OFFLOADED_ATTRIBUTE, False)
+                    or iscoroutinefunction(unwrap(resolver))
+                ):
+                    continue
+                if getattr(resolver, OFFLOAD_ATTRIBUTE, False):
+                    field.resolve = self.wrap(resolver)
+                elif all_sync and not getattr(resolver, NO_OFFLOAD_ATTRIBUTE, False):
+                    if type_ is schema.query_type and name in FEDERATION_FIELDS:
+                        continue
+                    field.resolve = self.wrap(resolver)
+
+    def metrics(self) -> typing.Dict[str, typing.Any]:
+        metrics = {'threads': self.thread_metrics.to_dict()}
+        if self.process_metrics is not None:
+            metrics['processes'] = self.process_metrics.to_dict()
+        return metrics
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.threads.shutdown(wait)
+        if self.processes is not None:
+            self.processes.shutdown(wait)
@@ -0,0 +1,69 @@
+import hashlib
+import typing
+from collections import OrderedDict
+
+from graphql import GraphQLError
+
+# https://github.com/apollographql/apollo-link-persisted-queries#protocol
+PERSISTED_QUERY_NOT_FOUND = 'PERSISTED_QUERY_NOT_FOUND'
+PERSISTED_QUERY_NOT_SUPPORTED = 'PERSISTED_QUERY_NOT_SUPPORTED'
+INVALID_PERSISTED_QUERY = 'INVALID_PERSISTED_QUERY'
+
+
+class PersistedQueryError(GraphQLError):
+    def __init__(self, message: str, code: str) -> None:
+        super().__init__(message, extensions={'code': code})
+
+
+class PersistedQueryStore:
+    """Async hash-to-query store, subclass it to share persisted queries between workers."""
+
+    async def get(self, sha256_hash: str) -> typing.Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, sha256_hash: str, query: str) -> None:
+        raise NotImplementedError
+
+
+class LRUPersistedQueryStore(PersistedQueryStore):
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._queries = OrderedDict()  # type: typing.Dict[str, str]
+
+    async def get(self, sha256_hash: str) -> typing.Optional[str]:
+        query = self._queries.get(sha256_hash)
+        if query is not None:
+            self._queries.move_to_end(sha256_hash)
+        return query
+
+    async def set(self, sha256_hash: str, query: str) -> None:
+        self._queries[sha256_hash] = query
+        self._queries.move_to_end(sha256_hash)
+        if len(self._queries) > self.maxsize:
+            self._queries.popitem(last=False)
+
+
+def hash_query(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+async def load_persisted_query(
+    store: PersistedQueryStore, query: typing.Optional[str], persisted_query: typing.Any
+) -> str:
+    if not isinstance(persisted_query, dict) or persisted_query.get('version') != 1:
+        raise PersistedQueryError('Unsupported persisted query version.', PERSISTED_QUERY_NOT_SUPPORTED)
+
+    sha256_hash = persisted_query.get('sha256Hash')
+    if not isinstance(sha256_hash, str):
+        raise PersistedQueryError('Persisted query sha256Hash must be a string.', INVALID_PERSISTED_QUERY)
+
+    if query is None:
+        query = await store.get(sha256_hash)
+        if query is None:
+            raise PersistedQueryError('PersistedQueryNotFound', PERSISTED_QUERY_NOT_FOUND)
+        return query
+
+    if not isinstance(query, str) or hash_query(query) != sha256_hash:
+        raise PersistedQueryError('Provided sha does not match query.', INVALID_PERSISTED_QUERY)
+    await store.set(sha256_hash, query)
+    return query
@@ -0,0 +1,337 @@
+import asyncio
+import collections
+import fcntl
+import os
+import struct
+import typing
+
+from .serializers import Serializer, default_serializer
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+ERROR = 'error'
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, ERROR)
+
+Topics = typing.Union[str, typing.Sequence[str]]
+
+# Broker frames: body size, kind, topic size, then the topic and the serialized payload.
+FRAME_HEADER = struct.Struct('>IcH')
+PUBLISH = b'p'
+SUBSCRIBE = b's'
+UNSUBSCRIBE = b'u'
+
+
+class PubSubOverflow(Exception):
+    pass
+
+
+class PubSubIterator:
+    """Async iterator over the payloads published to some topics, buffered in a bounded queue.
+
+    When the queue is full `drop_oldest` discards the oldest payload, `drop_newest` the new one and `error` ends the
+    iteration with `PubSubOverflow`. Closing the iterator (`aclose`) unsubscribes it and cancels a pending `__anext__`.
+    """
+
+    def __init__(self, pubsub: 'PubSub', topics: typing.List[str], queue_size: int, overflow: str) -> None:
+        self.pubsub = pubsub
+        self.topics = topics
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.queue = collections.deque()  # type: typing.Deque[typing.Any]
+        self.waiter = None  # type: typing.Optional[asyncio.Future]
+        self.dropped = 0
+        self.overflowed = False
+        self.closed = False
+
+    def __aiter__(self) -> 'PubSubIterator':
+        return self
+
+    async def __anext__(self) -> typing.Any:
+        while not self.queue:
+            if self.overflowed:
+                raise PubSubOverflow(f'Subscriber of {", ".join(self.topics)} fell behind by {self.queue_size} events')
+            if self.closed:
+                raise StopAsyncIteration
+            self.waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.queue.popleft()
+
+    def offer(self, payload: typing.Any) -> None:
+        if self.closed:
+            return
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            if self.overflow == DROP_NEWEST:
+                return
+            if self.overflow == ERROR:
+                self.overflowed = True
+                self.queue.clear()
+                self.close()
+                return
+            self.queue.popleft()
+        self.queue.append(payload)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.pubsub.unsubscribe(self)
+            # graphql-core leaves the `__anext__` task of a cancelled subscription behind, cancelling the wait ends it
+            # without an unretrieved exception.
+            if self.waiter is not None:
+                self.waiter.cancel()
+
+    async def aclose(self) -> None:
+        self.queue.clear()
+        self.close()
+
+
+class PubSub:
+    """In-process pubsub engine, used like other pubsub engines in subscription resolvers.
+
+        pubsub = PubSub()
+
+        @subscribe
+        async def post_added(parent, info):
+            return pubsub.async_iterator('POST_ADDED')
+
+        @mutate
+        async def add_post(parent, info, **kwargs):
+            await pubsub.publish('POST_ADDED', {'postAdded': kwargs})
+
+    Every subscriber has its own queue of `queue_size` payloads, `overflow` decides what happens when it is full.
+    """
+
+    def __init__(self, queue_size: int = 100, overflow: str = DROP_OLDEST) -> None:
+        assert overflow in OVERFLOW_POLICIES, f'overflow must be one of {", ".join(OVERFLOW_POLICIES)}'
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.topics = {}  # type: typing.Dict[str, typing.Set[PubSubIterator]]
+
+    async def publish(self, topic: str, payload: typing.Any) -> None:
+        self.deliver(topic, payload)
+
+    def deliver(self, topic: str, payload: typing.Any) -> None:
+        for subscriber in list(self.topics.get(topic, ())):
+            subscriber.offer(payload)
+
+    def async_iterator(self, topics: Topics) -> PubSubIterator:
+        topics = [topics] if isinstance(topics, str) else list(topics)
+        iterator = PubSubIterator(self, topics, self.queue_size, self.overflow)
+        for topic in topics:
+            subscribers = self.topics.setdefault(topic, set())
+            subscribers.add(iterator)
+            if len(subscribers) == 1:
+                self.topic_added(topic)
+        return iterator
+
+    def unsubscribe(self, iterator: PubSubIterator) -> None:
+        for topic in iterator.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(iterator)
+            if not subscribers:
+                del self.topics[topic]
+                self.topic_removed(topic)
+
+    def subscribers(self, topic: str) -> int:
+        return len(self.topics.get(topic, ()))
+
+    def topic_added(self, topic: str) -> None:
+        pass
+
+    def topic_removed(self, topic: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        for subscribers in list(self.topics.values()):
+            for subscriber in list(subscribers):
+                subscriber.close()
+
+
+def encode_frame(kind: bytes, topic: str, payload: bytes = b'') -> bytes:
+    topic_bytes = topic.encode('utf-8')
+    return FRAME_HEADER.pack(len(topic_bytes) + len(payload), kind, len(topic_bytes)) + topic_bytes + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> typing.Tuple[bytes, str, bytes, bytes]:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    size, kind, topic_size = FRAME_HEADER.unpack(header)
+    body = await reader.readexactly(size)
+    return kind, body[:topic_size].decode('utf-8'), body[topic_size:], header + body
+
+
+class Broker:
+    """Forwards published frames to the other connected workers subscribed to their topic."""
+
+    def __init__(self) -> None:
+        self.topics = {}  # type: typing.Dict[str, typing.Set[asyncio.StreamWriter]]
+        self.connections = {}  # type: typing.Dict[asyncio.StreamWriter, asyncio.Task]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections[writer] = asyncio.current_task()
+        topics = set()  # type: typing.Set[str]
+        try:
+            while True:
+                kind, topic, _, frame = await read_frame(reader)
+                if kind == PUBLISH:
+                    for subscriber in self.topics.get(topic, ()):
+                        # No drain: one slow worker must not hold back the others, its transport buffers instead.
+                        if subscriber is not writer:
+                            subscriber.write(frame)
+                elif kind == SUBSCRIBE:
+                    topics.add(topic)
+                    self.topics.setdefault(topic, set()).add(writer)
+                elif kind == UNSUBSCRIBE:
+                    topics.discard(topic)
+                    self.remove(topic, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for topic in topics:
+                self.remove(topic, writer)
+            self.connections.pop(writer, None)
+            writer.close()
+
+    def remove(self, topic: str, writer: asyncio.StreamWriter) -> None:
+        writers = self.topics.get(topic)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.topics[topic]
+
+    async def close(self) -> None:
+        tasks = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class UnixSocketPubSub(PubSub):
+    """`PubSub` shared by the worker processes of one machine through a broker on a Unix socket.
+
+    The first worker to take the lock file `<path>.lock` runs the broker, every worker (that one included) connects
+    to it. Payloads are delivered to local subscribers right away and sent through the broker to the workers which
+    have subscribers for the topic, so they must be serializable by `serializer`. If the broker worker exits, another
+    one takes over after `reconnect_interval`; events published to other workers meanwhile are lost.
+
+    Call `await pubsub.connect()` on startup and `await pubsub.close()` on shutdown.
+    """
+
+    def __init__(
+        self,
+        path: str = '/tmp/stargql-pubsub.sock',
+        serializer: Serializer = None,
+        queue_size: int = 100,
+        overflow: str = DROP_OLDEST,
+        reconnect_interval: float = 0.5,
+    ) -> None:
+        super().__init__(queue_size, overflow)
+        self.path = path
+        self.serializer = serializer or default_serializer()
+        self.reconnect_interval = reconnect_interval
+        self.writer = None  # type: typing.Optional[asyncio.StreamWriter]
+        self.task = None  # type: typing.Optional[asyncio.Task]
+        self.connected = None  # type: typing.Optional[asyncio.Event]
+        self.broker = None  # type: typing.Optional[Broker]
+        self.server = None  # type: typing.Optional[asyncio.AbstractServer]
+        self.lock_fd = None  # type: typing.Optional[int]
+
+    async def connect(self, timeout: float = 5.0) -> None:
+        self.start()
+        await asyncio.wait_for(self.connected.wait(), timeout)
+
+    def start(self) -> None:
+        if self.task is None:
+            self.connected = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+
+    async def publish(self, topic: str, payload: typing.Any) -> None:
+        self.start()
+        self.deliver(topic, payload)
+        if self.writer is not None:
+            self.writer.write(encode_frame(PUBLISH, topic, self.serializer.dumps(payload)))
+            await self.writer.drain()
+
+    def async_iterator(self, topics: Topics) -> PubSubIterator:
+        self.start()
+        return super().async_iterator(topics)
+
+    def topic_added(self, topic: str) -> None:
+        if self.writer is not None:
+            self.writer.write(encode_frame(SUBSCRIBE, topic))
+
+    def topic_removed(self, topic: str) -> None:
+        if self.writer is not None:
+            self.writer.write(encode_frame(UNSUBSCRIBE, topic))
+
+    async def run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not await self.start_broker():
+                    await asyncio.sleep(self.reconnect_interval)
+                continue
+
+            for topic in self.topics:
+                writer.write(encode_frame(SUBSCRIBE, topic))
+            self.writer = writer
+            self.connected.set()
+            try:
+                while True:
+                    kind, topic, payload, _ = await read_frame(reader)
+                    if kind == PUBLISH:
+                        self.deliver(topic, self.serializer.loads(payload))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                self.writer = None
+                self.connected.clear()
+                writer.close()
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def start_broker(self) -> bool:
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        try:
+            # Holding the lock, any socket file left is stale.
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.broker = Broker()
+            self.server = await asyncio.start_unix_server(self.broker.handle, self.path)
+        except BaseException:
+            self.broker = None
+            os.close(fd)
+            raise
+        self.lock_fd = fd
+        return True
+
+    async def close(self) -> None:
+        await super().close()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.server is not None:
+            self.server.close()
+            await self.broker.close()
+            await self.server.wait_closed()
+            self.server = self.broker = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)
+            self.lock_fd = None
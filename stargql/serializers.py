@@ -0,0 +1,87 @@
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class Serializer:
+    media_type = 'application/json'
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: typing.Union[str, bytes]) -> typing.Any:
+        raise NotImplementedError
+
+    def iter_dumps(self, obj: typing.Any, chunk_size: int = 65536) -> typing.Iterator[bytes]:
+        """Serialize `obj` in chunks of about `chunk_size` bytes, never holding the whole document in memory."""
+        buffer = bytearray()
+        for piece in self.pieces(obj, chunk_size):
+            if not buffer and len(piece) >= chunk_size:
+                yield piece
+                continue
+            buffer += piece
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    def pieces(self, obj: typing.Any, chunk_size: int) -> typing.Iterator[bytes]:
+        if isinstance(obj, (list, tuple)):
+            yield b'['
+            # Items are dumped in groups of about `chunk_size` bytes, sized after the previous group. An item is only
+            # walked on its own when the previous one was larger than that already.
+            index, step, item_size = 0, 1, 0
+            while index < len(obj):
+                if step == 1 and item_size > chunk_size:
+                    if index:
+                        yield b','
+                    item_size = 0
+                    for piece in self.pieces(obj[index], chunk_size):
+                        item_size += len(piece)
+                        yield piece
+                    index += 1
+                    continue
+                encoded = self.dumps(list(obj[index:index + step]))[1:-1]
+                group = min(step, len(obj) - index)
+                yield b',' + encoded if index else encoded
+                item_size = len(encoded) // group
+                step = max(chunk_size // max(item_size, 1), 1)
+                index += group
+            yield b']'
+        elif isinstance(obj, dict) and any(isinstance(value, (dict, list, tuple)) for value in obj.values()):
+            yield b'{'
+            for i, (key, value) in enumerate(obj.items()):
+                key = self.dumps(str(key)) + b':'
+                yield b',' + key if i else key
+                yield from self.pieces(value, chunk_size)
+            yield b'}'
+        else:
+            yield self.dumps(obj)
+
+
+class JSONSerializer(Serializer):
+    def dumps(self, obj: typing.Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: typing.Union[str, bytes]) -> typing.Any:
+        return json.loads(data)
+
+
+class ORJSONSerializer(Serializer):
+    def __init__(self) -> None:
+        assert orjson is not None, 'orjson must be installed to use ORJSONSerializer'
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: typing.Union[str, bytes]) -> typing.Any:
+        return orjson.loads(data)
+
+
+def default_serializer() -> Serializer:
+    return ORJSONSerializer() if orjson is not None else JSONSerializer()
@@ -1,16 +1,62 @@
 import asyncio
-import inspect
 import json
-from dataclasses import dataclass
-from typing import Any, AsyncIterator, Awaitable, Dict, Sequence
-
-from gql.subscription import PROTOCOL, MessageType, OperationMessage
-from graphql import ExecutionResult, GraphQLError, GraphQLSchema, format_error, parse, subscribe
+from dataclasses import dataclass, field, replace
+from inspect import isawaitable
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple, Union
+
+from gql.subscription import PROTOCOL, MessageType, OperationMessage, OperationMessagePayload
+from gql import ExecutionContext, MiddlewareManager
+from gql.resolver import default_field_resolver
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    GraphQLSchema,
+    OperationType,
+    execute,
+    format_error,
+    get_operation_ast,
+)
+from graphql.subscription import create_source_event_stream
 from starlette import status
 from starlette.authentication import BaseUser
 from starlette.types import Receive, Scope, Send
 from starlette.websockets import Message, WebSocket
 
+from .admission import AdmissionControl, AdmissionRejected
+from .cache import DocumentCache
+from .dataloader import DataLoaderFactory, DataLoaderRegistry
+from .serializers import Serializer, default_serializer
+from .validation import ComplexityLimit
+
+# https://github.com/enisdenjo/graphql-ws/blob/master/PROTOCOL.md
+GRAPHQL_TRANSPORT_WS = 'graphql-transport-ws'
+
+WS_4400_BAD_REQUEST = 4400
+WS_4401_UNAUTHORIZED = 4401
+WS_4403_FORBIDDEN = 4403
+WS_4408_INIT_TIMEOUT = 4408
+WS_4409_SUBSCRIBER_EXISTS = 4409
+WS_4429_TOO_MANY_INIT_REQUESTS = 4429
+
+# Seconds a closing connection waits for its queued messages to be sent.
+FLUSH_TIMEOUT = 1.0
+
+# Server -> Client message types of graphql-transport-ws, keyed by their subscriptions-transport-ws counterpart.
+TRANSPORT_WS_MESSAGE_TYPES = {
+    MessageType.GQL_CONNECTION_ACK: 'connection_ack',
+    MessageType.GQL_CONNECTION_KEEP_ALIVE: 'ping',
+    MessageType.GQL_DATA: 'next',
+    MessageType.GQL_ERROR: 'error',
+    MessageType.GQL_COMPLETE: 'complete',
+}
+
+
+class CloseConnection(Exception):
+    def __init__(self, code: int) -> None:
+        super().__init__(code)
+        self.code = code
+
 
 def create_async_iterator(seq: Sequence[Any]):
     async def inner():
@@ -23,79 +69,211 @@ def create_async_iterator(seq: Sequence[Any]):
 @dataclass
 class ConnectionContext:
     socket: WebSocket
-    operations: Dict[str, AsyncIterator[ExecutionResult]]
+    operations: Dict[str, 'asyncio.Task[None]']
+    protocol: str = PROTOCOL
     user: BaseUser = None
+    loaders: DataLoaderRegistry = None
+    initialized: bool = False
+    binary_frames: bool = False
+    connected_at: float = 0.0
+    keep_alive_task: 'asyncio.Task[None]' = None
+    outbox: 'asyncio.Queue[bytes]' = None
+    sender_task: 'asyncio.Task[None]' = None
+    reader_task: 'asyncio.Task[None]' = None
+    # What `context_builder` returns, built for every execution like the context of an HTTP request.
+    values: Dict[str, Any] = field(default_factory=dict)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+
+@dataclass
+class SharedOperation:
+    """One source iterator whose results are broadcast to every identical subscription.
+
+    Each subscriber waits on a future, resolved with whether it was dropped once the operation is over for it.
+    """
+
+    key: Hashable
+    subscribers: Dict[Tuple[int, str], Tuple[ConnectionContext, str, asyncio.Future]] = field(default_factory=dict)
+    done: bool = False
+    task: 'asyncio.Task[None]' = None
 
 
 class Subscription:
     schema: GraphQLSchema
     keep_alive: bool
+    keep_alive_interval: float
+    idle_timeout: Optional[float]
+    connection_init_timeout: Optional[float]
+    max_operations: int
+    send_queue_size: int
+    protocols: Sequence[str]
+    binary_frames: bool
     authenticate: Awaitable
+    document_cache: DocumentCache
+    share_subscriptions: bool
+    shared_operations: Dict[Hashable, SharedOperation]
 
-    def __init__(self, schema: GraphQLSchema, keep_alive: bool = False, authenticate: Awaitable = None) -> None:
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        keep_alive: bool = False,
+        keep_alive_interval: float = 15.0,
+        idle_timeout: float = None,
+        connection_init_timeout: float = None,
+        max_operations: int = 100,
+        send_queue_size: int = 100,
+        protocols: Sequence[str] = (GRAPHQL_TRANSPORT_WS, PROTOCOL),
+        binary_frames: bool = False,
+        authenticate: Awaitable = None,
+        document_cache: DocumentCache = None,
+        dataloaders: Dict[str, DataLoaderFactory] = None,
+        serializer: Serializer = None,
+        share_subscriptions: bool = False,
+        share_key: Callable[[ConnectionContext], Hashable] = None,
+        admission: AdmissionControl = None,
+        complexity_limit: ComplexityLimit = None,
+        middleware: MiddlewareManager = None,
+        context_builder: Callable[[], Dict[str, Any]] = None,
+    ) -> None:
         self.schema = schema
         self.keep_alive = keep_alive
+        self.keep_alive_interval = keep_alive_interval
+        self.idle_timeout = idle_timeout
+        self.connection_init_timeout = connection_init_timeout
+        self.max_operations = max_operations
+        self.send_queue_size = send_queue_size
+        self.protocols = protocols
+        self.binary_frames = binary_frames
         self.authenticate = authenticate
+        self.document_cache = DocumentCache() if document_cache is None else document_cache
+        self.dataloaders = dataloaders
+        self.serializer = serializer or default_serializer()
+        self.share_subscriptions = share_subscriptions
+        self.share_key = share_key
+        self.admission = admission
+        self.complexity_limit = complexity_limit
+        self.middleware = middleware
+        self.context_builder = context_builder
+        self.shared_operations = {}
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         socket = WebSocket(scope, receive=receive, send=send)
-        await self.on_connect(socket)
-
-        context = ConnectionContext(socket=socket, operations={})
+        protocol = self.select_protocol(socket)
+        await self.on_connect(socket, protocol)
+
+        context = ConnectionContext(
+            socket=socket,
+            operations={},
+            protocol=protocol,
+            connected_at=asyncio.get_event_loop().time(),
+            outbox=asyncio.Queue(self.send_queue_size),
+            reader_task=asyncio.current_task(),
+        )
+        context.sender_task = asyncio.create_task(self.sender_loop(context))
         await self.on_message(context)
 
-    async def on_connect(self, socket: WebSocket) -> None:
-        await socket.accept(PROTOCOL)
+    def select_protocol(self, socket: WebSocket) -> str:
+        requested = socket.scope.get('subprotocols') or []
+        for protocol in self.protocols:
+            if protocol in requested:
+                return protocol
+        return PROTOCOL
+
+    async def on_connect(self, socket: WebSocket, protocol: str = PROTOCOL) -> None:
+        await socket.accept(protocol)
 
     async def on_disconnect(self, socket: WebSocket, close_code: int) -> None:
         await socket.close(close_code)
 
     async def on_message(self, context: ConnectionContext) -> None:
         close_code = status.WS_1000_NORMAL_CLOSURE
+        disconnected = False
         try:
             while True:
-                message = await context.socket.receive()
+                try:
+                    message = await asyncio.wait_for(context.socket.receive(), self.receive_timeout(context))
+                except asyncio.TimeoutError:
+                    # Idle is measured from the client's last message, open operations or not: an abandoned
+                    # subscription must not keep its socket open. Live graphql-transport-ws clients answer pings.
+                    if not context.initialized and self.connection_init_timeout is not None:
+                        close_code = WS_4408_INIT_TIMEOUT
+                    break
+
                 if message["type"] == "websocket.receive":
                     await self.dispatch(context, message)
                 elif message["type"] == "websocket.disconnect":
+                    disconnected = True
                     close_code = int(message.get("code", status.WS_1000_NORMAL_CLOSURE))
                     # To fix shutdown server 1006 error.
                     if close_code == 1006:
                         close_code = status.WS_1000_NORMAL_CLOSURE
                     break
+        except CloseConnection as exc:
+            close_code = exc.code
         except Exception as exc:
             close_code = status.WS_1011_INTERNAL_ERROR
             raise exc from None
         finally:
+            if context.keep_alive_task:
+                context.keep_alive_task.cancel()
+            await self.unsubscribe_all(context)
+            if not disconnected:
+                await self.flush(context)
+            context.sender_task.cancel()
             await self.on_disconnect(context.socket, close_code)
 
-    async def unsubscribe(self, context: ConnectionContext, op_id: str) -> None:
-        if op_id not in context.operations:
+    async def flush(self, context: ConnectionContext) -> None:
+        """Give the sender `FLUSH_TIMEOUT` seconds to send the queued messages, like the error before a close."""
+        if context.sender_task.done() or context.outbox.empty():
             return
+        drained = asyncio.ensure_future(context.outbox.join())
+        await asyncio.wait(
+            [drained, context.sender_task], timeout=FLUSH_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+        )
+        drained.cancel()
+
+    def receive_timeout(self, context: ConnectionContext) -> Optional[float]:
+        if not context.initialized and self.connection_init_timeout is not None:
+            deadline = context.connected_at + self.connection_init_timeout
+            return max(deadline - asyncio.get_event_loop().time(), 0)
+        return self.idle_timeout
 
-        op = context.operations[op_id]
-        close_func = getattr(op, 'aclose')
-        if inspect.isfunction(close_func):
-            close_func()
-        elif inspect.iscoroutinefunction(close_func):
-            await close_func()
+    async def unsubscribe(self, context: ConnectionContext, op_id: str) -> None:
+        task = context.operations.pop(op_id, None)
+        if task is None or task is asyncio.current_task():
+            return
 
-        context.operations.pop(op_id)
+        task.cancel()
+        # asyncio.wait does not raise the task's CancelledError but still propagates our own cancellation.
+        await asyncio.wait([task])
 
     async def unsubscribe_all(self, context: ConnectionContext) -> None:
-        for op_id in context.operations:
+        for op_id in list(context.operations):
             await self.unsubscribe(context, op_id)
 
     async def dispatch(self, context: ConnectionContext, data: Message) -> None:
+        if context.protocol == GRAPHQL_TRANSPORT_WS:
+            await self.dispatch_transport_ws(context, data)
+            return
+
         message = await self.decode(context, data)
+        if message is None:
+            return
         op_id = message.id
         if message.type == MessageType.GQL_CONNECTION_INIT:
             await self.init(context, message)
         elif message.type == MessageType.GQL_CONNECTION_TERMINATE:
-            await context.socket.close(code=status.WS_1000_NORMAL_CLOSURE)
+            raise CloseConnection(status.WS_1000_NORMAL_CLOSURE)
         elif message.type == MessageType.GQL_START:
             try:
                 await self.start(context, message)
+            except CloseConnection:
+                raise
             except Exception as exc:
                 await self.send_error(context, op_id, {'message': str(exc)})
                 await self.unsubscribe(context, op_id)
@@ -104,10 +282,52 @@ class Subscription:
         else:
             await self.send_error(context, op_id, {'message': 'Invalid message type!'})
 
+    async def dispatch_transport_ws(self, context: ConnectionContext, data: Message) -> None:
+        try:
+            message = self.serializer.loads(self.message_text(data))
+            message_type = message['type']
+        except (ValueError, TypeError, KeyError):
+            raise CloseConnection(WS_4400_BAD_REQUEST) from None
+
+        op_id = message.get('id')
+        if message_type == 'connection_init':
+            if context.initialized:
+                raise CloseConnection(WS_4429_TOO_MANY_INIT_REQUESTS)
+            await self.init(
+                context, OperationMessage(type=MessageType.GQL_CONNECTION_INIT, payload=message.get('payload'))
+            )
+        elif message_type == 'ping':
+            await self.send_raw(context, {'type': 'pong'})
+        elif message_type == 'pong':
+            pass
+        elif message_type == 'subscribe':
+            if not context.initialized:
+                raise CloseConnection(WS_4401_UNAUTHORIZED)
+            if not isinstance(op_id, str) or not isinstance(message.get('payload'), dict):
+                raise CloseConnection(WS_4400_BAD_REQUEST)
+            if op_id in context.operations:
+                raise CloseConnection(WS_4409_SUBSCRIBER_EXISTS)
+            start = OperationMessage(
+                type=MessageType.GQL_START, id=op_id, payload=OperationMessagePayload.build(message['payload'])
+            )
+            try:
+                await self.start(context, start)
+            except CloseConnection:
+                raise
+            except Exception as exc:
+                await self.send_error(context, op_id, {'message': str(exc)})
+                await self.unsubscribe(context, op_id)
+        elif message_type == 'complete':
+            await self.unsubscribe(context, op_id)
+        else:
+            raise CloseConnection(WS_4400_BAD_REQUEST)
+
     async def init(self, context: ConnectionContext, message: OperationMessage) -> None:
         if self.authenticate:
             context.user = user = await self.authenticate(message.payload)
             if not user.is_authenticated:
+                if context.protocol == GRAPHQL_TRANSPORT_WS:
+                    raise CloseConnection(WS_4403_FORBIDDEN)
                 await self.send_error(
                     context,
                     message.id,
@@ -116,8 +336,37 @@ class Subscription:
                 )
                 return
 
+        context.initialized = True
+        # Binary frames are opt-in per connection, clients that can't take them keep getting text.
+        context.binary_frames = (
+            self.binary_frames and isinstance(message.payload, dict) and message.payload.get('binaryFrames') is True
+        )
         await self.send_message(context, MessageType.GQL_CONNECTION_ACK)
-        # TODO: to support keep_alive
+        if self.keep_alive and context.keep_alive_task is None:
+            await self.send_keep_alive(context)
+            context.keep_alive_task = asyncio.create_task(self.keep_alive_loop(context))
+
+    async def keep_alive_loop(self, context: ConnectionContext) -> None:
+        while True:
+            await asyncio.sleep(self.keep_alive_interval)
+            await self.send_keep_alive(context)
+
+    async def sender_loop(self, context: ConnectionContext) -> None:
+        try:
+            while True:
+                data = await context.outbox.get()
+                if context.binary_frames:
+                    await context.socket.send_bytes(data)
+                else:
+                    await context.socket.send_text(data.decode('utf-8'))
+                context.outbox.task_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is dead, release its operations without waiting for the disconnect message.
+            if context.keep_alive_task:
+                context.keep_alive_task.cancel()
+            await self.unsubscribe_all(context)
 
     async def start(self, context: ConnectionContext, message: OperationMessage) -> None:
         if context.user and not context.user.is_authenticated:
@@ -129,54 +378,320 @@ class Subscription:
         if op_id in context.operations:
             await self.unsubscribe(context, op_id)
 
+        if len(context.operations) >= self.max_operations:
+            message = f'Too many operations, the limit is {self.max_operations}.'
+            await self.send_error(context, op_id, {'message': message})
+            return
+
         payload = message.payload
-        try:
-            doc = parse(payload.query)
-        except Exception as exc:
-            if isinstance(exc, GraphQLError):
-                await self.send_execution_result(context, op_id, ExecutionResult(data=None, errors=[exc]))
+        cached = self.document_cache.get(self.schema, payload.query)
+        errors = cached.errors
+        if not errors and self.complexity_limit is not None:
+            error = self.complexity_limit.check(self.schema, cached.document, payload.operation_name, payload.variables)
+            errors = [error] if error is not None else None
+        if errors:
+            if context.protocol == GRAPHQL_TRANSPORT_WS:
+                await self.send_message(
+                    context, MessageType.GQL_ERROR, op_id=op_id, payload=[format_error(error) for error in errors]
+                )
             else:
-                await self.send_error(context, op_id, {'message': str(exc)})
+                await self.send_execution_result(context, op_id, ExecutionResult(data=None, errors=errors))
+            return
+
+        is_subscription = self.is_subscription(cached.document, payload.operation_name)
+        cost = 0
+        if self.admission is not None and self.admission.measures_cost:
+            cost = self.admission.cost(self.schema, cached.document, payload.operation_name, payload.variables)
+        if not is_subscription:
+            # Admission may wait for a slot, it happens in the operation's task so the socket keeps being read.
+            task = asyncio.create_task(self.run_operation(context, op_id, cached.document, payload, cost))
+            context.operations[op_id] = task
             return
 
-        result_or_iterator = await subscribe(
+        if self.admission is not None:
+            try:
+                # Subscriptions live as long as the client wants, they are charged but hold no slot: never wait.
+                await self.admission.admit(context.socket, cost, context.user, hold=False)
+            except AdmissionRejected as exc:
+                await self.send_error(context, op_id, self.admission_error(exc))
+                return
+
+        if self.share_subscriptions:
+            await self.start_shared(context, op_id, cached.document, payload)
+            return
+        result_or_iterator = await self.subscribe(context, cached.document, payload)
+        if isinstance(result_or_iterator, ExecutionResult):
+            result_or_iterator = create_async_iterator([result_or_iterator])()
+        context.operations[op_id] = asyncio.create_task(self.iterate_results(context, op_id, result_or_iterator))
+
+    async def run_operation(
+        self,
+        context: ConnectionContext,
+        op_id: str,
+        document: DocumentNode,
+        payload: OperationMessagePayload,
+        cost: int,
+    ) -> None:
+        """Admit a query or mutation, then run it and release its slot."""
+        client = None
+        if self.admission is not None:
+            try:
+                client = await self.admission.admit(context.socket, cost, context.user)
+            except AdmissionRejected as exc:
+                try:
+                    await self.send_error(context, op_id, self.admission_error(exc))
+                except CloseConnection:
+                    pass
+                if context.operations.get(op_id) is asyncio.current_task():
+                    context.operations.pop(op_id)
+                return
+        try:
+            await self.iterate_results(context, op_id, self.execute_operation(context, document, payload))
+        finally:
+            if self.admission is not None:
+                self.admission.release(client)
+
+    def admission_error(self, exc: AdmissionRejected) -> Dict[str, Any]:
+        return {'message': exc.message, 'extensions': {'code': exc.code, 'retryAfter': exc.retry_after}}
+
+    def is_subscription(self, document: DocumentNode, operation_name: Optional[str]) -> bool:
+        operation = get_operation_ast(document, operation_name)
+        return operation is not None and operation.operation == OperationType.SUBSCRIPTION
+
+    async def execute_operation(
+        self, context: ConnectionContext, document: DocumentNode, payload: OperationMessagePayload
+    ) -> AsyncIterator[ExecutionResult]:
+        """Run a query or mutation sent over the socket as a single result stream."""
+        result = execute(
             self.schema,
-            doc,
+            document,
             variable_values=payload.variables,
-            context_value=context,
             operation_name=payload.operation_name,
+            context_value=self.execution_context(context),
+            field_resolver=default_field_resolver,
+            middleware=self.middleware,
+            execution_context_class=ExecutionContext,
         )
-        if isinstance(result_or_iterator, ExecutionResult):
-            result_or_iterator = create_async_iterator([result_or_iterator])
-
-        context.operations[op_id] = result_or_iterator
+        if isawaitable(result):
+            result = await result
+        yield result
+
+    def execution_context(self, context: ConnectionContext) -> ConnectionContext:
+        """The context of one execution, with fresh loaders and `context_builder` values like every HTTP request."""
+        changes = {}  # type: Dict[str, Any]
+        if self.dataloaders:
+            changes['loaders'] = DataLoaderRegistry(self.dataloaders)
+        if self.context_builder is not None:
+            changes['values'] = self.context_builder()
+        return replace(context, **changes) if changes else context
+
+    async def subscribe(
+        self, context: ConnectionContext, document: DocumentNode, payload: OperationMessagePayload
+    ) -> Union[AsyncIterator[ExecutionResult], ExecutionResult]:
+        """graphql-core's `subscribe`, executing every event with its own `execution_context`."""
+        try:
+            result_or_stream = await create_source_event_stream(
+                self.schema,
+                document,
+                context_value=self.execution_context(context),
+                variable_values=payload.variables,
+                operation_name=payload.operation_name,
+            )
+        except GraphQLError as error:
+            return ExecutionResult(data=None, errors=[error])
+        if isinstance(result_or_stream, ExecutionResult):
+            return result_or_stream
+
+        async def map_source_to_response() -> AsyncIterator[ExecutionResult]:
+            # Unlike graphql-core's MapAsyncIterator, the source is iterated in the operation's own task, so
+            # cancelling the operation reaches the source and closing it runs its cleanup.
+            try:
+                async for event in result_or_stream:
+                    result = execute(
+                        self.schema,
+                        document,
+                        event,
+                        self.execution_context(context),
+                        payload.variables,
+                        payload.operation_name,
+                        middleware=self.middleware,
+                        execution_context_class=ExecutionContext,
+                    )
+                    yield await result if isawaitable(result) else result
+            finally:
+                aclose = getattr(result_or_stream, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+
+        return map_source_to_response()
+
+    async def start_shared(
+        self, context: ConnectionContext, op_id: str, document: DocumentNode, payload: OperationMessagePayload
+    ) -> None:
+        """Join (or create) the shared operation for this query, variables and `share_key(context)`.
+
+        The source iterator runs with the context of the first subscriber, so only share subscriptions whose
+        resolvers do not depend on the connection. Subscribers whose outbox is full are dropped with an error.
+        """
+        key = (
+            payload.query,
+            payload.operation_name,
+            json.dumps(payload.variables, sort_keys=True, default=str),
+            self.share_key(context) if self.share_key else None,
+        )
+        shared = self.shared_operations.get(key)
+        if shared is None:
+            result_or_iterator = await self.subscribe(context, document, payload)
+            if isinstance(result_or_iterator, ExecutionResult):
+                await self.send_execution_result(context, op_id, result_or_iterator)
+                await self.send_message(context, MessageType.GQL_COMPLETE, op_id=op_id)
+                return
 
-        async def iter_result():
-            async for result in result_or_iterator:
-                await self.send_execution_result(context, op_id, result)
+            shared = self.shared_operations[key] = SharedOperation(key)
+            shared.task = asyncio.create_task(self.broadcast_results(shared, result_or_iterator))
 
-            await self.send_message(context, MessageType.GQL_COMPLETE, op_id=op_id)
+        waiter = asyncio.get_event_loop().create_future()
+        shared.subscribers[(id(context), op_id)] = (context, op_id, waiter)
+        context.operations[op_id] = asyncio.create_task(self.follow_shared(context, op_id, shared, waiter))
 
-        asyncio.create_task(iter_result())
+    async def follow_shared(
+        self, context: ConnectionContext, op_id: str, shared: SharedOperation, waiter: asyncio.Future
+    ) -> None:
+        try:
+            if await waiter:
+                # Sent after the results already queued, once the client reads them.
+                await self.send_error(context, op_id, {'message': 'Too slow to read the results, dropped.'})
+        except CloseConnection:
+            pass
+        finally:
+            shared.subscribers.pop((id(context), op_id), None)
+            if not shared.subscribers and not shared.done:
+                shared.task.cancel()
+            if context.operations.get(op_id) is asyncio.current_task():
+                context.operations.pop(op_id)
 
-    async def send_execution_result(self, context: ConnectionContext, op_id: str, result: ExecutionResult) -> None:
-        payload = {
+    async def broadcast_results(self, shared: SharedOperation, iterator: AsyncIterator[ExecutionResult]) -> None:
+        try:
+            async for result in iterator:
+                payload = self.serializer.dumps(self.execution_result_payload(result))
+                self.broadcast(shared, MessageType.GQL_DATA, payload)
+            self.broadcast(shared, MessageType.GQL_COMPLETE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            error = {'message': str(exc)}
+            for subscriber, (context, op_id, _) in list(shared.subscribers.items()):
+                data = self.encode_message(context, MessageType.GQL_ERROR, op_id, self.error_payload(context, error))
+                self.offer(shared, subscriber, context, data)
+        finally:
+            if self.shared_operations.get(shared.key) is shared:
+                self.shared_operations.pop(shared.key)
+            shared.done = True
+            for _, _, waiter in shared.subscribers.values():
+                if not waiter.done():
+                    waiter.set_result(False)
+            aclose = getattr(iterator, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+
+    def broadcast(self, shared: SharedOperation, message_type: MessageType, payload: bytes = None) -> None:
+        for subscriber, (context, op_id, _) in list(shared.subscribers.items()):
+            self.offer(shared, subscriber, context, self.encode_frame(context, message_type, op_id, payload))
+
+    def offer(
+        self, shared: SharedOperation, subscriber: Tuple[int, str], context: ConnectionContext, data: bytes
+    ) -> None:
+        try:
+            context.outbox.put_nowait(data)
+        except asyncio.QueueFull:
+            _, _, waiter = shared.subscribers.pop(subscriber)
+            if not waiter.done():
+                waiter.set_result(True)
+
+    async def iterate_results(
+        self, context: ConnectionContext, op_id: str, iterator: AsyncIterator[ExecutionResult]
+    ) -> None:
+        try:
+            async for result in iterator:
+                await self.send_execution_result(context, op_id, result)
+            await self.send_message(context, MessageType.GQL_COMPLETE, op_id=op_id)
+        except asyncio.CancelledError:
+            raise
+        except CloseConnection:
+            # The socket is gone, the connection's reader closes it.
+            pass
+        except Exception as exc:
+            await self.send_error(context, op_id, {'message': str(exc)})
+        finally:
+            aclose = getattr(iterator, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            if context.operations.get(op_id) is asyncio.current_task():
+                context.operations.pop(op_id)
+
+    def execution_result_payload(self, result: ExecutionResult) -> Dict[str, Any]:
+        return {
             'data': result.data,
             'errors': [format_error(error) for error in result.errors] if result.errors else None,
         }
+
+    async def send_execution_result(self, context: ConnectionContext, op_id: str, result: ExecutionResult) -> None:
         await self.send_message(
-            context, MessageType.GQL_DATA, op_id=op_id, payload=payload,
+            context, MessageType.GQL_DATA, op_id=op_id, payload=self.execution_result_payload(result),
         )
 
     async def send_message(
-        self, context: ConnectionContext, message_type: MessageType, op_id: str = None, payload: dict = None,
+        self, context: ConnectionContext, message_type: MessageType, op_id: str = None, payload: Any = None,
     ) -> None:
-        data = {'type': message_type.value}
+        await self.send_frame(context, self.encode_message(context, message_type, op_id, payload))
+
+    async def send_raw(self, context: ConnectionContext, data: Dict[str, Any]) -> None:
+        await self.send_frame(context, self.serializer.dumps(data))
+
+    async def send_frame(self, context: ConnectionContext, data: bytes) -> None:
+        if context.sender_task is not None and context.sender_task.done():
+            # Nothing drains the outbox anymore, the socket is gone.
+            raise CloseConnection(status.WS_1011_INTERNAL_ERROR)
+        if asyncio.current_task() is not context.reader_task:
+            # Operations wait while the outbox is full, so a slow client slows down its own operations.
+            await context.outbox.put(data)
+            return
+        # The reader never waits: it must keep handling stop and terminate messages. A client that stopped reading
+        # its messages is disconnected instead.
+        try:
+            context.outbox.put_nowait(data)
+        except asyncio.QueueFull:
+            raise CloseConnection(status.WS_1008_POLICY_VIOLATION) from None
+
+    def message_type(self, context: ConnectionContext, message_type: MessageType) -> str:
+        if context.protocol == GRAPHQL_TRANSPORT_WS:
+            return TRANSPORT_WS_MESSAGE_TYPES[message_type]
+        return message_type.value
+
+    def encode_message(
+        self, context: ConnectionContext, message_type: MessageType, op_id: str = None, payload: Any = None
+    ) -> bytes:
+        data = {'type': self.message_type(context, message_type)}
         if op_id:
             data['id'] = op_id
         if payload:
             data['payload'] = payload
-        await context.socket.send_json(data)
+        return self.serializer.dumps(data)
+
+    def encode_frame(
+        self, context: ConnectionContext, message_type: MessageType, op_id: str, payload: bytes = None
+    ) -> bytes:
+        """Build a message around an already serialized payload."""
+        frame = b'{"type":%s,"id":%s' % (
+            self.serializer.dumps(self.message_type(context, message_type)),
+            self.serializer.dumps(op_id),
+        )
+        if payload is not None:
+            frame += b',"payload":' + payload
+        return frame + b'}'
+
+    def error_payload(self, context: ConnectionContext, error: Dict[str, Any]) -> Any:
+        return [error] if context.protocol == GRAPHQL_TRANSPORT_WS else error
 
     async def send_error(
         self,
@@ -186,18 +701,18 @@ class Subscription:
         error_type: MessageType = MessageType.GQL_ERROR,
     ):
         assert error_type in [MessageType.GQL_ERROR, MessageType.GQL_CONNECTION_ERROR]
-        await self.send_message(context, error_type, op_id, payload=playload)
+        await self.send_message(context, error_type, op_id, payload=self.error_payload(context, playload))
 
     async def send_keep_alive(self, context: ConnectionContext) -> None:
         await self.send_message(context, MessageType.GQL_CONNECTION_KEEP_ALIVE)
 
-    async def decode(self, context: ConnectionContext, message: Message) -> OperationMessage:
+    def message_text(self, message: Message) -> str:
         if message.get("text") is not None:
-            text = message["text"]
-        else:
-            text = message["bytes"].decode("utf-8")
+            return message["text"]
+        return message["bytes"].decode("utf-8")
 
+    async def decode(self, context: ConnectionContext, message: Message) -> OperationMessage:
         try:
-            return OperationMessage.build(json.loads(text))
-        except json.decoder.JSONDecodeError as exc:
+            return OperationMessage.build(self.serializer.loads(self.message_text(message)))
+        except ValueError as exc:
             await self.send_error(context, None, {'message': str(exc)}, MessageType.GQL_CONNECTION_ERROR)
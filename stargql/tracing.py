@@ -0,0 +1,118 @@
+import random
+import time
+import typing
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from gql import ExecutionContext
+from graphql import FieldNode, GraphQLField, GraphQLFieldResolver, GraphQLResolveInfo
+
+TraceExporter = typing.Callable[[typing.Dict[str, typing.Any]], None]
+
+current_tracer = ContextVar('current_tracer', default=None)  # type: ContextVar[typing.Optional[Tracer]]
+
+
+class Tracer:
+    """Collects phase and resolver timings of one operation in the Apollo tracing format."""
+
+    def __init__(self) -> None:
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.phases = {}  # type: typing.Dict[str, typing.Dict[str, int]]
+        self.resolvers = []  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    def now(self) -> int:
+        return time.perf_counter_ns() - self.start
+
+    @contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.phases[name] = {'startOffset': start, 'duration': self.now() - start}
+
+    def add_resolver(self, info: GraphQLResolveInfo, start: int) -> None:
+        self.resolvers.append(
+            {
+                'path': info.path.as_list(),
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': start,
+                'duration': self.now() - start,
+            }
+        )
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        duration = self.now()
+        end_time = datetime.now(timezone.utc)
+        execution = dict(self.phases.get('execution', {}), resolvers=self.resolvers)
+        return {
+            'version': 1,
+            'startTime': self.start_time.isoformat(),
+            'endTime': end_time.isoformat(),
+            'duration': duration,
+            'parsing': self.phases.get('parsing', {'startOffset': 0, 'duration': 0}),
+            'validation': self.phases.get('validation', {'startOffset': 0, 'duration': 0}),
+            'execution': execution,
+        }
+
+
+class Tracing:
+    """Opt-in tracing, `sample_rate` is the fraction of operations traced.
+
+    Traces are added to the response `extensions` when `include_in_response` is set and passed to each
+    exporter, exporters are called on the event loop and must not block.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        include_in_response: bool = True,
+        exporters: typing.List[TraceExporter] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.include_in_response = include_in_response
+        self.exporters = exporters or []
+
+    def start(self) -> typing.Optional[Tracer]:
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        return Tracer()
+
+    def finish(self, tracer: Tracer) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        trace = tracer.to_dict()
+        for exporter in self.exporters:
+            exporter(trace)
+        return {'tracing': trace} if self.include_in_response else None
+
+
+class TracingExecutionContext(ExecutionContext):
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.tracer = current_tracer.get()
+
+    def resolve_field_value_or_error(
+        self,
+        field_def: GraphQLField,
+        field_nodes: typing.List[FieldNode],
+        resolve_fn: GraphQLFieldResolver,
+        source: typing.Any,
+        info: GraphQLResolveInfo,
+    ) -> typing.Any:
+        tracer = self.tracer
+        start = tracer.now()
+        result = super().resolve_field_value_or_error(field_def, field_nodes, resolve_fn, source, info)
+        if not self.is_awaitable(result):
+            tracer.add_resolver(info, start)
+            return result
+
+        async def await_result() -> typing.Any:
+            try:
+                return await result
+            finally:
+                tracer.add_resolver(info, start)
+
+        return await_result()
@@ -0,0 +1,324 @@
+import asyncio
+import collections
+import tempfile
+import typing
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+try:
+    import multipart
+    from multipart.multipart import parse_options_header
+except ImportError:  # pragma: no cover
+    multipart = None
+    parse_options_header = None
+
+PART_BEGIN = 'part_begin'
+PART_DATA = 'part_data'
+PART_END = 'part_end'
+SPOOL_MAX_MEMORY = 1024 * 1024
+SPOOL_READ_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StreamingUpload:
+    """A file of a multipart request, consumed while the request body is still arriving.
+
+    `filename` and `content_type` are set once the part starts, after `await upload.open()` or the first read.
+    At most `max_buffered_chunks` are held in memory while the file is read. Files are sent in order: once a reader
+    waits for a later file, the rest of the one arriving is spooled to a temporary file instead.
+    """
+
+    def __init__(self, max_buffered_chunks: int = 16, notify: typing.Callable[[], None] = None) -> None:
+        self.filename = None  # type: typing.Optional[str]
+        self.content_type = None  # type: typing.Optional[str]
+        self.size = 0
+        self.max_buffered_chunks = max_buffered_chunks
+        self.notify = notify or (lambda: None)
+        self.opened = asyncio.Event()
+        self.awaited = False
+        self.fed = asyncio.Event()
+        self.chunks = collections.deque()  # type: typing.Deque[bytes]
+        self.spool = None  # type: typing.Optional[typing.IO[bytes]]
+        self.spool_lock = asyncio.Lock()
+        self.spool_io = None  # type: typing.Optional[asyncio.Future]
+        self.spool_read = self.spool_written = 0
+        self.buffer = b''
+        self.error = None  # type: typing.Optional[Exception]
+        self.ended = False
+        self.finished = False
+        self.discarded = False
+
+    async def open(self) -> 'StreamingUpload':
+        if not self.opened.is_set():
+            self.awaited = True
+            self.notify()
+            try:
+                await self.opened.wait()
+            finally:
+                self.awaited = False
+        if self.error is not None and self.filename is None:
+            raise self.error
+        return self
+
+    async def read(self, size: int = -1) -> bytes:
+        await self.open()
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            chunk = await self.next_chunk()
+            if chunk is None:
+                self.finished = True
+            else:
+                self.buffer += chunk
+        if self.finished and self.error is not None:
+            raise self.error
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        await self.open()
+        if self.buffer:
+            data, self.buffer = self.buffer, b''
+            yield data
+        while not self.finished:
+            chunk = await self.next_chunk()
+            if chunk is None:
+                self.finished = True
+            else:
+                yield chunk
+        if self.error is not None:
+            raise self.error
+
+    async def next_chunk(self) -> typing.Optional[bytes]:
+        # Buffered chunks were all fed before the spool started, read them first.
+        while True:
+            if self.chunks:
+                chunk = self.chunks.popleft()
+                self.notify()
+                return chunk
+            if self.spool is not None and self.spool_read < self.spool_written:
+                chunk = await self.run_spool_io(self.read_spool, self.spool_read)
+                self.spool_read += len(chunk)
+                return chunk
+            if self.ended:
+                return None
+            self.fed.clear()
+            await self.fed.wait()
+
+    def full(self) -> bool:
+        return self.spool is None and len(self.chunks) >= self.max_buffered_chunks
+
+    def start(self, filename: str, content_type: str) -> None:
+        self.filename = filename
+        self.content_type = content_type
+        self.opened.set()
+
+    def spill(self) -> None:
+        """Spool the rest of the file, the request reader no longer waits for it to be read."""
+        if self.spool is None:
+            self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+
+    async def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.discarded:
+            return
+        if self.spool is None:
+            self.chunks.append(chunk)
+        else:
+            await self.run_spool_io(self.write_spool, self.spool_written, chunk)
+            self.spool_written += len(chunk)
+        self.fed.set()
+
+    async def finish(self, error: Exception = None) -> None:
+        self.error = error
+        self.ended = True
+        self.opened.set()
+        self.fed.set()
+
+    def discard(self) -> None:
+        """Drop buffered and future data, unblocking the request reader."""
+        self.discarded = True
+        self.chunks.clear()
+        self.notify()
+
+    async def close(self) -> None:
+        self.discard()
+        if self.spool is not None:
+            await self.run_spool_io(self.spool.close)
+
+    async def run_spool_io(self, func: typing.Callable[..., typing.Any], *args: typing.Any) -> typing.Any:
+        # The reader and the request reader share the file: one call at a time, and a call still runs in its thread
+        # after the task awaiting it is cancelled, so the next one waits for it too.
+        async with self.spool_lock:
+            if self.spool_io is not None:
+                await asyncio.wait([self.spool_io])
+            self.spool_io = asyncio.ensure_future(run_in_threadpool(func, *args))
+            return await asyncio.shield(self.spool_io)
+
+    def read_spool(self, position: int) -> bytes:
+        assert self.spool is not None
+        self.spool.seek(position)
+        return self.spool.read(SPOOL_READ_SIZE)
+
+    def write_spool(self, position: int, chunk: bytes) -> None:
+        assert self.spool is not None
+        self.spool.seek(position)
+        self.spool.write(chunk)
+
+
+class MultipartUploads:
+    """Stream a GraphQL multipart request (https://github.com/jaydenseric/graphql-multipart-request-spec).
+
+    `operations` and `map` are read first, files are then fed to their `StreamingUpload` in the background
+    while the operation executes. `max_file_size` and `max_size` (whole body) are checked as bytes arrive.
+    """
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: typing.AsyncIterator[bytes],
+        max_file_size: int = None,
+        max_size: int = None,
+        max_buffered_chunks: int = 16,
+    ) -> None:
+        assert multipart is not None, 'python-multipart must be installed to use streaming uploads'
+        _, params = parse_options_header(headers['Content-Type'])
+        charset = params.get(b'charset', 'utf-8')
+        self.charset = charset.decode('latin-1') if isinstance(charset, bytes) else charset
+        self.stream = stream
+        self.max_file_size = max_file_size
+        self.max_size = max_size
+        self.max_buffered_chunks = max_buffered_chunks
+        self.size = 0
+        self.messages = []  # type: typing.List[typing.Tuple[str, typing.Any]]
+        self.header_field = b''
+        self.header_value = b''
+        self.headers = {}  # type: typing.Dict[bytes, bytes]
+        self.parser = multipart.MultipartParser(
+            params.get(b'boundary'),
+            {
+                'on_part_begin': self.on_part_begin,
+                'on_part_data': self.on_part_data,
+                'on_part_end': self.on_part_end,
+                'on_header_field': self.on_header_field,
+                'on_header_value': self.on_header_value,
+                'on_header_end': self.on_header_end,
+                'on_headers_finished': self.on_headers_finished,
+            },
+        )
+        self.events = self.parse()
+        self.uploads = {}  # type: typing.Dict[str, StreamingUpload]
+        self.changed = asyncio.Event()
+        self.task = None  # type: typing.Optional[asyncio.Task[None]]
+
+    def on_part_begin(self) -> None:
+        self.headers = {}
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self.messages.append((PART_DATA, data[start:end]))
+
+    def on_part_end(self) -> None:
+        self.messages.append((PART_END, None))
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b''
+        self.header_value = b''
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self.headers.get(b'content-disposition', b''))
+        name = options.get(b'name', b'').decode(self.charset)
+        filename = options[b'filename'].decode(self.charset) if b'filename' in options else None
+        content_type = self.headers.get(b'content-type', b'').decode('latin-1')
+        self.messages.append((PART_BEGIN, (name, filename, content_type)))
+
+    async def parse(self) -> typing.AsyncIterator[typing.Tuple[str, typing.Any]]:
+        async for chunk in self.stream:
+            self.size += len(chunk)
+            if self.max_size is not None and self.size > self.max_size:
+                raise UploadTooLarge(f'Request body exceeds the limit of {self.max_size} bytes')
+            self.parser.write(chunk)
+            messages, self.messages = self.messages, []
+            for message in messages:
+                yield message
+        self.parser.finalize()
+
+    async def read_operations(self) -> typing.Tuple[str, str]:
+        fields = {}  # type: typing.Dict[str, str]
+        name, data = None, b''
+        async for event, value in self.events:
+            if event == PART_BEGIN:
+                name, filename, _ = value
+                if filename is not None:
+                    raise ValueError('operations and map must be sent before files')
+                data = b''
+            elif event == PART_DATA:
+                data += value
+            else:
+                fields[name] = data.decode(self.charset)
+                if 'operations' in fields and 'map' in fields:
+                    return fields['operations'], fields['map']
+        raise ValueError('operations or map not found')
+
+    def start(self, keys: typing.Iterable[str]) -> typing.Dict[str, StreamingUpload]:
+        self.uploads = {key: StreamingUpload(self.max_buffered_chunks, self.changed.set) for key in keys}
+        self.task = asyncio.ensure_future(self.feed())
+        return self.uploads
+
+    async def feed(self) -> None:
+        pending = dict(self.uploads)
+        upload = None  # type: typing.Optional[StreamingUpload]
+        try:
+            async for event, value in self.events:
+                if event == PART_BEGIN:
+                    name, filename, content_type = value
+                    upload = pending.pop(name, None)
+                    if upload is not None:
+                        upload.start(filename, content_type)
+                elif upload is None:
+                    continue
+                elif event == PART_DATA:
+                    if self.max_file_size is not None and upload.size + len(value) > self.max_file_size:
+                        raise UploadTooLarge(f'File {upload.filename} exceeds the limit of {self.max_file_size} bytes')
+                    await self.wait_for_room(upload)
+                    await upload.feed(value)
+                else:
+                    await upload.finish()
+                    upload = None
+        except Exception as exc:
+            if upload is not None:
+                await upload.finish(exc)
+            for missing in pending.values():
+                await missing.finish(exc)
+            return
+        for missing in pending.values():
+            await missing.finish(ValueError('File is missing in the request'))
+
+    async def wait_for_room(self, upload: StreamingUpload) -> None:
+        # A reader waiting for a later file would wait forever if this one is never read: spool it instead.
+        while upload.full():
+            if any(other.awaited for other in self.uploads.values()):
+                upload.spill()
+                return
+            self.changed.clear()
+            await self.changed.wait()
+
+    async def close(self) -> None:
+        """Stop reading the request once the operation is done, unread file data is dropped."""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.wait([self.task])
+        for upload in self.uploads.values():
+            await upload.close()
+        await self.events.aclose()
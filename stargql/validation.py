@@ -0,0 +1,288 @@
+import typing
+
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLInterfaceType,
+    GraphQLNamedType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    TypeInfo,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_list_type,
+)
+from graphql.validation import ValidationContext, ValidationRule
+
+LIST_SIZE_ARGUMENTS = ('first', 'last', 'limit')
+
+
+class ComplexityExceeded(Exception):
+    pass
+
+
+class Measurement:
+    """State of one `QueryCost.measure`: the running cost and the fragments measured so far."""
+
+    def __init__(
+        self,
+        context: ValidationContext,
+        variable_values: typing.Dict[str, typing.Any],
+        max_cost: typing.Optional[int] = None,
+    ) -> None:
+        self.context = context
+        self.variable_values = variable_values
+        self.max_cost = max_cost
+        self.total = 0
+        self.fragments = {}  # type: typing.Dict[typing.Tuple[str, str], typing.Tuple[int, int]]
+
+    def charge(self, cost: int) -> None:
+        self.total += cost
+        if self.max_cost is not None and self.total > self.max_cost:
+            raise ComplexityExceeded
+
+
+class QueryCost:
+    """Estimate depth and complexity of an operation without executing it.
+
+    Every field costs `field_costs['Type.field']` (or `default_cost`) plus the cost of its selection,
+    which is multiplied by the list size given in `first`/`last`/`limit` arguments. A list size bound
+    to a variable uses the request's value when `variables` are given, else the variable default value
+    or `default_list_size`. Introspection fields are free.
+    """
+
+    def __init__(
+        self,
+        field_costs: typing.Dict[str, int] = None,
+        default_cost: int = 1,
+        default_list_size: int = 10,
+        list_size_arguments: typing.Sequence[str] = LIST_SIZE_ARGUMENTS,
+    ) -> None:
+        self.field_costs = field_costs or {}
+        self.default_cost = default_cost
+        self.default_list_size = default_list_size
+        self.list_size_arguments = list_size_arguments
+
+    def measure(
+        self,
+        context: ValidationContext,
+        operation: OperationDefinitionNode,
+        variables: typing.Dict[str, typing.Any] = None,
+        max_cost: int = None,
+    ) -> typing.Tuple[int, int]:
+        """Depth and cost of `operation`.
+
+        With `max_cost`, measuring stops as soon as the cost exceeds it: the cost returned is then only known to be
+        over `max_cost` and the depth is 0.
+        """
+        root_type = {
+            'query': context.schema.query_type,
+            'mutation': context.schema.mutation_type,
+            'subscription': context.schema.subscription_type,
+        }[operation.operation.value]
+        variable_values = {
+            definition.variable.name.value: definition.default_value
+            for definition in operation.variable_definitions or []
+        }  # type: typing.Dict[str, typing.Any]
+        if variables:
+            variable_values.update((name, variables[name]) for name in list(variable_values) if name in variables)
+        measurement = Measurement(context, variable_values, max_cost)
+        try:
+            return self.measure_selection_set(measurement, root_type, operation.selection_set, (), 1)
+        except ComplexityExceeded:
+            return 0, measurement.total
+
+    def measure_document(
+        self,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        operation: OperationDefinitionNode,
+        variables: typing.Dict[str, typing.Any] = None,
+        max_cost: int = None,
+    ) -> typing.Tuple[int, int]:
+        """`measure` outside of validation."""
+        context = ValidationContext(schema, document, TypeInfo(schema), lambda error: None)
+        return self.measure(context, operation, variables, max_cost)
+
+    def measure_selection_set(
+        self,
+        measurement: Measurement,
+        parent_type: typing.Optional[GraphQLNamedType],
+        selection_set: SelectionSetNode,
+        fragments: typing.Tuple[str, ...],
+        multiplier: int,
+    ) -> typing.Tuple[int, int]:
+        # `fragments` are the ones spread on the path to this selection set, only used to break cycles. `multiplier`
+        # is the product of the list sizes above it, what each of its fields adds to the cost of the operation.
+        depth = cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                sub_depth, sub_cost = self.measure_field(measurement, parent_type, selection, fragments, multiplier)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = measurement.context.get_fragment(name)
+                if not fragment or name in fragments:
+                    continue
+                fragment_type = self.fragment_type(measurement.context, fragment, parent_type)
+                key = (name, fragment_type.name if fragment_type else '')
+                measured = measurement.fragments.get(key)
+                if measured is None:
+                    measured = measurement.fragments[key] = self.measure_selection_set(
+                        measurement, fragment_type, fragment.selection_set, fragments + (name,), multiplier
+                    )
+                else:
+                    measurement.charge(measured[1] * multiplier)
+                sub_depth, sub_cost = measured
+            elif isinstance(selection, InlineFragmentNode):
+                sub_depth, sub_cost = self.measure_selection_set(
+                    measurement,
+                    self.fragment_type(measurement.context, selection, parent_type),
+                    selection.selection_set,
+                    fragments,
+                    multiplier,
+                )
+            else:
+                continue
+            depth = max(depth, sub_depth)
+            cost += sub_cost
+        return depth, cost
+
+    def fragment_type(
+        self,
+        context: ValidationContext,
+        fragment: typing.Union[FragmentDefinitionNode, InlineFragmentNode],
+        parent_type: typing.Optional[GraphQLNamedType],
+    ) -> typing.Optional[GraphQLNamedType]:
+        if fragment.type_condition:
+            return context.schema.get_type(fragment.type_condition.name.value)
+        return parent_type
+
+    def measure_field(
+        self,
+        measurement: Measurement,
+        parent_type: typing.Optional[GraphQLNamedType],
+        node: FieldNode,
+        fragments: typing.Tuple[str, ...],
+        multiplier: int,
+    ) -> typing.Tuple[int, int]:
+        name = node.name.value
+        if name.startswith('__'):
+            return 0, 0
+
+        field_def = None
+        if isinstance(parent_type, (GraphQLObjectType, GraphQLInterfaceType)):
+            field_def = parent_type.fields.get(name)
+        type_name = parent_type.name if parent_type else ''
+        cost = self.field_costs.get(f'{type_name}.{name}', self.default_cost)
+        measurement.charge(cost * multiplier)
+        if not node.selection_set:
+            return 1, cost
+
+        field_type = get_named_type(field_def.type) if field_def else None
+        size = 1
+        if field_def and is_list_type(get_nullable_type(field_def.type)):
+            size = self.list_size(node, measurement.variable_values)
+        sub_depth, sub_cost = self.measure_selection_set(
+            measurement, field_type, node.selection_set, fragments, multiplier * size
+        )
+        return sub_depth + 1, cost + sub_cost * size
+
+    def list_size(self, node: FieldNode, variable_values: typing.Dict[str, typing.Any]) -> int:
+        for argument in node.arguments or []:
+            if argument.name.value not in self.list_size_arguments:
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                value = variable_values.get(value.name.value)
+                if isinstance(value, int) and not isinstance(value, bool):
+                    return max(value, 0)
+                if not isinstance(value, IntValueNode):
+                    return self.default_list_size
+            if isinstance(value, IntValueNode):
+                return max(int(value.value), 0)
+        return 1
+
+
+def query_limits_rule(
+    max_depth: int = None, max_complexity: int = None, query_cost: QueryCost = None
+) -> typing.Type[ValidationRule]:
+    """Depth and complexity limits, both checked from one measurement of each operation."""
+    query_cost = query_cost or QueryCost()
+
+    class QueryLimitsRule(ValidationRule):
+        def enter_operation_definition(self, node: OperationDefinitionNode, *_args: typing.Any) -> None:
+            depth, complexity = query_cost.measure(self.context, node, max_cost=max_complexity)
+            if max_depth is not None and depth > max_depth:
+                self.report_error(
+                    GraphQLError(f'Query depth {depth} exceeds the maximum allowed depth of {max_depth}.', node)
+                )
+            if max_complexity is not None and complexity > max_complexity:
+                self.report_error(complexity_error(complexity, max_complexity, node))
+
+    return QueryLimitsRule
+
+
+def depth_limit_rule(max_depth: int, query_cost: QueryCost = None) -> typing.Type[ValidationRule]:
+    return query_limits_rule(max_depth=max_depth, query_cost=query_cost)
+
+
+def max_aliases_rule(max_aliases: int) -> typing.Type[ValidationRule]:
+    class MaxAliasesRule(ValidationRule):
+        aliases = 0
+
+        def enter_field(self, node: FieldNode, *_args: typing.Any) -> None:
+            if not node.alias:
+                return
+            self.aliases += 1
+            if self.aliases == max_aliases + 1:
+                self.report_error(GraphQLError(f'Document exceeds the maximum of {max_aliases} aliases.', node))
+
+    return MaxAliasesRule
+
+
+def complexity_error(complexity: int, max_complexity: int, node: OperationDefinitionNode) -> GraphQLError:
+    return GraphQLError(
+        f'Query complexity {complexity} exceeds the maximum allowed complexity of {max_complexity}.', node
+    )
+
+
+def complexity_limit_rule(max_complexity: int, query_cost: QueryCost = None) -> typing.Type[ValidationRule]:
+    return query_limits_rule(max_complexity=max_complexity, query_cost=query_cost)
+
+
+class ComplexityLimit:
+    """Check the complexity of an operation with the variables of a request, before executing it.
+
+    Validation results are cached per document, so list sizes bound to variables are only measured with their
+    defaults there. Requests which send variables are measured again with their values.
+    """
+
+    def __init__(self, max_complexity: int, query_cost: QueryCost = None) -> None:
+        self.max_complexity = max_complexity
+        self.query_cost = query_cost or QueryCost()
+
+    def check(
+        self,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        operation_name: typing.Optional[str],
+        variables: typing.Optional[typing.Dict[str, typing.Any]],
+    ) -> typing.Optional[GraphQLError]:
+        if not variables or not isinstance(variables, dict):
+            return None
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or not operation.variable_definitions:
+            return None
+        _, complexity = self.query_cost.measure_document(schema, document, operation, variables, self.max_complexity)
+        if complexity > self.max_complexity:
+            return complexity_error(complexity, self.max_complexity, operation)
+        return None
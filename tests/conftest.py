@@ -0,0 +1,20 @@
+import pytest
+from gql import resolver
+
+from stargql import federation
+
+
+@pytest.fixture(autouse=True)
+def clear_resolvers():
+    # gql registers resolvers globally, every test builds its schema from a clean slate.
+    maps = (
+        resolver.field_resolver_map,
+        resolver.reference_resolver_map,
+        resolver.type_resolver_map,
+        federation.batch_reference_resolver_map,
+    )
+    for resolver_map in maps:
+        resolver_map.clear()
+    yield
+    for resolver_map in maps:
+        resolver_map.clear()
@@ -0,0 +1,31 @@
+from starlette.authentication import SimpleUser
+from starlette.requests import HTTPConnection
+
+from stargql.admission import default_client_key
+
+
+class User(SimpleUser):
+    def __init__(self, identity, username):
+        super().__init__(username)
+        self._identity = identity
+
+    @property
+    def identity(self):
+        return self._identity
+
+
+def connection(user=None):
+    scope = {'type': 'http', 'headers': [], 'client': ('10.0.0.1', 1234)}
+    if user is not None:
+        scope['user'] = user
+    return HTTPConnection(scope)
+
+
+def test_client_key_uses_user_identity():
+    assert default_client_key(connection(User('1', 'Alex'))) == ('user', '1')
+    assert default_client_key(connection(), User('2', 'Alex')) == ('user', '2')
+
+
+def test_client_key_without_identity_uses_address():
+    assert default_client_key(connection(SimpleUser('Alex'))) == ('address', '10.0.0.1')
+    assert default_client_key(connection()) == ('address', '10.0.0.1')
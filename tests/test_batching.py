@@ -0,0 +1,53 @@
+import pytest
+from gql import gql, query
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+
+type_defs = gql(
+    '''
+type Query {
+    visit(name: String!): [String!]!
+}
+'''
+)
+
+
+def create_app(**kwargs):
+    @query
+    def visit(_, info, name):
+        info.context.setdefault('visited', []).append(name)
+        return info.context['visited']
+
+    return GraphQL(type_defs=type_defs, context_builder=dict, **kwargs)
+
+
+def test_batch_results_keep_order():
+    client = TestClient(create_app())
+    response = client.post('/', json=[{'query': '{ visit(name: "a") }'}, {'query': '{ visit(name: "b") }'}])
+    assert response.json() == [
+        {'data': {'visit': ['a']}, 'errors': None},
+        {'data': {'visit': ['b']}, 'errors': None},
+    ]
+
+
+def test_batch_operations_get_their_own_context():
+    client = TestClient(create_app(batch_concurrency=1))
+    batch = [{'query': f'{{ visit(name: "{name}") }}'} for name in 'abc']
+    assert [result['data']['visit'] for result in client.post('/', json=batch).json()] == [['a'], ['b'], ['c']]
+
+
+def test_batch_size_limit():
+    client = TestClient(create_app(batch_max_size=2))
+    response = client.post('/', json=[{'query': '{ visit(name: "a") }'}] * 3)
+    assert response.status_code == 400
+
+
+def test_batching_disabled():
+    client = TestClient(create_app(batch_max_size=0))
+    assert client.post('/', json=[{'query': '{ visit(name: "a") }'}]).status_code == 400
+
+
+def test_batch_concurrency_must_be_positive():
+    with pytest.raises(AssertionError):
+        create_app(batch_concurrency=0)
@@ -0,0 +1,84 @@
+import time
+
+from gql import gql, query
+from graphql import build_schema, parse
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.cache import CachedDocument
+from stargql.cache_control import CACHE_CONTROL_TYPE_DEFS, PRIVATE, PUBLIC, CacheControl, CacheHint
+
+type_defs = (
+    CACHE_CONTROL_TYPE_DEFS
+    + '''
+type User @cacheControl(maxAge: 60) {
+    id: ID!
+    email: String @cacheControl(scope: PRIVATE)
+    friends: [User!]! @cacheControl(maxAge: 30)
+}
+
+type Query {
+    me: User
+}
+'''
+)
+
+schema = build_schema(type_defs)
+
+
+def policy(source, cache_control=None):
+    return (cache_control or CacheControl()).policy(schema, parse(source))
+
+
+def chained_fragments(count):
+    fragments = [
+        f'fragment F{i} on User {{ id friends {{ ...F{i + 1} }} all: friends {{ ...F{i + 1} }} }}' for i in range(count)
+    ]
+    fragments.append(f'fragment F{count} on User {{ email }}')
+    return '{ me { ...F0 } } ' + ' '.join(fragments)
+
+
+def test_policy_follows_fragments():
+    assert (policy('{ me { id } }').max_age, policy('{ me { id } }').scope) == (60, PUBLIC)
+    spread = policy('{ me { ...U } } fragment U on User { email friends { id } }')
+    inline = policy('{ me { ... on User { email friends { id } } } }')
+    assert (spread.max_age, spread.scope) == (inline.max_age, inline.scope) == (30, PRIVATE)
+
+
+def test_fragment_spread_in_sibling_subtrees():
+    hints = {'User.id': CacheHint(max_age=5)}
+    result = policy('{ me { ...U friends { ...U } } } fragment U on User { id }', CacheControl(hints))
+    assert result.max_age == 5
+
+
+def test_fragment_cycles_terminate():
+    result = policy('{ me { ...A } } fragment A on User { id ...B } fragment B on User { email ...A }')
+    assert (result.max_age, result.scope) == (60, PRIVATE)
+
+
+def test_repeated_fragments_are_walked_once():
+    started = time.perf_counter()
+    result = policy(chained_fragments(25))
+    assert time.perf_counter() - started < 1
+    assert (result.max_age, result.scope) == (30, PRIVATE)
+
+
+def test_document_policy_is_computed_once():
+    cache_control = CacheControl()
+    cached = CachedDocument(parse('query A { me { id } } query B { me { friends { id } } }'))
+    assert cache_control.document_policy(schema, cached, 'A').max_age == 60
+    assert cache_control.document_policy(schema, cached, 'B').max_age == 30
+    assert cache_control.document_policy(schema, cached, 'A') is cache_control.document_policy(schema, cached, 'A')
+
+
+def test_cache_control_header():
+    @query
+    def me(_, info):
+        return {'id': '1', 'email': 'me@example.com', 'friends': []}
+
+    client = TestClient(GraphQL(type_defs=gql(type_defs), cache_control=CacheControl()))
+    for _ in range(2):
+        response = client.get('/', params={'query': '{ me { id friends { id } } }'})
+        assert response.headers['Cache-Control'] == 'max-age=30, public'
+    response = client.get('/', params={'query': '{ me { email } }'})
+    assert response.headers['Cache-Control'] == 'max-age=60, private'
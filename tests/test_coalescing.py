@@ -0,0 +1,39 @@
+from starlette.authentication import SimpleUser
+from starlette.requests import Request
+
+from stargql.coalescing import default_session_id
+
+
+class User(SimpleUser):
+    def __init__(self, identity, username):
+        super().__init__(username)
+        self._identity = identity
+
+    @property
+    def identity(self):
+        return self._identity
+
+
+def request(user=None, headers=()):
+    scope = {'type': 'http', 'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    if user is not None:
+        scope['user'] = user
+    return Request(scope)
+
+
+def test_session_id_uses_user_identity():
+    assert default_session_id(request(User('1', 'Alex'))) == ('user', '1')
+    assert default_session_id(request(User('1', 'Alex'))) != default_session_id(request(User('2', 'Alex')))
+
+
+def test_session_id_without_identity_uses_credentials():
+    alex = request(SimpleUser('Alex'), [('Authorization', 'Bearer a')])
+    other_alex = request(SimpleUser('Alex'), [('Authorization', 'Bearer b')])
+    assert default_session_id(alex) == ('credentials', 'Bearer a', None)
+    assert default_session_id(alex) != default_session_id(other_alex)
+    assert default_session_id(request(SimpleUser('Alex'))) is None
+
+
+def test_anonymous_session_id():
+    assert default_session_id(request()) is None
+    assert default_session_id(request(headers=[('Cookie', 'session=1')])) == ('credentials', None, 'session=1')
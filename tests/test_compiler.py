@@ -0,0 +1,192 @@
+import asyncio
+import enum
+
+import pytest
+from gql import enum_type, field_resolver, gql, query, scalar_type, type_resolver
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+
+type_defs = gql(
+    '''
+scalar Money
+
+enum Color {
+    RED
+    GREEN
+}
+
+interface Node {
+    id: ID!
+}
+
+type Product implements Node {
+    id: ID!
+    name: String!
+    color: Color!
+    price: Money!
+    related(first: Int = 2): [Product!]!
+    tags(filter: TagFilter): [String!]!
+    broken: String
+    brokenRequired: String!
+    slowName: String!
+}
+
+type User implements Node {
+    id: ID!
+    name: String!
+}
+
+union SearchResult = Product | User
+
+input TagFilter {
+    prefix: String
+    exclude: [String!]
+}
+
+type Filter {
+    prefix: String
+    exclude: [String!]
+}
+
+type Query {
+    products(first: Int!): [Product!]!
+    node(id: ID!): Node
+    search(text: String!): [SearchResult!]!
+    echo(filter: TagFilter!): Filter
+    total: Int
+}
+'''
+)
+
+
+class Color(enum.Enum):
+    RED = 'red'
+    GREEN = 'green'
+
+
+def product(index):
+    return {
+        'id': str(index),
+        'name': f'Product {index}',
+        'color': Color.RED if index % 2 else Color.GREEN,
+        'price': index * 150,
+        'tag_list': ['a', 'ab', 'b'],
+    }
+
+
+def uppercase_middleware(next_, root, info, **args):
+    result = next_(root, info, **args)
+    return result.upper() if isinstance(result, str) and info.field_name == 'name' else result
+
+
+@pytest.fixture
+def clients():
+    @query
+    def products(_, info, first):
+        return [product(index) for index in range(first)]
+
+    @query
+    def node(_, info, id):
+        return product(int(id)) if id.isdigit() else {'id': id, 'name': 'user', '__typename': 'User'}
+
+    @query
+    async def search(_, info, text):
+        return [product(1), {'id': 'u1', 'name': text, '__typename': 'User'}]
+
+    @query
+    def echo(_, info, filter):
+        # Arguments are reused across requests by compiled plans, mutating them must not leak.
+        filter.setdefault('exclude', []).append('x')
+        return filter
+
+    @query
+    def total(_, info):
+        return None
+
+    @field_resolver('Product', 'related')
+    def related(parent, info, first):
+        return [product(int(parent['id']) + index + 1) for index in range(first)]
+
+    @field_resolver('Product', 'tags')
+    def tags(parent, info, filter=None):
+        values = parent['tag_list']
+        if filter and filter.get('prefix'):
+            values = [value for value in values if value.startswith(filter['prefix'])]
+        if filter and filter.get('exclude'):
+            values = [value for value in values if value not in filter['exclude']]
+        return values
+
+    @field_resolver('Product', 'broken')
+    def broken(parent, info):
+        raise ValueError(f'broken {parent["id"]}')
+
+    @field_resolver('Product', 'broken_required')
+    def broken_required(parent, info):
+        return None
+
+    @field_resolver('Product', 'slow_name')
+    async def slow_name(parent, info):
+        await asyncio.sleep(0)
+        return parent['name']
+
+    @type_resolver('Node')
+    @type_resolver('SearchResult')
+    def resolve_type(obj, info, type_):
+        return obj.get('__typename', 'Product')
+
+    @scalar_type('Money')
+    class Money:
+        @staticmethod
+        def serialize(value):
+            return f'{value / 100:.2f}'
+
+        @staticmethod
+        def parse_value(value):
+            return int(float(value) * 100)
+
+        @staticmethod
+        def parse_literal(node, *_):
+            return int(float(node.value) * 100)
+
+    enum_type('Color')(Color)
+
+    def create(compiled):
+        middleware = {'Product': [uppercase_middleware]}
+        app = GraphQL(type_defs=type_defs, compiled_execution=compiled, graphql_middleware=middleware)
+        return TestClient(app)
+
+    return create(False), create(True)
+
+
+def run(client, query_, variables=None):
+    return client.post('/', json={'query': query_, 'variables': variables}).json()
+
+
+QUERIES = [
+    ('{ products(first: 3) { id name color price } }', None),
+    ('{ products(first: 2) { id related { id name related(first: 1) { id color } } } }', None),
+    ('query ($n: Int!) { products(first: $n) { a: id b: name id } }', {'n': 3}),
+    ('{ products(first: 2) { ...Fields ... on Product { price } } } fragment Fields on Product { id name }', None),
+    ('{ node(id: "1") { id ... on Product { name color } } n: node(id: "u") { id ... on User { name } } }', None),
+    ('{ search(text: "ann") { __typename ... on Product { id slowName } ... on User { id name } } }', None),
+    ('{ products(first: 2) { id tags(filter: {prefix: "a", exclude: ["ab"]}) } }', None),
+    ('query ($f: TagFilter) { products(first: 1) { tags(filter: $f) } }', {'f': {'prefix': 'b'}}),
+    ('query ($f: TagFilter!) { echo(filter: $f) { prefix exclude } }', {'f': {'prefix': 'p'}}),
+    ('{ echo(filter: {prefix: "p"}) { prefix exclude } }', None),
+    ('{ products(first: 2) { id broken } }', None),
+    ('{ products(first: 2) { id brokenRequired } total }', None),
+    ('query ($skip: Boolean!) { products(first: 2) { id name @skip(if: $skip) } }', {'skip': True}),
+    ('{ products(first: 2) { id name @include(if: false) color @skip(if: false) } }', None),
+    ('{ __typename products(first: 1) { __typename id } }', None),
+]
+
+
+@pytest.mark.parametrize('query_, variables', QUERIES)
+def test_compiled_execution_matches_the_interpreter(clients, query_, variables):
+    interpreted, compiled = clients
+    expected = run(interpreted, query_, variables)
+    # The second request runs with the cached plan.
+    assert run(compiled, query_, variables) == expected
+    assert run(compiled, query_, variables) == expected
+    assert run(interpreted, query_, variables) == expected
@@ -0,0 +1,136 @@
+from gql import gql, reference_resolver
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.federation import batch_reference_resolver
+
+type_defs = gql(
+    '''
+type Query {
+    hello: String
+}
+
+type Product @key(fields: "upc") {
+    upc: String!
+    name: String
+}
+
+type User @key(fields: "id") {
+    id: ID!
+    name: String
+}
+
+type Review @key(fields: "id") {
+    id: ID!
+    body: String
+}
+
+type Store @key(fields: "id") {
+    id: ID!
+    name: String
+}
+'''
+)
+
+ENTITIES = '''
+query ($representations: [_Any!]!) {
+    _entities(representations: $representations) {
+        ... on Product { upc name }
+        ... on User { id name }
+        ... on Review { id body }
+        ... on Store { id name }
+    }
+}
+'''
+
+
+def create_client():
+    @batch_reference_resolver('Product')
+    async def products(info, representations):
+        upcs = [representation['upc'] for representation in representations]
+        if 'boom' in upcs:
+            raise ValueError('products unavailable')
+        return [
+            ValueError(f'product {upc} is broken') if upc == 'broken' else {'upc': upc, 'name': f'product {upc}'}
+            for upc in upcs
+        ]
+
+    @batch_reference_resolver('Store', key='id')
+    def stores(info, representations):
+        ids = [representation['id'] for representation in representations if representation['id'] != 'missing']
+        return [{'id': id_, 'name': f'store {id_}'} for id_ in reversed(ids)]
+
+    @reference_resolver('User')
+    async def user(_, info, representation):
+        if representation['id'] == '2':
+            raise ValueError('user 2 is broken')
+        return {'id': representation['id'], 'name': f'user {representation["id"]}'}
+
+    @reference_resolver('Review')
+    def review(_, info, representation):
+        if representation['id'] == '2':
+            raise ValueError('review 2 is broken')
+        return {'id': representation['id'], 'body': f'review {representation["id"]}'}
+
+    return TestClient(GraphQL(type_defs=type_defs, federation=True))
+
+
+def entities(client, representations):
+    response = client.post('/', json={'query': ENTITIES, 'variables': {'representations': representations}})
+    result = response.json()
+    errors = {tuple(error['path']): error['message'] for error in result['errors'] or []}
+    return result['data']['_entities'], errors
+
+
+def test_batched_entities_are_matched_by_key():
+    entities_, errors = entities(
+        create_client(),
+        [{'__typename': 'Store', 'id': id_} for id_ in ('1', 'missing', '2')],
+    )
+    assert entities_ == [{'id': '1', 'name': 'store 1'}, None, {'id': '2', 'name': 'store 2'}]
+    assert errors == {}
+
+
+def test_errors_only_null_their_entity():
+    entities_, errors = entities(
+        create_client(),
+        [
+            {'__typename': 'User', 'id': '1'},
+            {'__typename': 'User', 'id': '2'},
+            {'__typename': 'Review', 'id': '1'},
+            {'__typename': 'Review', 'id': '2'},
+            {'__typename': 'Product', 'upc': 'broken'},
+            {'__typename': 'Product', 'upc': '1'},
+        ],
+    )
+    assert entities_ == [
+        {'id': '1', 'name': 'user 1'},
+        None,
+        {'id': '1', 'body': 'review 1'},
+        None,
+        None,
+        {'upc': '1', 'name': 'product 1'},
+    ]
+    assert errors == {
+        ('_entities', 1): 'user 2 is broken',
+        ('_entities', 3): 'review 2 is broken',
+        ('_entities', 4): 'product broken is broken',
+    }
+
+
+def test_batch_errors_only_null_their_batch():
+    entities_, errors = entities(
+        create_client(),
+        [{'__typename': 'Product', 'upc': 'boom'}, {'__typename': 'User', 'id': '1'}],
+    )
+    assert entities_ == [None, {'id': '1', 'name': 'user 1'}]
+    assert errors == {('_entities', 0): 'products unavailable'}
+
+
+def test_shared_schema_keeps_its_entities_resolver():
+    app = create_client().app
+    entities_field = app.schema.query_type.fields['_entities']
+    GraphQL(schema=app.schema, timeout=5)
+    resolve = entities_field.resolve
+    GraphQL(schema=app.schema)
+    assert entities_field.resolve is resolve
@@ -0,0 +1,75 @@
+from gql import field_resolver, gql, query
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.field_cache import FieldCache, FieldCacheRule
+
+type_defs = gql(
+    '''
+type Product {
+    upc: Int!
+    reviews: [String!]!
+}
+
+type Query {
+    products: [Product!]!
+    version: Int!
+}
+'''
+)
+
+
+def create_client(field_cache):
+    calls = {'reviews': 0, 'version': 0}
+
+    @query
+    def products(_, info):
+        return [{'upc': 1}, {'upc': 2}]
+
+    @query
+    def version(_, info):
+        calls['version'] += 1
+        return calls['version']
+
+    @field_resolver('Product', 'reviews')
+    def reviews(product, info):
+        calls['reviews'] += 1
+        return [f'review of {product["upc"]}']
+
+    client = TestClient(GraphQL(type_defs=type_defs, field_cache=field_cache))
+    client.calls = calls
+    return client
+
+
+def reviews(client):
+    response = client.post('/', json={'query': '{ products { upc reviews } }'})
+    return [product['reviews'] for product in response.json()['data']['products']]
+
+
+def test_parents_without_key_are_not_cached():
+    client = create_client(FieldCache({'Product.reviews': 60}))
+    assert reviews(client) == [['review of 1'], ['review of 2']]
+    assert reviews(client) == [['review of 1'], ['review of 2']]
+    assert client.calls['reviews'] == 4
+
+
+def test_entries_are_keyed_by_parent():
+    field_cache = FieldCache({'Product.reviews': FieldCacheRule(60, parent_key=lambda product: product['upc'])})
+    client = create_client(field_cache)
+    assert reviews(client) == [['review of 1'], ['review of 2']]
+    assert reviews(client) == [['review of 1'], ['review of 2']]
+    assert client.calls['reviews'] == 2
+    assert field_cache.invalidate('Product', 'reviews', parent_key=2) == 1
+    assert reviews(client) == [['review of 1'], ['review of 2']]
+    assert client.calls['reviews'] == 3
+
+
+def test_root_fields_are_cached():
+    client = create_client(FieldCache({'Query.version': 60}))
+    for _ in range(2):
+        assert client.post('/', json={'query': '{ version }'}).json()['data'] == {'version': 1}
+
+
+def test_private_fields_need_a_user_key():
+    client = create_client(FieldCache({'Query.version': FieldCacheRule(60, scope='PRIVATE')}))
+    assert [client.post('/', json={'query': '{ version }'}).json()['data']['version'] for _ in range(2)] == [1, 2]
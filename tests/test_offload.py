@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from gql import field_resolver, gql, query
+from starlette.testclient import TestClient
+
+from stargql import DataLoader, GraphQL
+from stargql.offload import ResolverPool, no_offload
+
+type_defs = gql(
+    '''
+type Query {
+    blocking: String!
+    nonBlocking: String!
+    coroutine: String!
+    reviews: [Review!]!
+}
+
+type Review {
+    author: String!
+}
+'''
+)
+
+
+def create_app(**kwargs):
+    @query
+    def blocking(*_):
+        return threading.current_thread().name
+
+    @query
+    @no_offload
+    def non_blocking(*_):
+        return threading.current_thread().name
+
+    @query
+    async def coroutine(*_):
+        return threading.current_thread().name
+
+    @query
+    def reviews(*_):
+        return [{'author': 1}, {'author': 2}]
+
+    @field_resolver('Review', 'author')
+    @no_offload
+    def author(review, info):
+        return info.context['loaders']['user'].load(review['author'])
+
+    async def load_users(ids):
+        return [f'user {id_}' for id_ in ids]
+
+    return GraphQL(
+        type_defs=type_defs,
+        offload_sync_resolvers=True,
+        dataloaders={'user': lambda: DataLoader(load_users)},
+        context_builder=dict,
+        **kwargs,
+    )
+
+
+def test_sync_resolvers_are_offloaded_from_the_first_call():
+    client = TestClient(create_app())
+    for _ in range(2):
+        data = client.post('/', json={'query': '{ blocking nonBlocking coroutine }'}).json()['data']
+        assert data['blocking'].startswith('stargql-resolver')
+        assert not data['nonBlocking'].startswith('stargql-resolver')
+        assert not data['coroutine'].startswith('stargql-resolver')
+
+
+def test_no_offload_resolvers_can_return_loads():
+    client = TestClient(create_app())
+    response = client.post('/', json={'query': '{ reviews { author } }'})
+    assert response.json() == {'data': {'reviews': [{'author': 'user 1'}, {'author': 'user 2'}]}, 'errors': None}
+
+
+def test_shared_schema_is_wrapped_once():
+    app = create_app(timeout=5)
+    fields = app.schema.query_type.fields
+    resolvers = {name: field.resolve for name, field in fields.items()}
+    pool = ResolverPool()
+    pool.offload_resolvers(app.schema, all_sync=True)
+    assert {name: field.resolve for name, field in fields.items()} == resolvers
+    GraphQL(schema=app.schema, offload_sync_resolvers=True, timeout=5)
+    assert {name: field.resolve for name, field in fields.items()} == resolvers
+    assert pool.thread_metrics.submitted == 0
+
+    data = TestClient(app).post('/', json={'query': '{ blocking coroutine }'}).json()['data']
+    assert data['blocking'].startswith('stargql-resolver')
+    assert not data['coroutine'].startswith('stargql-resolver')
+
+
+def test_loads_off_the_event_loop_fail_clearly():
+    async def load(ids):
+        return ids
+
+    loader = DataLoader(load)
+
+    async def run():
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, loader.load, 1)
+        except RuntimeError as exc:
+            assert '@no_offload' in str(exc)
+        else:
+            raise AssertionError('expected a RuntimeError')
+
+    asyncio.run(run())
@@ -0,0 +1,378 @@
+import asyncio
+import json
+import threading
+import time
+
+from gql import gql, mutate, query, subscribe
+from starlette.testclient import TestClient
+
+from stargql import GraphQL, subscription
+from stargql.admission import AdmissionControl
+from stargql.subscription import WS_4408_INIT_TIMEOUT
+
+type_defs = gql(
+    '''
+type Query {
+    hello: String!
+    tenant: String
+}
+
+type Mutation {
+    dropAll: Int!
+}
+
+type Subscription {
+    count(to: Int!): Int!
+    forever: Int!
+}
+'''
+)
+
+
+def create_app(**kwargs):
+    started = threading.Event()
+    stopped = threading.Event()
+
+    @query
+    def hello(*_):
+        return 'world'
+
+    @query
+    def tenant(_, info):
+        return info.context.get('tenant')
+
+    @mutate
+    def drop_all(*_):
+        return 42
+
+    @subscribe
+    async def count(_, info, to):
+        for i in range(to):
+            yield {'count': i}
+
+    @subscribe
+    async def forever(*_):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+            yield {'forever': 0}
+        finally:
+            stopped.set()
+
+    app = GraphQL(type_defs=type_defs, **kwargs)
+    app.started = started
+    app.stopped = stopped
+    return app
+
+
+def create_client(**kwargs):
+    app = create_app(**kwargs)
+    client = TestClient(app)
+    client.started = app.started
+    client.stopped = app.stopped
+    return client
+
+
+class Socket:
+    """Drives the app's websocket endpoint directly, with a client that can stop reading or break the socket."""
+
+    def __init__(self, app, protocol='graphql-transport-ws', send_delay=0, broken=False):
+        self.app = app
+        self.protocol = protocol
+        self.send_delay = send_delay
+        self.broken = broken
+        self.reading = asyncio.Event()
+        self.reading.set()
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.task = None
+
+    async def connect(self):
+        scope = {'type': 'websocket', 'path': '/', 'root_path': '', 'headers': [], 'query_string': b''}
+        scope['subprotocols'] = [self.protocol]
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.ensure_future(self.app(scope, self.incoming.get, self.asgi_send))
+
+    async def asgi_send(self, message):
+        if message['type'] == 'websocket.send':
+            if self.broken:
+                raise RuntimeError('broken socket')
+            await self.reading.wait()
+            await asyncio.sleep(self.send_delay)
+        self.sent.append(message)
+
+    def send_json(self, data):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+
+    async def closed(self, timeout=2):
+        await asyncio.wait_for(self.task, timeout)
+        assert self.sent[-1]['type'] == 'websocket.close'
+        return self.sent[-1]['code']
+
+    def messages(self):
+        return [json.loads(message['text']) for message in self.sent if message['type'] == 'websocket.send']
+
+
+def connect(client, protocol='graphql-transport-ws'):
+    return client.websocket_connect('/', subprotocols=[protocol])
+
+
+def init(ws, payload=None):
+    ws.send_json({'type': 'connection_init', 'payload': payload})
+    assert ws.receive_json()['type'] == 'connection_ack'
+
+
+def test_subscribe_streams_results_then_completes():
+    client = create_client()
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { count(to: 2) }'}})
+        assert ws.receive_json() == {'type': 'next', 'id': '1', 'payload': {'data': {'count': 0}, 'errors': None}}
+        assert ws.receive_json() == {'type': 'next', 'id': '1', 'payload': {'data': {'count': 1}, 'errors': None}}
+        assert ws.receive_json() == {'type': 'complete', 'id': '1'}
+
+
+def test_queries_over_the_socket():
+    client = create_client()
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ hello }'}})
+        assert ws.receive_json() == {'type': 'next', 'id': '1', 'payload': {'data': {'hello': 'world'}, 'errors': None}}
+        assert ws.receive_json() == {'type': 'complete', 'id': '1'}
+
+
+def test_subscribe_before_init_is_unauthorized():
+    client = create_client()
+    with connect(client) as ws:
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ hello }'}})
+        assert ws.receive() == {'type': 'websocket.close', 'code': 4401}
+
+
+def test_complete_stops_the_operation():
+    client = create_client()
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { forever }'}})
+        assert client.started.wait(1)
+        ws.send_json({'type': 'complete', 'id': '1'})
+        ws.send_json({'type': 'ping'})
+        assert ws.receive_json() == {'type': 'pong'}
+        assert client.stopped.is_set()
+
+
+def test_legacy_protocol_start_and_stop():
+    client = create_client()
+    with connect(client, 'graphql-ws') as ws:
+        init(ws)
+        ws.send_json({'type': 'start', 'id': '1', 'payload': {'query': 'subscription { count(to: 1) }'}})
+        assert ws.receive_json() == {'type': 'data', 'id': '1', 'payload': {'data': {'count': 0}, 'errors': None}}
+        assert ws.receive_json() == {'type': 'complete', 'id': '1'}
+
+        ws.send_json({'type': 'start', 'id': '2', 'payload': {'query': 'subscription { forever }'}})
+        assert client.started.wait(1)
+        ws.send_json({'type': 'stop', 'id': '2'})
+        ws.send_json({'type': 'connection_terminate'})
+        assert ws.receive() == {'type': 'websocket.close', 'code': 1000}
+    assert client.stopped.is_set()
+
+
+def test_disconnect_stops_operations():
+    client = create_client()
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { forever }'}})
+        assert client.started.wait(1)
+    assert client.stopped.wait(1)
+
+
+def test_init_timeout():
+    client = create_client(subscription_init_timeout=0.05)
+    with connect(client) as ws:
+        assert ws.receive() == {'type': 'websocket.close', 'code': WS_4408_INIT_TIMEOUT}
+
+
+def test_idle_timeout_closes_sockets_with_open_operations():
+    client = create_client(subscription_idle_timeout=0.1)
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { forever }'}})
+        assert ws.receive() == {'type': 'websocket.close', 'code': 1000}
+    assert client.stopped.is_set()
+
+
+def test_answering_pings_keeps_the_connection_alive():
+    client = create_client(
+        subscription_idle_timeout=0.2, subscription_keep_alive=True, subscription_keep_alive_interval=0.05
+    )
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { forever }'}})
+        until = time.monotonic() + 0.6
+        while time.monotonic() < until:
+            assert ws.receive_json() == {'type': 'ping'}
+            ws.send_json({'type': 'pong'})
+        assert not client.stopped.is_set()
+
+
+def test_reader_is_not_blocked_by_a_client_that_stopped_reading(monkeypatch):
+    monkeypatch.setattr(subscription, 'FLUSH_TIMEOUT', 0.05)
+    app = create_app(subscription_send_queue_size=2)
+
+    async def run():
+        socket = Socket(app)
+        await socket.connect()
+        socket.reading.clear()
+        socket.send_json({'type': 'connection_init'})
+        socket.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { forever }'}})
+        socket.send_json({'type': 'subscribe', 'id': '2', 'payload': {'query': 'subscription { count(to: 100) }'}})
+        await asyncio.sleep(0.05)
+        # The outbox is full, stopping an operation is still handled.
+        socket.send_json({'type': 'complete', 'id': '1'})
+        await asyncio.sleep(0.05)
+        assert app.stopped.is_set()
+        # Answering a ping would have to wait, the client is disconnected instead.
+        socket.send_json({'type': 'ping'})
+        assert await socket.closed() == 1008
+
+    asyncio.run(run())
+
+
+def test_socket_waits_for_admission_off_the_read_loop():
+    admission = AdmissionControl(max_concurrency=1, max_queue=2, queue_timeout=5)
+    app = create_app(admission=admission)
+
+    async def run():
+        await admission.acquire()
+        socket = Socket(app)
+        await socket.connect()
+        socket.send_json({'type': 'connection_init'})
+        socket.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ hello }'}})
+        socket.send_json({'type': 'subscribe', 'id': '2', 'payload': {'query': '{ hello }'}})
+        socket.send_json({'type': 'ping'})
+        await asyncio.sleep(0.05)
+        # Both queries wait for the slot, the socket is still read.
+        assert socket.messages() == [{'type': 'connection_ack'}, {'type': 'pong'}]
+        assert admission.queued == 2
+        socket.send_json({'type': 'complete', 'id': '1'})
+        await asyncio.sleep(0.05)
+        assert admission.queued == 1
+        admission.release(None)
+        await asyncio.sleep(0.05)
+        assert socket.messages()[2:] == [
+            {'type': 'next', 'id': '2', 'payload': {'data': {'hello': 'world'}, 'errors': None}},
+            {'type': 'complete', 'id': '2'},
+        ]
+        assert (admission.active, admission.queued) == (0, 0)
+        socket.disconnect()
+        await socket.task
+
+    asyncio.run(run())
+
+
+def test_queued_messages_are_flushed_on_close():
+    app = create_app()
+
+    async def run():
+        socket = Socket(app, 'graphql-ws', send_delay=0.01)
+        await socket.connect()
+        socket.send_json({'type': 'connection_init'})
+        for _ in range(3):
+            socket.send_json({'type': 'unknown'})
+        socket.send_json({'type': 'connection_terminate'})
+        assert await socket.closed() == 1000
+        assert [message['type'] for message in socket.messages()] == ['connection_ack'] + ['connection_error'] * 3
+
+    asyncio.run(run())
+
+
+def test_broken_socket_does_not_block_the_connection():
+    app = create_app(subscription_send_queue_size=1)
+
+    async def run():
+        socket = Socket(app, broken=True)
+        await socket.connect()
+        socket.send_json({'type': 'connection_init'})
+        for _ in range(3):
+            socket.send_json({'type': 'ping'})
+        socket.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ hello }'}})
+        socket.disconnect()
+        await asyncio.wait_for(socket.task, 1)
+
+    asyncio.run(run())
+
+
+def test_shared_subscriptions_broadcast_to_every_subscriber():
+    client = create_client(share_subscriptions=True)
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { count(to: 3) }'}})
+        messages = [ws.receive_json() for _ in range(4)]
+    assert [message['payload']['data']['count'] for message in messages[:3]] == [0, 1, 2]
+    assert messages[3] == {'type': 'complete', 'id': '1'}
+
+
+def test_slow_shared_subscriber_is_dropped_with_an_error():
+    app = create_app(share_subscriptions=True, subscription_send_queue_size=2)
+
+    async def run():
+        socket = Socket(app)
+        await socket.connect()
+        socket.reading.clear()
+        socket.send_json({'type': 'connection_init'})
+        socket.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { count(to: 20) }'}})
+        await asyncio.sleep(0.05)
+        socket.reading.set()
+        await asyncio.sleep(0.05)
+        socket.send_json({'type': 'ping'})
+        await asyncio.sleep(0.05)
+        socket.disconnect()
+        await socket.closed()
+        return socket.messages()
+
+    messages = asyncio.run(run())
+    assert messages[0] == {'type': 'connection_ack'}
+    assert [message['type'] for message in messages[1:-2]] == ['next'] * (len(messages) - 3)
+    error = {'message': 'Too slow to read the results, dropped.'}
+    assert messages[-2] == {'type': 'error', 'id': '1', 'payload': [error]}
+    assert messages[-1] == {'type': 'pong'}
+
+
+def deny(next_, root, info, **args):
+    raise PermissionError('Not allowed')
+
+
+def test_socket_operations_go_through_graphql_middleware():
+    client = create_client(graphql_middleware={'Mutation': [deny]})
+    response = client.post('/', json={'query': 'mutation { dropAll }'})
+    assert response.json() == {
+        'data': None,
+        'errors': [{'message': 'Not allowed', 'locations': [{'line': 1, 'column': 12}], 'path': ['dropAll']}],
+    }
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'mutation { dropAll }'}})
+        message = ws.receive_json()
+        assert message['payload']['data'] is None
+        assert [error['message'] for error in message['payload']['errors']] == ['Not allowed']
+
+
+def test_subscription_events_go_through_graphql_middleware():
+    client = create_client(graphql_middleware={'Subscription': [deny]})
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { count(to: 1) }'}})
+        message = ws.receive_json()
+        assert message['payload']['data'] is None
+        assert [error['message'] for error in message['payload']['errors']] == ['Not allowed']
+
+
+def test_socket_operations_get_the_built_context():
+    client = create_client(context_builder=lambda: {'tenant': 'acme'})
+    assert client.post('/', json={'query': '{ tenant }'}).json()['data'] == {'tenant': 'acme'}
+    with connect(client) as ws:
+        init(ws)
+        ws.send_json({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ tenant }'}})
+        assert ws.receive_json()['payload']['data'] == {'tenant': 'acme'}
@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+from gql import gql, mutate
+from starlette.datastructures import Headers
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.uploads import MultipartUploads, UploadTooLarge
+
+BOUNDARY = 'boundary'
+
+type_defs = gql(
+    '''
+scalar Upload
+
+type Query {
+    hello: String
+}
+
+type Mutation {
+    read(files: [Upload!]!, order: [Int!]): [String!]!
+}
+'''
+)
+
+
+def encode(files):
+    operations = {
+        'query': 'mutation ($files: [Upload!]!) { read(files: $files) }',
+        'variables': {'files': [None] * len(files)},
+    }
+    files_map = {str(index): [f'variables.files.{index}'] for index in range(len(files))}
+    parts = [('operations', None, json.dumps(operations).encode()), ('map', None, json.dumps(files_map).encode())]
+    parts += [(str(index), f'file{index}.txt', content) for index, content in enumerate(files)]
+    body = b''
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        body += f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n'.encode()
+        if filename:
+            body += b'Content-Type: text/plain\r\n'
+        body += b'\r\n' + content + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+
+async def stream(body, chunk_size=64):
+    for start in range(0, len(body), chunk_size):
+        await asyncio.sleep(0)
+        yield body[start : start + chunk_size]
+
+
+def create_uploads(files, **kwargs):
+    headers = Headers({'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+    return MultipartUploads(headers, stream(encode(files)), **kwargs)
+
+
+async def start(uploads):
+    operations, files_map = await uploads.read_operations()
+    assert json.loads(operations)['variables'] == {'files': [None, None]}
+    return uploads.start(json.loads(files_map))
+
+
+def test_files_stream_in_order():
+    async def run():
+        uploads = create_uploads([b'a' * 1000, b'b' * 10])
+        files = await start(uploads)
+        first = await files['0'].open()
+        assert (first.filename, first.content_type) == ('file0.txt', 'text/plain')
+        assert await first.read() == b'a' * 1000
+        assert b''.join([chunk async for chunk in files['1']]) == b'b' * 10
+        await uploads.close()
+
+    asyncio.run(run())
+
+
+def test_skipped_file_is_spooled():
+    async def run():
+        uploads = create_uploads([b'a' * 10000, b'b' * 10], max_buffered_chunks=2)
+        files = await start(uploads)
+        assert await asyncio.wait_for(files['1'].read(), 5) == b'b' * 10
+        assert files['0'].spool is not None
+        assert await files['0'].read() == b'a' * 10000
+        await uploads.close()
+
+    asyncio.run(run())
+
+
+def test_file_size_limit():
+    async def run():
+        uploads = create_uploads([b'a' * 1000, b'b'], max_file_size=100)
+        files = await start(uploads)
+        for key in files:
+            try:
+                await files[key].read()
+            except UploadTooLarge:
+                pass
+            else:
+                raise AssertionError('expected UploadTooLarge')
+        await uploads.close()
+
+    asyncio.run(run())
+
+
+def test_missing_file():
+    async def run():
+        uploads = create_uploads([b'a', b'b'])
+        await uploads.read_operations()
+        files = uploads.start({'0': ['variables.files.0'], 'other': ['variables.files.1']})
+        assert await files['0'].read() == b'a'
+        try:
+            await files['other'].read()
+        except ValueError as exc:
+            assert str(exc) == 'File is missing in the request'
+        else:
+            raise AssertionError('expected a missing file')
+        await uploads.close()
+
+    asyncio.run(run())
+
+
+def create_client(**kwargs):
+    @mutate
+    async def read(_, info, files, order=None):
+        contents = {}
+        for index in order or range(len(files)):
+            contents[index] = (await files[index].read()).decode()
+        return [contents[index] for index in sorted(contents)]
+
+    return TestClient(GraphQL(type_defs=type_defs, streaming_uploads=True, **kwargs))
+
+
+def post(client, body):
+    chunks = (body[start : start + 1024] for start in range(0, len(body), 1024))
+    return client.post('/', data=chunks, headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+
+
+def test_streaming_upload_request():
+    response = post(create_client(), encode([b'first', b'second']))
+    assert response.json() == {'data': {'read': ['first', 'second']}, 'errors': None}
+
+
+def test_streaming_upload_read_out_of_order():
+    files = [b'a' * 2 ** 20, b'b']
+    body = encode(files).replace(b'read(files: $files)', b'read(files: $files, order: [1, 0])')
+    response = post(create_client(), body)
+    assert response.json()['data']['read'] == [file.decode() for file in files]
+
+
+def test_streaming_upload_body_size_limit():
+    response = post(create_client(upload_max_size=10), encode([b'first']))
+    assert response.status_code == 413
+
+
+def test_streaming_upload_invalid_map():
+    body = encode([b'a']).replace(b'{"0": ["variables.files.0"]}', b'not json')
+    response = post(create_client(), body)
+    assert response.status_code == 400
@@ -0,0 +1,115 @@
+import time
+
+from gql import gql, query
+from graphql import build_schema, get_operation_ast, parse
+from starlette.testclient import TestClient
+
+from stargql import GraphQL
+from stargql.validation import QueryCost
+
+type_defs = '''
+type User {
+    id: ID!
+    name: String
+    friends(first: Int): [User!]!
+}
+
+type Query {
+    me: User
+}
+'''
+
+schema = build_schema(type_defs)
+
+
+def measure(source, variables=None, query_cost=None, max_cost=None):
+    document = parse(source)
+    operation = get_operation_ast(document)
+    return (query_cost or QueryCost()).measure_document(schema, document, operation, variables, max_cost)
+
+
+def chained_fragments(count):
+    fragments = [f'fragment F{i} on User {{ id ...F{i + 1} ...F{i + 1} }}' for i in range(count)]
+    fragments.append(f'fragment F{count} on User {{ name }}')
+    return '{ me { ...F0 } } ' + ' '.join(fragments)
+
+
+def test_measure_fields_and_lists():
+    assert measure('{ me { id name } }') == (2, 3)
+    assert measure('{ me { friends(first: 5) { id } } }') == (3, 7)
+    assert measure('query($n: Int = 3) { me { friends(first: $n) { id } } }') == (3, 5)
+    assert measure('query($n: Int = 3) { me { friends(first: $n) { id } } }', {'n': 50}) == (3, 52)
+    assert measure('query($n: Int) { me { friends(first: $n) { id } } }') == (3, 12)
+    assert measure('{ me { friends { id } } }', query_cost=QueryCost(field_costs={'User.friends': 10})) == (3, 12)
+    assert measure('{ __typename me { __typename id } }') == (2, 2)
+
+
+def test_fragment_spread_in_sibling_subtrees_is_measured():
+    source = '{ me { ...U friends(first: 100) { ...U } } } fragment U on User { id }'
+    assert measure(source) == (3, 103)
+    inline = '{ me { ... on User { id } friends(first: 100) { ... on User { id } } } }'
+    assert measure(inline) == measure(source)
+
+
+def test_fragment_cycles_terminate():
+    source = '{ me { ...A } } fragment A on User { id ...B } fragment B on User { name ...A }'
+    assert measure(source) == (2, 3)
+
+
+def test_repeated_fragments_are_measured_once():
+    started = time.perf_counter()
+    depth, cost = measure(chained_fragments(20))
+    assert time.perf_counter() - started < 1
+    assert depth == 2
+    assert cost == 1 + 2 ** 21 - 1
+
+
+def test_measure_stops_past_max_cost():
+    depth, cost = measure('{ me { friends(first: 100) { friends(first: 100) { id } } } }', max_cost=50)
+    assert 50 < cost < 10101
+    assert measure('{ me { friends(first: 0) { friends(first: 100) { id } } } }', max_cost=50) == (4, 2)
+
+
+def create_app(**kwargs):
+    @query
+    def me(*_):
+        return {'id': '1', 'name': 'me', 'friends': []}
+
+    return TestClient(GraphQL(type_defs=gql(type_defs), **kwargs))
+
+
+def errors(client, source, variables=None):
+    response = client.post('/', json={'query': source, 'variables': variables})
+    return [error['message'] for error in response.json()['errors'] or []]
+
+
+def complexity_exceeded(client, source, variables=None):
+    # Measuring stops past the limit, the complexity reported is only a lower bound.
+    [message] = errors(client, source, variables)
+    return message.startswith('Query complexity ') and message.endswith(' the maximum allowed complexity of 100.')
+
+
+def test_depth_limit_with_fragments():
+    client = create_app(max_depth=2)
+    assert errors(client, '{ me { ...U } } fragment U on User { id }') == []
+    assert errors(client, '{ me { ...U friends(first: 1) { ...U } } } fragment U on User { id }') == [
+        'Query depth 3 exceeds the maximum allowed depth of 2.'
+    ]
+
+
+def test_complexity_limit_with_fragments():
+    client = create_app(max_complexity=100)
+    assert errors(client, '{ me { ...U friends(first: 10) { ...U } } } fragment U on User { id }') == []
+    assert complexity_exceeded(client, '{ me { ...U friends(first: 100) { ...U } } } fragment U on User { id }')
+
+    started = time.perf_counter()
+    assert complexity_exceeded(client, chained_fragments(20))
+    assert time.perf_counter() - started < 1
+
+
+def test_complexity_limit_with_variables():
+    client = create_app(max_complexity=100)
+    source = 'query($n: Int = 5) { me { friends(first: $n) { id } } }'
+    assert errors(client, source) == []
+    assert errors(client, source, {'n': 50}) == []
+    assert complexity_exceeded(client, source, {'n': 500})